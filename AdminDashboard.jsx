@@ -8,8 +8,11 @@ import { Droplet, LogOut, Users, Heart, AlertCircle, TrendingUp, Activity, Award
 import axios from 'axios';
 import { toast } from 'sonner';
 
+const STREAM_RETRY_MS = 3000;
+
 const AdminDashboard = () => {
-  const { user, token, logout, API } = useContext(AuthContext);
+  const { user, token, logout, freshToken, API } = useContext(AuthContext);
+  const [reconnects, setReconnects] = useState(0);
   const [stats, setStats] = useState(null);
   const [requests, setRequests] = useState([]);
   const [leaderboard, setLeaderboard] = useState([]);
@@ -41,6 +44,41 @@ const AdminDashboard = () => {
     fetchData();
   }, []);
 
+  // Apply pushed deltas instead of re-fetching every list
+  useEffect(() => {
+    const events = new EventSource(`${API}/events?token=${encodeURIComponent(token)}`);
+    let retry;
+    // The token is fixed in the URL, and the browser would reconnect with it after it expires;
+    // reconnect with a fresh one instead (a new token re-runs this effect by itself)
+    events.onerror = () => {
+      events.close();
+      retry = setTimeout(() => {
+        freshToken().then((current) => {
+          if (current === token) setReconnects((n) => n + 1);
+        }).catch((error) => {
+          if (error.response?.status === 401) logout();
+          else setReconnects((n) => n + 1);
+        });
+      }, STREAM_RETRY_MS);
+    };
+    events.addEventListener('activity', (e) => {
+      const activity = JSON.parse(e.data);
+      setActivities((prev) => [activity, ...prev].slice(0, 50));
+    });
+    events.addEventListener('request.created', (e) => {
+      const request = JSON.parse(e.data);
+      setRequests((prev) => [request, ...prev]);
+    });
+    events.addEventListener('request.updated', (e) => {
+      const request = JSON.parse(e.data);
+      setRequests((prev) => prev.map((r) => (r.id === request.id ? { ...r, ...request } : r)));
+    });
+    return () => {
+      clearTimeout(retry);
+      events.close();
+    };
+  }, [token, reconnects]);
+
   if (loading) {
     return (
       <div className="min-h-screen flex items-center justify-center">
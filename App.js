@@ -12,11 +12,73 @@ const API = `${BACKEND_URL}/api`;
 
 export const AuthContext = React.createContext(null);
 
+let refreshing = null;
+
+const expiresSoon = (token, marginSeconds = 30) => {
+  try {
+    const payload = JSON.parse(atob(token.split('.')[1].replace(/-/g, '+').replace(/_/g, '/')));
+    return payload.exp * 1000 - Date.now() < marginSeconds * 1000;
+  } catch {
+    return true;
+  }
+};
+
 function App() {
   const [user, setUser] = useState(null);
   const [token, setToken] = useState(localStorage.getItem('token'));
   const [loading, setLoading] = useState(true);
 
+  // Refresh tokens are single-use, so concurrent callers share one in-flight refresh
+  const refreshSession = () => {
+    if (!refreshing) {
+      const refreshToken = localStorage.getItem('refreshToken');
+      refreshing = (refreshToken
+        ? axios.post(`${API}/auth/refresh`, { refresh_token: refreshToken })
+        : Promise.reject(new Error('No refresh token'))
+      ).then((response) => {
+        localStorage.setItem('token', response.data.access_token);
+        localStorage.setItem('refreshToken', response.data.refresh_token);
+        setToken(response.data.access_token);
+        return response.data.access_token;
+      }).catch((error) => {
+        if (localStorage.getItem('refreshToken') === refreshToken) {
+          localStorage.removeItem('refreshToken');
+        }
+        throw error;
+      }).finally(() => {
+        refreshing = null;
+      });
+    }
+    return refreshing;
+  };
+
+  // The current access token, refreshed first if it is about to expire
+  const freshToken = () => {
+    const current = localStorage.getItem('token');
+    return current && !expiresSoon(current) ? Promise.resolve(current) : refreshSession();
+  };
+
+  // Access tokens are short-lived: on a 401, trade the refresh token for a new pair and retry once
+  useEffect(() => {
+    const interceptor = axios.interceptors.response.use(null, async (error) => {
+      const config = error.config;
+      if (error.response?.status !== 401 || !localStorage.getItem('refreshToken') || config._retried || config.url.includes('/auth/')) {
+        return Promise.reject(error);
+      }
+      config._retried = true;
+      try {
+        // Sent before another request's refresh finished: replay with the token it obtained
+        const current = localStorage.getItem('token');
+        const accessToken = current && config.headers.Authorization !== `Bearer ${current}` ? current : await refreshSession();
+        config.headers.Authorization = `Bearer ${accessToken}`;
+        return axios(config);
+      } catch {
+        return Promise.reject(error);
+      }
+    });
+    return () => axios.interceptors.response.eject(interceptor);
+  }, []);
+
   useEffect(() => {
     if (token) {
       axios.get(`${API}/profile`, {
@@ -25,6 +87,7 @@ function App() {
         setUser(response.data);
       }).catch(() => {
         localStorage.removeItem('token');
+        localStorage.removeItem('refreshToken');
         setToken(null);
       }).finally(() => {
         setLoading(false);
@@ -34,14 +97,25 @@ function App() {
     }
   }, [token]);
 
-  const login = (newToken, userData) => {
+  const login = (newToken, userData, refreshToken) => {
     localStorage.setItem('token', newToken);
+    if (refreshToken) {
+      localStorage.setItem('refreshToken', refreshToken);
+    }
     setToken(newToken);
     setUser(userData);
   };
 
   const logout = () => {
+    // The refresh token alone is enough to revoke the session, even once the access token has expired
+    const refreshToken = localStorage.getItem('refreshToken');
+    if (token || refreshToken) {
+      axios.post(`${API}/auth/logout`, { refresh_token: refreshToken }, {
+        headers: token ? { Authorization: `Bearer ${token}` } : {}
+      }).catch(() => {});
+    }
     localStorage.removeItem('token');
+    localStorage.removeItem('refreshToken');
     setToken(null);
     setUser(null);
   };
@@ -55,7 +129,7 @@ function App() {
   }
 
   return (
-    <AuthContext.Provider value={{ user, token, login, logout, API }}>
+    <AuthContext.Provider value={{ user, token, login, logout, freshToken, API }}>
       <div className="App">
         <BrowserRouter>
           <Routes>
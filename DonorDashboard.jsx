@@ -9,8 +9,11 @@ import axios from 'axios';
 import { toast } from 'sonner';
 import { Dialog, DialogContent, DialogHeader, DialogTitle } from '@/components/ui/dialog';
 
+const STREAM_RETRY_MS = 3000;
+
 const DonorDashboard = () => {
-  const { user, token, logout, API } = useContext(AuthContext);
+  const { user, token, logout, freshToken, API } = useContext(AuthContext);
+  const [reconnects, setReconnects] = useState(0);
   const [donorProfile, setDonorProfile] = useState(null);
   const [requests, setRequests] = useState([]);
   const [loading, setLoading] = useState(true);
@@ -37,6 +40,37 @@ const DonorDashboard = () => {
     fetchData();
   }, []);
 
+  // New matching requests and status changes are pushed by the server
+  useEffect(() => {
+    const events = new EventSource(`${API}/events?token=${encodeURIComponent(token)}`);
+    let retry;
+    // The token is fixed in the URL, and the browser would reconnect with it after it expires;
+    // reconnect with a fresh one instead (a new token re-runs this effect by itself)
+    events.onerror = () => {
+      events.close();
+      retry = setTimeout(() => {
+        freshToken().then((current) => {
+          if (current === token) setReconnects((n) => n + 1);
+        }).catch((error) => {
+          if (error.response?.status === 401) logout();
+          else setReconnects((n) => n + 1);
+        });
+      }, STREAM_RETRY_MS);
+    };
+    events.addEventListener('request.created', (e) => {
+      const request = JSON.parse(e.data);
+      setRequests((prev) => [request, ...prev.filter((r) => r.id !== request.id)]);
+    });
+    events.addEventListener('request.updated', (e) => {
+      const request = JSON.parse(e.data);
+      setRequests((prev) => prev.map((r) => (r.id === request.id ? { ...r, ...request } : r)));
+    });
+    return () => {
+      clearTimeout(retry);
+      events.close();
+    };
+  }, [token, reconnects]);
+
   const toggleAvailability = async () => {
     try {
       await axios.put(
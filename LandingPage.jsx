@@ -43,7 +43,7 @@ const LandingPage = () => {
 
       const response = await axios.post(`${API}${endpoint}`, payload);
       
-      login(response.data.access_token, response.data.user);
+      login(response.data.access_token, response.data.user, response.data.refresh_token);
       toast.success(isLogin ? 'Welcome back!' : 'Account created successfully!');
       setShowAuth(false);
     } catch (error) {
@@ -0,0 +1,117 @@
+import asyncio
+import logging
+from collections import deque
+from datetime import datetime
+from typing import List
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+# Write-behind activity log: create_activity enqueues and returns, a background task flushes
+# batches with insert_many. The latest entries are kept in memory for GET /api/activities.
+class ActivityWriter:
+    def __init__(self, db, batch_size: int = 100, flush_interval: float = 0.5, max_backlog: int = 10000, recent_size: int = 50):
+        self.db = db
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_backlog = max_backlog
+        self._recent: deque = deque(maxlen=recent_size)
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._task = None
+        # Bumped whenever the ring changes, for conditional GETs of /api/activities
+        self.version = 0
+        self.written = 0
+        self.dropped = 0
+        self.batches = 0
+
+    async def _latest(self) -> List[dict]:
+        limit = self._recent.maxlen
+        return await self.db.activities.find({}, {"_id": 0, "recorded_at": 0}).sort("timestamp", -1).limit(limit).to_list(limit)
+
+    async def start(self):
+        self._recent.extend(await self._latest())
+        self.version += 1
+        self._task = asyncio.create_task(self._run(), name="activity-writer")
+
+    async def refresh_recent(self):
+        # With several workers each ring only sees its own writes; merge in what the others flushed
+        merged = {activity["id"]: activity for activity in await self._latest()}
+        for activity in self._recent:
+            merged.setdefault(activity["id"], activity)
+        latest = sorted(merged.values(), key=lambda activity: activity["timestamp"], reverse=True)[:self._recent.maxlen]
+        if [activity["id"] for activity in latest] != [activity["id"] for activity in self._recent]:
+            self.version += 1
+        self._recent.clear()
+        self._recent.extend(latest)
+
+    def write(self, activity: dict):
+        self._recent.appendleft(activity)
+        self.version += 1
+        if self._queue.qsize() >= self.max_backlog:
+            # Mongo is not keeping up; keep the request path fast and count the loss
+            self.dropped += 1
+            return
+        self._queue.put_nowait(activity)
+
+    def recent(self, limit: int) -> List[dict]:
+        return list(self._recent)[:limit]
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is _STOP:
+                break
+            batch = [item]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            await self._flush(batch)
+        # Drain anything still queued at shutdown
+        remaining = []
+        while not self._queue.empty():
+            item = self._queue.get_nowait()
+            if item is not _STOP:
+                remaining.append(item)
+        for start in range(0, len(remaining), self.batch_size):
+            await self._flush(remaining[start:start + self.batch_size])
+
+    async def _flush(self, batch: List[dict]):
+        try:
+            # Copies, because insert_many adds _id to the documents it is given; recorded_at is
+            # the BSON date the retention TTL index expires on
+            docs = [{**activity, "recorded_at": datetime.fromisoformat(activity["timestamp"])} for activity in batch]
+            await self.db.activities.insert_many(docs, ordered=False)
+            self.written += len(batch)
+            self.batches += 1
+        except Exception:
+            self.dropped += len(batch)
+            logger.exception("Failed to write %s activities", len(batch))
+
+    async def close(self):
+        if self._task is None:
+            return
+        self._queue.put_nowait(_STOP)
+        await self._task
+        self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "backlog": self._queue.qsize(),
+            "written": self.written,
+            "dropped": self.dropped,
+            "batches": self.batches
+        }
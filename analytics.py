@@ -0,0 +1,212 @@
+import asyncio
+import logging
+import os
+import sys
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+from pymongo import UpdateOne
+
+from geo import normalize_location
+from indexes import INDEXES
+from pipelines import normalized_location
+from retention import DONATION_ARCHIVE, REQUEST_ARCHIVE, union_with_archive
+
+logger = logging.getLogger(__name__)
+
+# Buckets are prefixes of the stored UTC ISO timestamps: "2024-05-01T13" and "2024-05-01"
+GRANULARITIES = {"hour": 13, "day": 10}
+BUCKET_FORMATS = {"hour": "%Y-%m-%dT%H", "day": "%Y-%m-%d"}
+BUCKET_STEPS = {"hour": timedelta(hours=1), "day": timedelta(days=1)}
+METRICS = ("requests", "requests_accepted", "requests_completed", "requests_cancelled", "donations", "units")
+DIMENSIONS = ("blood_type", "location", "urgency")
+# Donations are not tied to an urgency; their counters live under this urgency value
+NO_URGENCY = "-"
+MAX_POINTS = 5000
+
+
+def bucket_for(timestamp, granularity: str) -> str:
+    if isinstance(timestamp, datetime):
+        return timestamp.astimezone(timezone.utc).strftime(BUCKET_FORMATS[granularity])
+    return timestamp[:GRANULARITIES[granularity]]
+
+
+def _rollup_id(granularity: str, bucket: str, blood_type: str, location: str, urgency: str) -> str:
+    return "|".join((granularity, bucket, blood_type, location, urgency))
+
+
+# Pre-aggregated counters in db.analytics_rollups: one document per granularity, bucket,
+# blood type, location and urgency, maintained with $inc by the write handlers (like StatsStore)
+# so trend queries read a few hundred small documents instead of the history collections.
+class AnalyticsStore:
+    def __init__(self, db):
+        self.db = db
+        self.collection = db.analytics_rollups
+
+    def _upsert(self, granularity: str, bucket: str, blood_type: str, location: str, urgency: str, counters: Dict[str, int]) -> UpdateOne:
+        return UpdateOne(
+            {"_id": _rollup_id(granularity, bucket, blood_type, location, urgency)},
+            {
+                "$inc": counters,
+                "$setOnInsert": {
+                    "granularity": granularity,
+                    "bucket": bucket,
+                    "blood_type": blood_type,
+                    "location": location,
+                    "urgency": urgency
+                }
+            },
+            upsert=True
+        )
+
+    def _operations(self, timestamp: str, counters: Dict[str, int], blood_type: str, location: Optional[str], urgency: Optional[str]) -> List[UpdateOne]:
+        location = normalize_location(location)
+        urgency = urgency or NO_URGENCY
+        return [
+            self._upsert(granularity, bucket_for(timestamp, granularity), blood_type, location, urgency, counters)
+            for granularity in GRANULARITIES
+        ]
+
+    async def _record(self, timestamp: str, counters: Dict[str, int], blood_type: str, location: Optional[str], urgency: Optional[str]):
+        await self.collection.bulk_write(self._operations(timestamp, counters, blood_type, location, urgency), ordered=False)
+
+    async def request_created(self, request: dict):
+        await self._record(request["created_at"], {"requests": 1}, request["blood_type"], request["location"], request["urgency"])
+
+    async def request_status_changed(self, previous: dict, new_status: str, at: str):
+        if previous.get("status") == new_status or f"requests_{new_status}" not in METRICS:
+            return
+        await self._record(at, {f"requests_{new_status}": 1}, previous["blood_type"], previous["location"], previous["urgency"])
+
+    async def donation_recorded(self, donation: dict, request: Optional[dict] = None):
+        # Given the request as it was, its completion is counted in the same bulk_write
+        operations = self._operations(donation["donation_date"], {"donations": 1, "units": donation.get("units", 1)},
+                                      donation["blood_type"], donation["location"], None)
+        if request is not None and request.get("status") != "completed":
+            operations += self._operations(donation["donation_date"], {"requests_completed": 1},
+                                           request["blood_type"], request["location"], request["urgency"])
+        await self.collection.bulk_write(operations, ordered=False)
+
+    async def donations_imported(self, donations: List[dict]):
+        # Bulk imports add their rows with one $inc per rollup they touch
+        rollups: Dict[tuple, Dict[str, int]] = {}
+        for donation in donations:
+            location = normalize_location(donation["location"])
+            for granularity in GRANULARITIES:
+                key = (granularity, bucket_for(donation["donation_date"], granularity), donation["blood_type"], location)
+                counters = rollups.setdefault(key, {"donations": 0, "units": 0})
+                counters["donations"] += 1
+                counters["units"] += donation.get("units", 1)
+        if rollups:
+            await self.collection.bulk_write([
+                self._upsert(granularity, bucket, blood_type, location, NO_URGENCY, counters)
+                for (granularity, bucket, blood_type, location), counters in rollups.items()
+            ], ordered=False)
+
+    async def timeseries(self, metric: str, granularity: str, start: datetime, end: datetime,
+                         filters: Dict[str, str], group_by: Optional[str] = None) -> List[dict]:
+        first, last = bucket_for(start, granularity), bucket_for(end, granularity)
+        match = {"granularity": granularity, "bucket": {"$gte": first, "$lte": last}}
+        for dimension, value in filters.items():
+            match[dimension] = normalize_location(value) if dimension == "location" else value
+        rows = await self.collection.aggregate([
+            {"$match": match},
+            {"$group": {
+                "_id": {"bucket": "$bucket", "key": f"${group_by}" if group_by else None},
+                "value": {"$sum": f"${metric}"}
+            }},
+        ]).to_list(None)
+
+        # Every bucket in the range appears, zero-filled, so charts need no gap handling
+        buckets = []
+        cursor = datetime.strptime(first, BUCKET_FORMATS[granularity]).replace(tzinfo=timezone.utc)
+        while len(buckets) < MAX_POINTS and bucket_for(cursor, granularity) <= last:
+            buckets.append(bucket_for(cursor, granularity))
+            cursor += BUCKET_STEPS[granularity]
+        values: Dict[str, Dict[str, int]] = defaultdict(dict)
+        for row in rows:
+            values[row["_id"]["key"] or "all"][row["_id"]["bucket"]] = row["value"]
+        if not values:
+            values["all"] = {}
+        return [
+            {"key": key, "points": [{"bucket": bucket, "value": points.get(bucket, 0)} for bucket in buckets]}
+            for key, points in sorted(values.items())
+        ]
+
+    async def _group(self, collection: str, archive: str, match: dict, field: str, urgency: Optional[str], counters: dict) -> List[dict]:
+        pipeline = [
+            {"$match": match},
+            union_with_archive(archive, match),
+            {"$group": {
+                "_id": {
+                    "bucket": {"$substrCP": [f"${field}", 0, GRANULARITIES["hour"]]},
+                    "blood_type": "$blood_type",
+                    "location": normalized_location(),
+                    "urgency": urgency or {"$ifNull": ["$urgency", NO_URGENCY]},
+                },
+                **counters
+            }},
+        ]
+        return await self.db[collection].aggregate(pipeline, allowDiskUse=True).to_list(None)
+
+    async def backfill(self) -> int:
+        # Rebuilds every rollup from the request and donation history (hot and archived).
+        # Status changes are dated by the request's last update.
+        totals: Dict[str, dict] = {}
+
+        def add(rows: List[dict]):
+            for row in rows:
+                key = row.pop("_id")
+                for granularity, length in GRANULARITIES.items():
+                    bucket = key["bucket"][:length]
+                    rollup_id = _rollup_id(granularity, bucket, key["blood_type"], key["location"], key["urgency"])
+                    doc = totals.setdefault(rollup_id, {
+                        "_id": rollup_id, "granularity": granularity, "bucket": bucket,
+                        "blood_type": key["blood_type"], "location": key["location"], "urgency": key["urgency"]
+                    })
+                    for counter, value in row.items():
+                        doc[counter] = doc.get(counter, 0) + value
+
+        add(await self._group("blood_requests", REQUEST_ARCHIVE, {}, "created_at", None, {"requests": {"$sum": 1}}))
+        for status in ("accepted", "completed", "cancelled"):
+            add(await self._group("blood_requests", REQUEST_ARCHIVE, {"status": status}, "updated_at", None,
+                                  {f"requests_{status}": {"$sum": 1}}))
+        add(await self._group("donation_history", DONATION_ARCHIVE, {}, "donation_date", NO_URGENCY,
+                              {"donations": {"$sum": 1}, "units": {"$sum": {"$ifNull": ["$units", 1]}}}))
+
+        # Built aside and swapped in by a rename, so live $inc upserts never meet a half-empty
+        # collection. Increments made between the aggregations and the rename are lost.
+        staging = self.db[f"{self.collection.name}_rebuild_{os.getpid()}_{uuid.uuid4().hex[:8]}"]
+        try:
+            await staging.create_indexes(INDEXES[self.collection.name])
+            docs = list(totals.values())
+            for start in range(0, len(docs), 5000):
+                await staging.insert_many(docs[start:start + 5000], ordered=False)
+            await staging.rename(self.collection.name, dropTarget=True)
+        except BaseException:
+            await staging.drop()
+            raise
+        logger.info("Backfilled %s analytics rollups", len(docs))
+        return len(docs)
+
+
+async def _main() -> int:
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+    from pathlib import Path
+
+    load_dotenv(Path(__file__).parent / '.env')
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    try:
+        await AnalyticsStore(client[os.environ['DB_NAME']]).backfill()
+    finally:
+        client.close()
+    return 0
+
+
+if __name__ == "__main__":
+    # python analytics.py: rebuild the rollups from history
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(asyncio.run(_main()))
@@ -0,0 +1,126 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT_DIR))
+
+from benchmarks.run import git_commit, token_issuer  # noqa: E402
+from benchmarks.seed import BENCHMARK_PASSWORD, BLOOD_TYPE_WEIGHTS, CITIES, seed  # noqa: E402
+from benchmarks.workloads import Context  # noqa: E402
+
+DASHBOARD_URLS = ["/api/blood-requests", "/api/donors", "/api/activities", "/api/donors/leaderboard"]
+
+
+async def refresh_loop(client, ctx: Context, rounds: int, write_every: int, conditional: bool, totals: dict):
+    # One open dashboard: re-fetches its four lists each round, like the React polling loop.
+    # In conditional mode it keeps each ETag and sends it back, as a browser cache would.
+    headers = ctx.auth(ctx.rng.choice([ctx.donors, ctx.recipients, ctx.admins]))
+    writer = ctx.auth(ctx.recipients)
+    etags = {}
+    for round_number in range(rounds):
+        if write_every and round_number % write_every == write_every - 1:
+            await client.post("/api/blood-requests", headers=writer, json={
+                "blood_type": ctx.rng.choice(list(BLOOD_TYPE_WEIGHTS)),
+                "location": ctx.rng.choice(CITIES),
+                "urgency": "medium",
+            })
+            totals["writes"] += 1
+        for url in DASHBOARD_URLS:
+            request_headers = dict(headers)
+            if conditional and url in etags:
+                request_headers["If-None-Match"] = etags[url]
+            response = await client.get(url, headers=request_headers)
+            totals["requests"] += 1
+            totals["bytes"] += len(response.content)
+            if response.status_code == 304:
+                totals["not_modified"] += 1
+            elif response.status_code >= 400:
+                totals["errors"] += 1
+            if "etag" in response.headers:
+                etags[url] = response.headers["etag"]
+
+
+async def run_mode(client, ctx: Context, args, conditional: bool) -> dict:
+    totals = {"requests": 0, "not_modified": 0, "errors": 0, "writes": 0, "bytes": 0}
+    cpu_start, wall_start = time.process_time(), time.perf_counter()
+    await asyncio.gather(*(
+        refresh_loop(client, ctx, args.rounds, args.write_every, conditional, totals) for _ in range(args.clients)
+    ))
+    cpu = time.process_time() - cpu_start
+    return {
+        **totals,
+        "elapsed_seconds": round(time.perf_counter() - wall_start, 3),
+        # Client and server share the process; the client side costs the same in both modes
+        "cpu_seconds": round(cpu, 3),
+        "cpu_ms_per_request": round(cpu * 1000 / max(1, totals["requests"]), 3),
+        "bytes_per_request": round(totals["bytes"] / max(1, totals["requests"]), 1),
+    }
+
+
+async def main(args) -> dict:
+    os.environ.setdefault("MONGO_URL", args.mongo_url)
+    os.environ.setdefault("DB_NAME", args.db_name)
+    if args.memory:
+        import motor.motor_asyncio
+        from mongomock_motor import AsyncMongoMockClient
+        motor.motor_asyncio.AsyncIOMotorClient = AsyncMongoMockClient
+
+    import httpx
+    import server
+
+    print(f"Seeding {args.scale} donors into {os.environ['DB_NAME']}...", file=sys.stderr)
+    data = await seed(server.db, args.scale, server.pwd_context.hash(BENCHMARK_PASSWORD), seed=args.seed)
+    results = {
+        "meta": {
+            "commit": git_commit(),
+            "scale": args.scale,
+            "clients": args.clients,
+            "rounds": args.rounds,
+            "write_every": args.write_every,
+            "mongo": "memory" if args.memory else args.mongo_url,
+        },
+        "modes": {},
+    }
+    async with server.app.router.lifespan_context(server.app):
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+            for name, conditional in (("unconditional", False), ("conditional", True)):
+                ctx = Context(data, token_issuer(server, data), random.Random(args.seed))
+                print(f"Running {name} refreshes...", file=sys.stderr)
+                results["modes"][name] = await run_mode(client, ctx, args, conditional)
+    before, after = results["modes"]["unconditional"], results["modes"]["conditional"]
+    results["savings"] = {
+        "bytes_pct": round((1 - after["bytes"] / before["bytes"]) * 100, 1) if before["bytes"] else None,
+        "cpu_pct": round((1 - after["cpu_seconds"] / before["cpu_seconds"]) * 100, 1) if before["cpu_seconds"] else None,
+    }
+    return results
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Bytes and CPU of dashboard refreshes with and without If-None-Match")
+    parser.add_argument("--scale", type=int, default=1000)
+    parser.add_argument("--clients", type=int, default=50, help="open dashboards refreshing concurrently")
+    parser.add_argument("--rounds", type=int, default=20, help="refreshes per dashboard")
+    parser.add_argument("--write-every", type=int, default=10,
+                        help="each dashboard's rounds between new blood requests (0 for read-only)")
+    parser.add_argument("--memory", action="store_true", help="use mongomock-motor instead of a real mongod")
+    parser.add_argument("--mongo-url", default="mongodb://localhost:27017")
+    parser.add_argument("--db-name", default="blood_bank_benchmark")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="write JSON results to this file")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    results = asyncio.run(main(args))
+    text = json.dumps(results, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + "\n")
+    print(text)
@@ -0,0 +1,70 @@
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT_DIR))
+
+from benchmarks.seed import generate  # noqa: E402
+from compatibility import BLOOD_TYPES, is_compatible  # noqa: E402
+from matching import DonorPool, match_pool  # noqa: E402
+
+
+def timed(fn) -> float:
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def main(args) -> dict:
+    # Matching only: the donor pool is built from generated documents, no database or HTTP
+    data = generate(args.donors, password_hash="x", seed=args.seed)
+    users = {user["id"]: user for user in data["users"]}
+    donors = [{**donor, "user": users[donor["user_id"]]} for donor in data["donors"] if donor["available"]]
+    requests = [dict(request, id=f"{request['id']}-{n}") for n in range(args.requests // len(data["blood_requests"]) + 1)
+                for request in data["blood_requests"]][:args.requests]
+
+    pairs = [(donor, recipient) for donor in BLOOD_TYPES for recipient in BLOOD_TYPES]
+    lookups = args.lookups // len(pairs)
+    compatibility_seconds = timed(lambda: [is_compatible(d, r) for _ in range(lookups) for d, r in pairs])
+
+    pool = None
+
+    def build():
+        nonlocal pool
+        pool = DonorPool(donors)
+    build_seconds = timed(build)
+    single = requests[:1000]
+    rank_seconds = timed(lambda: [pool.rank(request, args.per_request) for request in single])
+
+    return {
+        "meta": {"donors": len(donors), "requests": len(requests), "per_request": args.per_request},
+        "compatibility_ns_per_lookup": round(compatibility_seconds * 1e9 / (lookups * len(pairs)), 1),
+        "pool_build_ms": round(build_seconds * 1000, 1),
+        "rank_us_per_request": round(rank_seconds * 1e6 / len(single), 1),
+        "batch_match_seconds": round(timed(lambda: match_pool(DonorPool(donors), requests, args.per_request)), 3),
+        # A fresh pool: exclusive matching claims donors as it goes
+        "batch_match_exclusive_seconds": round(timed(lambda: match_pool(DonorPool(donors), requests, args.per_request, exclusive=True)), 3),
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="CPU cost of compatibility lookups and donor matching")
+    parser.add_argument("--donors", type=int, default=50000, help="donors to generate (about 70%% are available)")
+    parser.add_argument("--requests", type=int, default=10000, help="requests in the batch match")
+    parser.add_argument("--per-request", type=int, default=5)
+    parser.add_argument("--lookups", type=int, default=1000000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="write JSON results to this file")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    results = main(args)
+    text = json.dumps(results, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + "\n")
+    print(text)
@@ -0,0 +1,257 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT_DIR))
+
+from benchmarks.seed import BENCHMARK_PASSWORD, seed  # noqa: E402
+from benchmarks.workloads import MIXED_WEIGHTS, PROFILES, Context, Recorder  # noqa: E402
+from metrics import mongo_command_duration  # noqa: E402
+
+
+def percentile(values, q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def summarize(recorder: Recorder, elapsed: float) -> dict:
+    endpoints = {}
+    for name, latencies in sorted(recorder.latencies.items()):
+        endpoints[name] = {
+            "requests": len(latencies),
+            "errors": recorder.errors[name],
+            "throughput_rps": round(len(latencies) / elapsed, 2),
+            "bytes": recorder.bytes[name],
+            "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+            "p90_ms": round(percentile(latencies, 0.90) * 1000, 3),
+            "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+            "max_ms": round(max(latencies) * 1000, 3),
+        }
+    return endpoints
+
+
+def mongo_command_counts() -> dict:
+    # Commands the app's MongoCommandListener has seen, by collection and command
+    return {
+        f"{collection}.{command}" if collection else command: count
+        for (collection, command), count in mongo_command_duration.counts().items()
+    }
+
+
+def command_delta(before: dict, after: dict, iterations: int) -> dict:
+    by_command = {name: count - before.get(name, 0) for name, count in sorted(after.items()) if count > before.get(name, 0)}
+    total = sum(by_command.values())
+    return {
+        "total": total,
+        "per_iteration": round(total / iterations, 2) if iterations else 0.0,
+        "by_command": by_command,
+    }
+
+
+async def run_profile(client, ctx: Context, profile: str, duration: float, concurrency: int,
+                      background: str = None, background_concurrency: int = 0, count_commands: bool = False) -> dict:
+    recorder = Recorder()
+    background_recorder = Recorder()
+    deadline = time.perf_counter() + duration
+    iterations = 0
+
+    if profile == "mixed":
+        names = list(MIXED_WEIGHTS)
+        pick = lambda: ctx.rng.choices(names, weights=[MIXED_WEIGHTS[n] for n in names])[0]
+    else:
+        pick = lambda: profile
+
+    async def worker():
+        nonlocal iterations
+        while time.perf_counter() < deadline:
+            await PROFILES[pick()](client, ctx, recorder)
+            iterations += 1
+
+    async def background_worker():
+        # Load that runs alongside the measured profile, e.g. a login storm
+        while time.perf_counter() < deadline:
+            await PROFILES[background](client, ctx, background_recorder)
+
+    commands_before = mongo_command_counts() if count_commands else None
+    start = time.perf_counter()
+    await asyncio.gather(
+        *(worker() for _ in range(concurrency)),
+        *(background_worker() for _ in range(background_concurrency if background else 0))
+    )
+    elapsed = time.perf_counter() - start
+    result = {
+        "iterations": iterations,
+        "elapsed_seconds": round(elapsed, 3),
+        "iterations_per_second": round(iterations / elapsed, 2),
+        "endpoints": summarize(recorder, elapsed),
+    }
+    if count_commands:
+        # Includes the app's background tasks and the background profile, if any
+        result["mongo_commands"] = command_delta(commands_before, mongo_command_counts(), iterations)
+    if background:
+        result["background"] = {"profile": background, "endpoints": summarize(background_recorder, elapsed)}
+    return result
+
+
+async def check_consistency(db) -> dict:
+    # Every donation must be counted exactly once on its donor, even under concurrent retries
+    totals = await db.donors.aggregate([{"$group": {"_id": None, "total": {"$sum": "$total_donations"}}}]).to_list(1)
+    donor_total = totals[0]["total"] if totals else 0
+    donations = await db.donation_history.count_documents({})
+    return {"donor_total_donations": donor_total, "donation_documents": donations, "exact": donor_total == donations}
+
+
+def token_issuer(server, data: dict, legacy: bool = False):
+    # Tokens with the full claim set, as login issues them. Legacy tokens carry only the
+    # subject, so every request loads its user through the user cache.
+    if legacy:
+        return lambda user_id: server.create_access_token({"sub": user_id})
+    users = {user["id"]: user for user in data["users"]}
+    return lambda user_id: server.token_response(users[user_id]).access_token
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(baseline: dict, current: dict):
+    print(f"{'profile / endpoint':60} {'p50 ms':>18} {'p99 ms':>18} {'rps':>18}")
+    for profile, result in current["profiles"].items():
+        base_endpoints = baseline.get("profiles", {}).get(profile, {}).get("endpoints", {})
+        for name, stats in result["endpoints"].items():
+            base = base_endpoints.get(name)
+            if not base:
+                continue
+            cells = []
+            for key in ("p50_ms", "p99_ms", "throughput_rps"):
+                delta = (stats[key] - base[key]) / base[key] * 100 if base[key] else 0.0
+                cells.append(f"{stats[key]:>9} ({delta:+6.1f}%)")
+            print(f"{profile + ' ' + name:60} " + " ".join(cells))
+        base_commands = baseline.get("profiles", {}).get(profile, {}).get("mongo_commands")
+        if base_commands and "mongo_commands" in result:
+            print(f"{profile + ' mongo commands per iteration':60} "
+                  f"{result['mongo_commands']['per_iteration']:>9} (was {base_commands['per_iteration']})")
+
+
+async def main(args) -> dict:
+    os.environ.setdefault("MONGO_URL", args.mongo_url)
+    os.environ.setdefault("DB_NAME", args.db_name)
+    if args.memory:
+        # In-memory Motor stand-in, for runs without a local mongod
+        import motor.motor_asyncio
+        from mongomock_motor import AsyncMongoMockClient
+        motor.motor_asyncio.AsyncIOMotorClient = AsyncMongoMockClient
+
+    import httpx
+    import server
+
+    rng = random.Random(args.seed)
+    print(f"Seeding {args.scale} donors into {os.environ['DB_NAME']}...", file=sys.stderr)
+    data = await seed(server.db, args.scale, server.pwd_context.hash(BENCHMARK_PASSWORD), seed=args.seed)
+    ctx = Context(data, token_issuer(server, data, legacy=args.legacy_tokens), rng)
+    # mongomock-motor never calls command listeners
+    count_commands = not args.url and not args.memory
+
+    results = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "scale": args.scale,
+            "duration_seconds": args.duration,
+            "concurrency": args.concurrency,
+            "background": args.background,
+            "background_concurrency": args.background_concurrency if args.background else 0,
+            "target": args.url or "in-process",
+            "mongo": "memory" if args.memory else args.mongo_url,
+            "legacy_tokens": args.legacy_tokens,
+        },
+        "profiles": {},
+    }
+
+    async with server.app.router.lifespan_context(server.app):
+        if args.url:
+            client = httpx.AsyncClient(base_url=args.url, timeout=60)
+        else:
+            # Unhandled errors come back as 500s and count as errors, as they would over HTTP
+            transport = httpx.ASGITransport(app=server.app, raise_app_exceptions=False)
+            client = httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60)
+        async with client:
+            for profile in args.profile:
+                print(f"Running {profile} for {args.duration}s at concurrency {args.concurrency}...", file=sys.stderr)
+                results["profiles"][profile] = await run_profile(
+                    client, ctx, profile, args.duration, args.concurrency,
+                    background=args.background, background_concurrency=args.background_concurrency,
+                    count_commands=count_commands
+                )
+            if args.user_cache_off:
+                # The same profiles again, as with USER_CACHE_TTL_SECONDS=0
+                ttl, server.user_cache.ttl = server.user_cache.ttl, 0
+                results["user_cache_off"] = {}
+                for profile in args.profile:
+                    print(f"Running {profile} again without the user cache...", file=sys.stderr)
+                    result = await run_profile(
+                        client, ctx, profile, args.duration, args.concurrency,
+                        background=args.background, background_concurrency=args.background_concurrency,
+                        count_commands=count_commands
+                    )
+                    cached = results["profiles"][profile]["iterations_per_second"]
+                    result["cached_speedup"] = round(cached / result["iterations_per_second"], 2) if result["iterations_per_second"] else None
+                    results["user_cache_off"][profile] = result
+                server.user_cache.ttl = ttl
+        if server.dispatcher and not args.url:
+            results["dispatch"] = server.dispatcher.stats()
+    results["consistency"] = await check_consistency(server.db)
+    return results
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Seed a database and load-test the blood bank API")
+    parser.add_argument("--scale", type=int, default=1000, help="number of donors to seed")
+    parser.add_argument("--duration", type=float, default=10, help="seconds per profile")
+    parser.add_argument("--concurrency", type=int, default=20, help="concurrent virtual users")
+    parser.add_argument("--profile", action="append", choices=sorted(PROFILES) + ["mixed"],
+                        help="workload to run, repeatable (default: mixed)")
+    parser.add_argument("--background", choices=sorted(PROFILES),
+                        help="profile to run concurrently as background load (not part of the results)")
+    parser.add_argument("--background-concurrency", type=int, default=50)
+    parser.add_argument("--memory", action="store_true", help="use mongomock-motor instead of a real mongod")
+    parser.add_argument("--mongo-url", default="mongodb://localhost:27017")
+    parser.add_argument("--db-name", default="blood_bank_benchmark")
+    parser.add_argument("--url", help="drive a running server at this base URL instead of the app in-process")
+    parser.add_argument("--legacy-tokens", action="store_true",
+                        help="issue subject-only tokens, so every request looks its user up through the user cache")
+    parser.add_argument("--user-cache-off", action="store_true",
+                        help="run the profiles a second time with the user cache disabled (in-process only)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="write JSON results to this file")
+    parser.add_argument("--compare", help="baseline JSON results to compare against")
+    args = parser.parse_args(argv)
+    args.profile = args.profile or ["mixed"]
+    if args.user_cache_off and args.url:
+        parser.error("--user-cache-off needs the in-process app")
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    results = asyncio.run(main(args))
+    output = json.dumps(results, indent=2)
+    if args.output:
+        Path(args.output).write_text(output)
+    else:
+        print(output)
+    if args.compare:
+        compare(json.loads(Path(args.compare).read_text()), results)
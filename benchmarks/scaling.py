@@ -0,0 +1,110 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT_DIR))
+
+from benchmarks.run import git_commit, run_profile, token_issuer  # noqa: E402
+from benchmarks.seed import BENCHMARK_PASSWORD, seed  # noqa: E402
+from benchmarks.workloads import PROFILES, Context  # noqa: E402
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def wait_ready(client, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get("/metrics")).status_code == 200:
+                return
+        except Exception:
+            pass
+        await asyncio.sleep(0.5)
+    raise RuntimeError("server did not start")
+
+
+async def main(args) -> dict:
+    os.environ.setdefault("MONGO_URL", args.mongo_url)
+    os.environ.setdefault("DB_NAME", args.db_name)
+    # Workers and this process must agree on the signing key
+    os.environ.setdefault("JWT_SECRET_KEY", "benchmark-secret")
+
+    import httpx
+    import server
+
+    print(f"Seeding {args.scale} donors into {os.environ['DB_NAME']}...", file=sys.stderr)
+    data = await seed(server.db, args.scale, server.pwd_context.hash(BENCHMARK_PASSWORD), seed=args.seed)
+    results = {
+        "meta": {
+            "commit": git_commit(),
+            "scale": args.scale,
+            "duration_seconds": args.duration,
+            "concurrency": args.concurrency,
+            "profile": args.profile,
+            "cpu_count": os.cpu_count(),
+        },
+        "workers": {},
+    }
+    for workers in args.workers:
+        port = free_port()
+        process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "server:app", "--host", "127.0.0.1", "--port", str(port),
+             "--workers", str(workers), "--log-level", "warning"],
+            cwd=ROOT_DIR, env=os.environ.copy()
+        )
+        try:
+            async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=60) as client:
+                await wait_ready(client)
+                ctx = Context(data, token_issuer(server, data), random.Random(args.seed))
+                print(f"Running {args.profile} against {workers} workers...", file=sys.stderr)
+                result = await run_profile(client, ctx, args.profile, args.duration, args.concurrency)
+        finally:
+            process.terminate()
+            process.wait(timeout=30)
+        requests = sum(endpoint["requests"] for endpoint in result["endpoints"].values())
+        results["workers"][str(workers)] = {
+            "throughput_rps": round(requests / result["elapsed_seconds"], 2),
+            "iterations_per_second": result["iterations_per_second"],
+            "endpoints": result["endpoints"],
+        }
+    base = results["workers"].get(str(args.workers[0]), {}).get("throughput_rps")
+    for stats in results["workers"].values():
+        stats["speedup"] = round(stats["throughput_rps"] / base, 2) if base else None
+    return results
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Throughput of the API across uvicorn worker counts")
+    parser.add_argument("--workers", type=int, action="append", help="worker counts to try (default 1, 2, 4, 8)")
+    parser.add_argument("--profile", choices=sorted(PROFILES) + ["mixed"], default="mixed")
+    parser.add_argument("--scale", type=int, default=10000)
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--mongo-url", default="mongodb://localhost:27017")
+    parser.add_argument("--db-name", default="blood_bank_benchmark")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="write JSON results to this file")
+    args = parser.parse_args(argv)
+    args.workers = args.workers or [1, 2, 4, 8]
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    results = asyncio.run(main(args))
+    output = json.dumps(results, indent=2)
+    if args.output:
+        Path(args.output).write_text(output)
+    print(output)
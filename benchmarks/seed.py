@@ -0,0 +1,153 @@
+import random
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List
+
+from eligibility import DEFAULT_DEFERRAL_DAYS, DEFAULT_DONATION_TYPE, next_eligible
+from geo import geo_point
+
+BENCHMARK_PASSWORD = "benchmark-password"
+
+# Rough population frequencies so type-filtered queries see realistic selectivity
+BLOOD_TYPE_WEIGHTS = {
+    'O+': 38, 'A+': 34, 'B+': 9, 'O-': 7, 'A-': 6, 'AB+': 3, 'B-': 2, 'AB-': 1,
+}
+CITIES = [
+    "Mumbai", "Delhi", "Bangalore", "Hyderabad", "Chennai", "Kolkata", "Pune", "Ahmedabad",
+    "Jaipur", "Lucknow", "Surat", "Kanpur", "Nagpur", "Indore", "Bhopal", "Patna",
+]
+URGENCIES = ["low", "medium", "high", "critical"]
+STATUSES = ["pending", "pending", "accepted", "completed", "cancelled"]
+BATCH_SIZE = 5000
+
+
+def _random_time(rng: random.Random, now: datetime, days: int = 365) -> str:
+    return (now - timedelta(seconds=rng.randint(0, days * 86400))).isoformat()
+
+
+def _blood_type(rng: random.Random) -> str:
+    return rng.choices(list(BLOOD_TYPE_WEIGHTS), weights=list(BLOOD_TYPE_WEIGHTS.values()))[0]
+
+
+def _user(rng: random.Random, now: datetime, role: str, n: int, password_hash: str) -> dict:
+    return {
+        "id": str(uuid.uuid4()),
+        "email": f"{role}{n}@bench.example.com",
+        "name": f"Bench {role.title()} {n}",
+        "phone": f"+91{rng.randint(7000000000, 9999999999)}",
+        "role": role,
+        "location": rng.choice(CITIES),
+        "password_hash": password_hash,
+        "created_at": _random_time(rng, now),
+    }
+
+
+def generate(scale: int, password_hash: str, seed: int = 42) -> Dict[str, List[dict]]:
+    # `scale` is the number of donors; the other collections are sized relative to it
+    rng = random.Random(seed)
+    now = datetime.now(timezone.utc)
+    n_recipients = max(1, scale // 4)
+    n_requests = max(1, scale // 2)
+    n_donations = scale
+
+    users, donors, requests, donations, activities = [], [], [], [], []
+    users.append(_user(rng, now, "admin", 0, password_hash))
+    for n in range(scale):
+        user = _user(rng, now, "donor", n, password_hash)
+        users.append(user)
+        donors.append({
+            "id": str(uuid.uuid4()),
+            "user_id": user["id"],
+            "blood_type": _blood_type(rng),
+            "available": rng.random() < 0.7,
+            "last_donation_date": None,
+            "total_donations": 0,
+            "location_point": geo_point(user["location"]),
+            "created_at": user["created_at"],
+        })
+    recipients = []
+    for n in range(n_recipients):
+        user = _user(rng, now, "recipient", n, password_hash)
+        users.append(user)
+        recipients.append(user)
+
+    for _ in range(n_requests):
+        recipient = rng.choice(recipients)
+        created_at = _random_time(rng, now)
+        requests.append({
+            "id": str(uuid.uuid4()),
+            "recipient_id": recipient["id"],
+            "recipient_name": recipient["name"],
+            "recipient_phone": recipient["phone"],
+            "donor_id": None,
+            "donor_name": None,
+            "blood_type": _blood_type(rng),
+            "location": recipient["location"],
+            "urgency": rng.choice(URGENCIES),
+            "status": rng.choice(STATUSES),
+            "message": None,
+            "is_emergency": rng.random() < 0.05,
+            "created_at": created_at,
+            "updated_at": created_at,
+        })
+
+    completed = [r for r in requests if r["status"] == "completed"]
+    donor_users = {user["id"]: user for user in users if user["role"] == "donor"}
+    for n in range(n_donations):
+        donor = rng.choice(donors)
+        request = completed[n] if n < len(completed) else rng.choice(requests)
+        donation_date = _random_time(rng, now)
+        donor["total_donations"] += 1
+        donor["last_donation_date"] = max(donor["last_donation_date"] or "", donation_date)
+        donation = {
+            "id": str(uuid.uuid4()),
+            "donor_id": donor["id"],
+            "donor_name": donor_users[donor["user_id"]]["name"],
+            "recipient_id": request["recipient_id"],
+            "recipient_name": request["recipient_name"],
+            "blood_type": request["blood_type"],
+            "location": request["location"],
+            "donation_date": donation_date,
+            "units": 1,
+            # One donation per completed request (unique index); the rest were walk-ins with an id
+            # of their own, because mongomock ignores the index's partial filter on missing ids
+            "request_id": request["id"] if n < len(completed) else f"walk-in-{uuid.uuid4()}",
+        }
+        donations.append(donation)
+
+    for donor in donors:
+        last = donor["last_donation_date"]
+        donor["eligible_from"] = next_eligible(last, DEFAULT_DONATION_TYPE, DEFAULT_DEFERRAL_DAYS) if last else donor["created_at"]
+        donor["eligible"] = donor["eligible_from"] <= now.isoformat()
+
+    for n in range(200):
+        timestamp = _random_time(rng, now, days=30)
+        activities.append({
+            "id": str(uuid.uuid4()),
+            "type": rng.choice(["donation", "request", "registration"]),
+            "message": "Seeded activity",
+            "user_name": rng.choice(users)["name"],
+            "blood_type": _blood_type(rng),
+            "timestamp": timestamp,
+            # As the activity writer stores them, so startup has no TTL date to backfill
+            "recorded_at": datetime.fromisoformat(timestamp),
+        })
+
+    return {
+        "users": users,
+        "donors": donors,
+        "blood_requests": requests,
+        "donation_history": donations,
+        "activities": activities,
+    }
+
+
+async def seed(db, scale: int, password_hash: str, seed: int = 42) -> Dict[str, List[dict]]:
+    data = generate(scale, password_hash, seed)
+    for collection, docs in data.items():
+        await db[collection].delete_many({})
+        for start in range(0, len(docs), BATCH_SIZE):
+            # insert_many adds _id to the dicts; copies keep the returned data clean
+            await db[collection].insert_many([dict(doc) for doc in docs[start:start + BATCH_SIZE]], ordered=False)
+    await db.stats.delete_many({})
+    return data
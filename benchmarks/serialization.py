@@ -0,0 +1,72 @@
+import argparse
+import json
+import os
+import sys
+import time
+from pathlib import Path
+from typing import List
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT_DIR))
+
+from benchmarks.seed import generate  # noqa: E402
+
+
+def cpu_ms(fn, repeat: int) -> float:
+    fn()
+    start = time.process_time()
+    for _ in range(repeat):
+        fn()
+    return (time.process_time() - start) * 1000 / repeat
+
+
+def main(args) -> dict:
+    # Serialization only: no database or HTTP, so the numbers are CPU time per response body
+    os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+    os.environ.setdefault("DB_NAME", "blood_bank_benchmark")
+    from fastapi.encoders import jsonable_encoder
+    from pydantic import TypeAdapter
+    import server
+
+    data = generate(max(args.rows * 2, 1000), password_hash="x", seed=args.seed)
+    endpoints = {
+        "GET /api/blood-requests": (server.BloodRequest, server.blood_request_serializer, data["blood_requests"]),
+        "GET /api/donations/history": (server.DonationHistory, server.donation_history_serializer, data["donation_history"]),
+    }
+    results = {"meta": {"rows": args.rows, "repeat": args.repeat}, "endpoints": {}}
+    for name, (model, serializer, docs) in endpoints.items():
+        # What Mongo returns for the serializer's projection
+        docs = [{field: doc[field] for field in serializer.projection if field in doc} for doc in docs[:args.rows]]
+        adapter = TypeAdapter(List[model])
+
+        def per_item():
+            # Handler builds a model per document, FastAPI re-validates against response_model,
+            # encodes and JSONResponse dumps with the stdlib
+            models = [model(**doc) for doc in docs]
+            content = jsonable_encoder(adapter.dump_python(adapter.validate_python(models)))
+            return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode()
+
+        results["endpoints"][name] = {
+            "per_item_models_ms": round(cpu_ms(per_item, args.repeat), 3),
+            "validate_ms": round(cpu_ms(lambda: serializer.render(docs, "validate"), args.repeat), 3),
+            "trust_ms": round(cpu_ms(lambda: serializer.render(docs, "trust"), args.repeat), 3),
+        }
+    return results
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="CPU cost of serializing list responses")
+    parser.add_argument("--rows", type=int, default=1000, help="documents per response")
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="write JSON results to this file")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    results = main(args)
+    text = json.dumps(results, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + "\n")
+    print(text)
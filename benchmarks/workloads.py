@@ -0,0 +1,149 @@
+import asyncio
+import random
+import time
+from collections import defaultdict
+from typing import Callable, Dict, List
+
+from benchmarks.seed import BENCHMARK_PASSWORD, BLOOD_TYPE_WEIGHTS, CITIES
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.bytes: Dict[str, int] = defaultdict(int)
+
+    async def call(self, client, name: str, method: str, url: str, **kwargs):
+        start = time.perf_counter()
+        response = await client.request(method, url, **kwargs)
+        self.latencies[name].append(time.perf_counter() - start)
+        self.bytes[name] += len(response.content)
+        if response.status_code >= 400 and response.status_code != 304:
+            self.errors[name] += 1
+        return response
+
+
+class Context:
+    # Seeded ids and pre-issued tokens the workloads pick from
+    def __init__(self, data: dict, issue_token: Callable[[str], str], rng: random.Random):
+        self.rng = rng
+        users = data["users"]
+        self.donors = [u for u in users if u["role"] == "donor"]
+        self.recipients = [u for u in users if u["role"] == "recipient"]
+        self.admins = [u for u in users if u["role"] == "admin"]
+        sample = lambda users: {u["id"]: issue_token(u["id"]) for u in users[:500]}
+        self.tokens = {**sample(self.donors), **sample(self.recipients), **sample(self.admins)}
+        self.pending_requests = [r["id"] for r in data["blood_requests"] if r["status"] == "pending"]
+
+    def auth(self, users: List[dict]) -> dict:
+        user = self.rng.choice(users[:500])
+        return {"Authorization": f"Bearer {self.tokens[user['id']]}"}
+
+
+async def recipient_search(client, ctx: Context, rec: Recorder):
+    headers = ctx.auth(ctx.recipients)
+    params = {"available": "true", "blood_type": ctx.rng.choice(list(BLOOD_TYPE_WEIGHTS))}
+    if ctx.rng.random() < 0.5:
+        params["location"] = ctx.rng.choice(CITIES)
+    await asyncio.gather(
+        rec.call(client, "GET /api/donors", "GET", "/api/donors", params=params, headers=headers),
+        rec.call(client, "GET /api/blood-requests", "GET", "/api/blood-requests", headers=headers),
+    )
+
+
+async def nearest_donor_search(client, ctx: Context, rec: Recorder):
+    # Same search as recipient_search, through the $geoNear path instead of the substring filter
+    headers = ctx.auth(ctx.recipients)
+    params = {
+        "available": "true",
+        "compatible_with": ctx.rng.choice(list(BLOOD_TYPE_WEIGHTS)),
+        "near": ctx.rng.choice(CITIES),
+        "radius_km": 50,
+        "limit": 50,
+    }
+    await rec.call(client, "GET /api/donors?near", "GET", "/api/donors", params=params, headers=headers)
+
+
+async def donor_dashboard(client, ctx: Context, rec: Recorder):
+    headers = ctx.auth(ctx.donors)
+    await asyncio.gather(
+        rec.call(client, "GET /api/donors/me", "GET", "/api/donors/me", headers=headers),
+        rec.call(client, "GET /api/blood-requests", "GET", "/api/blood-requests", headers=headers),
+        rec.call(client, "GET /api/donations/history", "GET", "/api/donations/history", headers=headers),
+    )
+
+
+async def admin_dashboard(client, ctx: Context, rec: Recorder):
+    headers = ctx.auth(ctx.admins)
+    await asyncio.gather(
+        rec.call(client, "GET /api/stats", "GET", "/api/stats", headers=headers),
+        rec.call(client, "GET /api/blood-requests", "GET", "/api/blood-requests", headers=headers),
+        rec.call(client, "GET /api/donors/leaderboard", "GET", "/api/donors/leaderboard", headers=headers),
+        rec.call(client, "GET /api/activities", "GET", "/api/activities", headers=headers),
+    )
+
+
+async def landing_page(client, ctx: Context, rec: Recorder):
+    await asyncio.gather(
+        rec.call(client, "GET /api/activities", "GET", "/api/activities"),
+        rec.call(client, "GET /api/donors/leaderboard", "GET", "/api/donors/leaderboard"),
+        rec.call(client, "GET /api/stats", "GET", "/api/stats"),
+    )
+
+
+async def login_storm(client, ctx: Context, rec: Recorder):
+    user = ctx.rng.choice(ctx.donors + ctx.recipients)
+    await rec.call(client, "POST /api/auth/login", "POST", "/api/auth/login",
+                   json={"email": user["email"], "password": BENCHMARK_PASSWORD})
+
+
+async def donation_flow(client, ctx: Context, rec: Recorder):
+    # Recipient files a request, a donor records the donation, and the donor retries once
+    recipient_headers = ctx.auth(ctx.recipients)
+    response = await rec.call(client, "POST /api/blood-requests", "POST", "/api/blood-requests", headers=recipient_headers, json={
+        "blood_type": ctx.rng.choice(list(BLOOD_TYPE_WEIGHTS)),
+        "location": ctx.rng.choice(CITIES),
+        "urgency": ctx.rng.choice(["low", "medium", "high", "critical"]),
+        "is_emergency": ctx.rng.random() < 0.1,
+    })
+    if response.status_code != 200:
+        return
+    donation = {"request_id": response.json()["id"]}
+    donor_headers = ctx.auth(ctx.donors)
+    await asyncio.gather(
+        rec.call(client, "POST /api/donations", "POST", "/api/donations", headers=donor_headers, json=donation),
+        rec.call(client, "POST /api/donations", "POST", "/api/donations", headers=donor_headers, json=donation),
+    )
+
+
+async def emergency_burst(client, ctx: Context, rec: Recorder):
+    # Emergency requests arriving together; dispatch latency is reported under "dispatch"
+    headers = ctx.auth(ctx.recipients)
+    await rec.call(client, "POST /api/blood-requests", "POST", "/api/blood-requests", headers=headers, json={
+        "blood_type": ctx.rng.choice(list(BLOOD_TYPE_WEIGHTS)),
+        "location": ctx.rng.choice(CITIES),
+        "urgency": "critical",
+        "is_emergency": True,
+    })
+
+
+PROFILES = {
+    "recipient_search": recipient_search,
+    "nearest_donor_search": nearest_donor_search,
+    "donor_dashboard": donor_dashboard,
+    "admin_dashboard": admin_dashboard,
+    "landing_page": landing_page,
+    "login_storm": login_storm,
+    "donation_flow": donation_flow,
+    "emergency_burst": emergency_burst,
+}
+
+# Default traffic mix for --profile mixed
+MIXED_WEIGHTS = {
+    "recipient_search": 30,
+    "donor_dashboard": 30,
+    "admin_dashboard": 5,
+    "landing_page": 25,
+    "login_storm": 5,
+    "donation_flow": 5,
+}
@@ -0,0 +1,500 @@
+import argparse
+import asyncio
+import csv
+import io
+import json
+import logging
+import os
+import sys
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import AsyncIterator, List, Optional, Tuple
+
+from pydantic import BaseModel, EmailStr, Field, ValidationError, field_validator
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from compatibility import BLOOD_TYPES
+from eligibility import DEFAULT_DONATION_TYPE, next_eligible
+from geo import geo_point
+from pipelines import join_users, users_lookup
+from retention import DONATION_ARCHIVE, union_with_archive
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ("csv", "ndjson")
+# Export columns; total_donations and last_donation_date are informational, donation
+# counts are restored by importing the donation history
+DONOR_FIELDS = ["email", "name", "phone", "location", "blood_type", "available", "total_donations", "last_donation_date"]
+DONATION_FIELDS = ["id", "donor_email", "recipient_name", "recipient_email", "blood_type", "location", "donation_date", "units", "donation_type"]
+# recipient_id for historical donations whose recipient has no account
+EXTERNAL_RECIPIENT = "external"
+
+
+def _known_blood_type(value: Optional[str]) -> Optional[str]:
+    if value is not None and value not in BLOOD_TYPES:
+        raise ValueError(f"Unknown blood type {value}")
+    return value
+
+
+class DonorRow(BaseModel):
+    email: EmailStr
+    name: str
+    phone: str
+    location: str
+    blood_type: str
+    # Donors imported without a password cannot log in until one is set
+    password: Optional[str] = None
+    available: bool = True
+
+    @field_validator("blood_type")
+    @classmethod
+    def known_blood_type(cls, value):
+        return _known_blood_type(value)
+
+
+class DonationRow(BaseModel):
+    id: Optional[str] = None
+    donor_email: EmailStr
+    recipient_name: str
+    recipient_email: Optional[EmailStr] = None
+    blood_type: Optional[str] = None
+    location: Optional[str] = None
+    donation_date: str
+    units: int = Field(1, ge=1)
+    donation_type: str = DEFAULT_DONATION_TYPE
+
+    @field_validator("blood_type")
+    @classmethod
+    def known_blood_type(cls, value):
+        return _known_blood_type(value)
+
+    @field_validator("donation_date")
+    @classmethod
+    def iso_date(cls, value: str) -> str:
+        date = datetime.fromisoformat(value)
+        if date.tzinfo is None:
+            date = date.replace(tzinfo=timezone.utc)
+        # Stored dates are compared as strings, so they must all be UTC
+        return date.astimezone(timezone.utc).isoformat()
+
+
+def _describe(error: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(str(part) for part in e['loc'])}: {e['msg']}" for e in error.errors())
+
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line.decode("utf-8")
+    if buffer:
+        yield buffer.decode("utf-8")
+
+
+async def parse_records(chunks: AsyncIterator[bytes], fmt: str) -> AsyncIterator[Tuple[int, Optional[dict], Optional[str]]]:
+    # Yields (line number, record, error). One record per line: CSV fields with embedded
+    # newlines are not supported. Empty CSV cells are left out so model defaults apply.
+    header = None
+    line_no = 0
+    async for line in iter_lines(chunks):
+        line_no += 1
+        line = line.rstrip("\r")
+        if line_no == 1:
+            line = line.lstrip("\ufeff")
+        if not line.strip():
+            continue
+        if fmt == "ndjson":
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                yield line_no, None, f"Invalid JSON: {e}"
+                continue
+            if not isinstance(record, dict):
+                yield line_no, None, "Expected a JSON object"
+                continue
+            yield line_no, record, None
+            continue
+        values = next(csv.reader([line]))
+        if header is None:
+            header = [name.strip() for name in values]
+            continue
+        if len(values) != len(header):
+            yield line_no, None, f"Expected {len(header)} columns, got {len(values)}"
+            continue
+        yield line_no, {name: value for name, value in zip(header, values) if value != ""}, None
+
+
+# Imports donors or donation history in chunks: each chunk is validated row by row, new
+# passwords are hashed in a process pool and the chunk is written with unordered bulk
+# writes. Progress and per-row errors are yielded as events while the import runs.
+class BulkImporter:
+    def __init__(self, db, hasher, deferrals: dict, chunk_size: int = 1000, update_existing: bool = False, analytics=None):
+        self.db = db
+        # An AnalyticsStore receives the imported donations of each chunk
+        self.analytics = analytics
+        self.hasher = hasher
+        self.deferrals = deferrals
+        self.chunk_size = chunk_size
+        self.update_existing = update_existing
+        self.processed = 0
+        self.imported = 0
+        self.updated = 0
+        self.failed = 0
+        # Users whose documents were modified, for the caller to drop from its caches
+        self.touched_user_ids: List[str] = []
+        self._seen = set()
+
+    def _progress(self, event: str = "progress") -> dict:
+        return {
+            "event": event,
+            "processed": self.processed,
+            "imported": self.imported,
+            "updated": self.updated,
+            "failed": self.failed
+        }
+
+    def _error(self, line: int, message: str) -> dict:
+        self.failed += 1
+        return {"event": "error", "line": line, "error": message}
+
+    async def _chunks(self, records, model):
+        chunk, errors = [], []
+        async for line, record, error in records:
+            self.processed += 1
+            if error is None:
+                try:
+                    chunk.append((line, model.model_validate(record)))
+                except ValidationError as e:
+                    error = _describe(e)
+            if error is not None:
+                errors.append(self._error(line, error))
+            if len(chunk) + len(errors) >= self.chunk_size:
+                yield chunk, errors
+                chunk, errors = [], []
+        if chunk or errors:
+            yield chunk, errors
+
+    async def import_donors(self, records) -> AsyncIterator[dict]:
+        async for chunk, errors in self._chunks(records, DonorRow):
+            for event in errors + await self._write_donors(chunk):
+                yield event
+            yield self._progress()
+        yield self._progress("done")
+
+    async def import_donations(self, records) -> AsyncIterator[dict]:
+        async for chunk, errors in self._chunks(records, DonationRow):
+            for event in errors + await self._write_donations(chunk):
+                yield event
+            yield self._progress()
+        yield self._progress("done")
+
+    async def _write_donors(self, chunk: List[Tuple[int, DonorRow]]) -> List[dict]:
+        now = datetime.now(timezone.utc).isoformat()
+        emails = [row.email for _, row in chunk]
+        existing = {
+            user["email"]: user
+            async for user in self.db.users.find({"email": {"$in": emails}}, {"_id": 0, "id": 1, "email": 1, "role": 1})
+        }
+        errors, new_rows, updates = [], [], []
+        for line, row in chunk:
+            if row.email in self._seen:
+                errors.append(self._error(line, "Duplicate email in import"))
+                continue
+            self._seen.add(row.email)
+            user = existing.get(row.email)
+            if user is None:
+                new_rows.append((line, row))
+            elif not self.update_existing:
+                errors.append(self._error(line, "Email already registered"))
+            elif user["role"] != "donor":
+                errors.append(self._error(line, f"Email belongs to a {user['role']} account"))
+            else:
+                updates.append((user["id"], row))
+
+        hashes = iter(await self.hasher.hash_many([row.password for _, row in new_rows if row.password]))
+        users, donors, lines = [], [], []
+        for line, row in new_rows:
+            user_id = str(uuid.uuid4())
+            users.append({
+                "id": user_id,
+                "email": row.email,
+                "name": row.name,
+                "phone": row.phone,
+                "role": "donor",
+                "location": row.location,
+                "password_hash": next(hashes) if row.password else None,
+                "created_at": now
+            })
+            donors.append({
+                "id": str(uuid.uuid4()),
+                "user_id": user_id,
+                "blood_type": row.blood_type,
+                "available": row.available,
+                "last_donation_date": None,
+                "total_donations": 0,
+                "location_point": geo_point(row.location),
+                "eligible_from": now,
+                "eligible": True,
+                "created_at": now
+            })
+            lines.append(line)
+        if users:
+            failed = set()
+            try:
+                await self.db.users.insert_many(users, ordered=False)
+            except BulkWriteError as e:
+                # Registered concurrently since the lookup above
+                for error in e.details.get("writeErrors", []):
+                    failed.add(error["index"])
+                    message = "Email already registered" if error["code"] == 11000 else error["errmsg"]
+                    errors.append(self._error(lines[error["index"]], message))
+            donors = [donor for i, donor in enumerate(donors) if i not in failed]
+            if donors:
+                await self.db.donors.insert_many(donors, ordered=False)
+            self.imported += len(donors)
+
+        if updates:
+            # Profile fields only; imports never change an existing account's password
+            await self.db.users.bulk_write([
+                UpdateOne({"id": user_id}, {"$set": {"name": row.name, "phone": row.phone, "location": row.location}})
+                for user_id, row in updates
+            ], ordered=False)
+            await self.db.donors.bulk_write([
+                UpdateOne({"user_id": user_id}, {
+                    "$set": {"blood_type": row.blood_type, "available": row.available, "location_point": geo_point(row.location)},
+                    "$setOnInsert": {
+                        "id": str(uuid.uuid4()), "last_donation_date": None, "total_donations": 0,
+                        "eligible_from": now, "eligible": True, "created_at": now
+                    }
+                }, upsert=True)
+                for user_id, row in updates
+            ], ordered=False)
+            self.updated += len(updates)
+            self.touched_user_ids.extend(user_id for user_id, _ in updates)
+        return errors
+
+    async def _write_donations(self, chunk: List[Tuple[int, DonationRow]]) -> List[dict]:
+        emails = {row.donor_email for _, row in chunk} | {row.recipient_email for _, row in chunk if row.recipient_email}
+        users = {
+            user["email"]: user
+            async for user in self.db.users.find(
+                {"email": {"$in": list(emails)}}, {"_id": 0, "id": 1, "email": 1, "name": 1, "location": 1, "role": 1})
+        }
+        donors = {
+            donor["user_id"]: donor
+            async for donor in self.db.donors.find(
+                {"user_id": {"$in": [user["id"] for user in users.values() if user["role"] == "donor"]}},
+                {"_id": 0, "id": 1, "user_id": 1, "blood_type": 1})
+        }
+        errors, docs, lines = [], [], []
+        for line, row in chunk:
+            user = users.get(row.donor_email)
+            donor = donors.get(user["id"]) if user else None
+            if donor is None:
+                errors.append(self._error(line, f"Unknown donor {row.donor_email}"))
+                continue
+            recipient = users.get(row.recipient_email) if row.recipient_email else None
+            if row.recipient_email and recipient is None:
+                errors.append(self._error(line, f"Unknown recipient {row.recipient_email}"))
+                continue
+            if row.donation_type not in self.deferrals:
+                errors.append(self._error(line, f"Unknown donation type {row.donation_type}"))
+                continue
+            docs.append({
+                "id": row.id or str(uuid.uuid4()),
+                "donor_id": donor["id"],
+                "donor_name": user["name"],
+                "recipient_id": recipient["id"] if recipient else EXTERNAL_RECIPIENT,
+                "recipient_name": row.recipient_name,
+                "blood_type": row.blood_type or donor["blood_type"],
+                "location": row.location or user.get("location") or "",
+                "donation_date": row.donation_date,
+                "units": row.units,
+                "donation_type": row.donation_type
+            })
+            lines.append(line)
+        # Exports include archived donations, which the unique id index on the hot collection cannot see
+        archived = {
+            doc["id"]
+            async for doc in self.db[DONATION_ARCHIVE].find({"id": {"$in": [doc["id"] for doc in docs]}}, {"_id": 0, "id": 1})
+        }
+        if archived:
+            errors.extend(self._error(line, "Donation already imported") for line, doc in zip(lines, docs) if doc["id"] in archived)
+            lines = [line for line, doc in zip(lines, docs) if doc["id"] not in archived]
+            docs = [doc for doc in docs if doc["id"] not in archived]
+        if not docs:
+            return errors
+
+        failed = set()
+        try:
+            await self.db.donation_history.insert_many(docs, ordered=False)
+        except BulkWriteError as e:
+            # Re-importing an export: rows carrying an existing id are skipped
+            for error in e.details.get("writeErrors", []):
+                failed.add(error["index"])
+                message = "Donation already imported" if error["code"] == 11000 else error["errmsg"]
+                errors.append(self._error(lines[error["index"]], message))
+        totals = {}
+        for i, doc in enumerate(docs):
+            if i in failed:
+                continue
+            count, latest, eligible_from = totals.get(doc["donor_id"], (0, "", ""))
+            totals[doc["donor_id"]] = (
+                count + 1,
+                max(latest, doc["donation_date"]),
+                max(eligible_from, next_eligible(doc["donation_date"], doc["donation_type"], self.deferrals))
+            )
+        if totals:
+            # The caller re-syncs the `eligible` flags once the import is done
+            await self.db.donors.bulk_write([
+                UpdateOne({"id": donor_id}, {
+                    "$inc": {"total_donations": count},
+                    "$max": {"last_donation_date": latest, "eligible_from": eligible_from}
+                })
+                for donor_id, (count, latest, eligible_from) in totals.items()
+            ], ordered=False)
+        if self.analytics is not None and len(failed) < len(docs):
+            await self.analytics.donations_imported([doc for i, doc in enumerate(docs) if i not in failed])
+        self.imported += len(docs) - len(failed)
+        return errors
+
+
+async def export_donors(db) -> AsyncIterator[dict]:
+    pipeline = [
+        {"$sort": {"created_at": 1, "id": 1}},
+        *join_users(),
+        {"$project": {
+            "email": "$user.email",
+            "name": "$user.name",
+            "phone": "$user.phone",
+            "location": "$user.location",
+            "blood_type": 1,
+            "available": 1,
+            "total_donations": 1,
+            "last_donation_date": 1
+        }},
+    ]
+    async for doc in db.donors.aggregate(pipeline):
+        yield doc
+
+
+async def export_donations(db) -> AsyncIterator[dict]:
+    # Hot and archived history, with donors and recipients identified by email
+    pipeline = [
+        union_with_archive(DONATION_ARCHIVE, {}),
+        {"$lookup": {"from": "donors", "localField": "donor_id", "foreignField": "id", "as": "donor"}},
+        users_lookup("donor.user_id", "donor_user"),
+        users_lookup("recipient_id", "recipient"),
+        {"$project": {
+            "_id": 0,
+            "id": 1,
+            "donor_email": {"$first": "$donor_user.email"},
+            "recipient_name": 1,
+            "recipient_email": {"$first": "$recipient.email"},
+            "blood_type": 1,
+            "location": 1,
+            "donation_date": 1,
+            "units": 1,
+            "donation_type": {"$ifNull": ["$donation_type", DEFAULT_DONATION_TYPE]}
+        }},
+    ]
+    async for doc in db.donation_history.aggregate(pipeline):
+        yield doc
+
+
+async def format_records(records: AsyncIterator[dict], fmt: str, fields: List[str], flush_bytes: int = 65536) -> AsyncIterator[str]:
+    if fmt == "ndjson":
+        async for record in records:
+            yield json.dumps(record) + "\n"
+        return
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fields, extrasaction="ignore", lineterminator="\n")
+    writer.writeheader()
+    async for record in records:
+        writer.writerow(record)
+        if buffer.tell() >= flush_bytes:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def format_for(path: str, fmt: Optional[str]) -> str:
+    if fmt:
+        return fmt
+    return "ndjson" if path.endswith((".ndjson", ".jsonl")) else "csv"
+
+
+async def read_chunks(f, size: int = 1 << 20) -> AsyncIterator[bytes]:
+    while chunk := f.read(size):
+        yield chunk
+
+
+async def _file_chunks(path: str, size: int = 1 << 20) -> AsyncIterator[bytes]:
+    with open(path, "rb") as f:
+        async for chunk in read_chunks(f, size):
+            yield chunk
+
+
+async def _main(args) -> int:
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+    from passlib.context import CryptContext
+
+    from analytics import AnalyticsStore
+    from eligibility import parse_deferrals, sync_eligible_flags
+    from hashing import BatchPasswordHasher
+    from stats import StatsStore
+
+    load_dotenv(Path(__file__).parent / '.env')
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    db = client[os.environ['DB_NAME']]
+    fmt = format_for(args.path, args.format)
+    try:
+        if args.command.startswith("export"):
+            records, fields = (export_donors(db), DONOR_FIELDS) if args.command == "export-donors" else (export_donations(db), DONATION_FIELDS)
+            with open(args.path, "w", newline="") as out:
+                async for text in format_records(records, fmt, fields):
+                    out.write(text)
+            return 0
+
+        hasher = BatchPasswordHasher(CryptContext(schemes=["bcrypt"], deprecated="auto"), workers=args.workers)
+        deferrals = parse_deferrals(os.environ.get('ELIGIBILITY_DEFERRAL_DAYS', ''))
+        importer = BulkImporter(db, hasher, deferrals, chunk_size=args.chunk_size, update_existing=args.update_existing,
+                                analytics=AnalyticsStore(db))
+        records = parse_records(_file_chunks(args.path), fmt)
+        events = importer.import_donors(records) if args.command == "import-donors" else importer.import_donations(records)
+        errors = open(args.errors, "w") if args.errors else sys.stdout
+        try:
+            async for event in events:
+                if event["event"] == "error":
+                    errors.write(json.dumps(event) + "\n")
+                else:
+                    print(f"{event['processed']} rows: {event['imported']} imported, {event['updated']} updated, {event['failed']} failed", file=sys.stderr)
+        finally:
+            if errors is not sys.stdout:
+                errors.close()
+            hasher.shutdown()
+        await StatsStore(db).reconcile()
+        await sync_eligible_flags(db)
+        # Running servers pick up the rest on their leaderboard refresh and user cache TTL
+        return 1 if importer.failed else 0
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Bulk import and export of donors and donation history")
+    parser.add_argument("command", choices=["import-donors", "import-donations", "export-donors", "export-donations"])
+    parser.add_argument("path", help="CSV or NDJSON file to read or write")
+    parser.add_argument("--format", choices=FORMATS, help="defaults to ndjson for .ndjson/.jsonl files, csv otherwise")
+    parser.add_argument("--update-existing", action="store_true", help="update donors whose email is already registered")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="password hashing processes")
+    parser.add_argument("--errors", help="write per-row errors to this NDJSON file instead of stdout")
+    sys.exit(asyncio.run(_main(parser.parse_args())))
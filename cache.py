@@ -0,0 +1,165 @@
+import asyncio
+import json
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+_MISSING = object()
+
+
+# Storage behind a TTLCache; subclass to share entries between workers
+class CacheBackend:
+    def get(self, key: str) -> Any:
+        raise NotImplementedError
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        raise NotImplementedError
+
+
+# In-process LRU store with per-entry expiry
+class MemoryBackend(CacheBackend):
+    def __init__(self, max_size: int = 10000):
+        self.max_size = max_size
+        self.evictions = 0
+        self._entries: "OrderedDict[str, tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key: str) -> Any:
+        entry = self._entries.get(key)
+        if entry is None:
+            return _MISSING
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return _MISSING
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def delete(self, key: str) -> None:
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+# Local SQLite file shared by every worker process on the host, so an invalidation in one
+# worker is seen by the others. Values must be JSON-serializable; expiry uses wall-clock time.
+class SQLiteBackend(CacheBackend):
+    def __init__(self, path: str, namespace: str = "default", purge_every: int = 1000):
+        self.path = path
+        self.namespace = namespace
+        self.purge_every = purge_every
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid = None
+        self._writes = 0
+
+    def _connection(self) -> sqlite3.Connection:
+        # One connection per process; a forked worker must not reuse its parent's
+        if self._conn is None or self._pid != os.getpid():
+            self._conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, expires_at REAL, value TEXT)")
+            self._pid = os.getpid()
+        return self._conn
+
+    def _key(self, key: str) -> str:
+        return f"{self.namespace}:{key}"
+
+    def get(self, key: str) -> Any:
+        row = self._connection().execute("SELECT expires_at, value FROM cache WHERE key = ?", (self._key(key),)).fetchone()
+        if row is None or row[0] < time.time():
+            return _MISSING
+        return json.loads(row[1])
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        conn = self._connection()
+        conn.execute("INSERT OR REPLACE INTO cache (key, expires_at, value) VALUES (?, ?, ?)",
+                     (self._key(key), time.time() + ttl, json.dumps(value)))
+        self._writes += 1
+        if self._writes % self.purge_every == 0:
+            conn.execute("DELETE FROM cache WHERE expires_at < ?", (time.time(),))
+
+    def delete(self, key: str) -> None:
+        self._connection().execute("DELETE FROM cache WHERE key = ?", (self._key(key),))
+
+    def clear(self) -> None:
+        prefix = f"{self.namespace}:"
+        self._connection().execute("DELETE FROM cache WHERE substr(key, 1, ?) = ?", (len(prefix), prefix))
+
+
+# Concurrent calls for the same key share one in-flight load. The load runs as its own task,
+# so a caller that goes away (client disconnect) does not cancel it for the others.
+class SingleFlight:
+    def __init__(self):
+        self._calls: Dict[str, asyncio.Future] = {}
+        self.shared = 0
+
+    async def do(self, key: str, loader: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(loader())
+            self._calls[key] = task
+            task.add_done_callback(lambda _: self._calls.pop(key, None))
+        else:
+            self.shared += 1
+        return await asyncio.shield(task)
+
+
+class TTLCache:
+    def __init__(self, ttl: float, backend: Optional[CacheBackend] = None):
+        self.ttl = ttl
+        self.backend = backend or MemoryBackend()
+        self.hits = 0
+        self.misses = 0
+        self._flight = SingleFlight()
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    async def get_or_load(self, key: str, loader: Callable[[], Awaitable[Any]]) -> Any:
+        if not self.enabled:
+            return await loader()
+        value = self.backend.get(key)
+        if value is not _MISSING:
+            self.hits += 1
+            return value
+        self.misses += 1
+
+        async def load():
+            value = await loader()
+            # Negative results are not cached so a freshly created record is visible immediately
+            if value is not None:
+                self.backend.set(key, value, self.ttl)
+            return value
+        return await self._flight.do(key, load)
+
+    def invalidate(self, key: str) -> None:
+        self.backend.delete(key)
+
+    def clear(self) -> None:
+        self.backend.clear()
+
+    def stats(self) -> dict:
+        stats = {"hits": self.hits, "misses": self.misses, "coalesced": self._flight.shared, "ttl_seconds": self.ttl}
+        if isinstance(self.backend, MemoryBackend):
+            stats.update({"size": len(self.backend), "max_size": self.backend.max_size, "evictions": self.backend.evictions})
+        return stats
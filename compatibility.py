@@ -0,0 +1,51 @@
+from typing import Dict, List, Tuple
+
+BLOOD_TYPES = ['O-', 'O+', 'A-', 'A+', 'B-', 'B+', 'AB-', 'AB+']
+BLOOD_TYPE_INDEX = {blood_type: i for i, blood_type in enumerate(BLOOD_TYPES)}
+
+# Antigens carried by each type: A, B and Rh(D). Red cells can be given to a recipient
+# whose blood carries every antigen the donor's does.
+_A, _B, _RH = 1, 2, 4
+_ANTIGENS = {
+    'O-': 0, 'O+': _RH,
+    'A-': _A, 'A+': _A | _RH,
+    'B-': _B, 'B+': _B | _RH,
+    'AB-': _A | _B, 'AB+': _A | _B | _RH,
+}
+
+# Bitmask tables indexed by BLOOD_TYPE_INDEX, built once at import time:
+# CAN_GIVE_TO[d] has bit r set when donor type d can give to recipient type r,
+# CAN_RECEIVE_FROM[r] has bit d set for the same pair.
+CAN_GIVE_TO: List[int] = [0] * len(BLOOD_TYPES)
+CAN_RECEIVE_FROM: List[int] = [0] * len(BLOOD_TYPES)
+for _d, _donor in enumerate(BLOOD_TYPES):
+    for _r, _recipient in enumerate(BLOOD_TYPES):
+        if _ANTIGENS[_donor] & ~_ANTIGENS[_recipient] == 0:
+            CAN_GIVE_TO[_d] |= 1 << _r
+            CAN_RECEIVE_FROM[_r] |= 1 << _d
+
+
+def _types_in(mask: int) -> Tuple[str, ...]:
+    return tuple(blood_type for i, blood_type in enumerate(BLOOD_TYPES) if mask >> i & 1)
+
+
+RECIPIENT_TYPES: Dict[str, Tuple[str, ...]] = {bt: _types_in(CAN_GIVE_TO[i]) for i, bt in enumerate(BLOOD_TYPES)}
+DONOR_TYPES: Dict[str, Tuple[str, ...]] = {bt: _types_in(CAN_RECEIVE_FROM[i]) for i, bt in enumerate(BLOOD_TYPES)}
+
+
+def is_compatible(donor_type: str, recipient_type: str) -> bool:
+    d = BLOOD_TYPE_INDEX.get(donor_type)
+    r = BLOOD_TYPE_INDEX.get(recipient_type)
+    if d is None or r is None:
+        return False
+    return bool(CAN_GIVE_TO[d] >> r & 1)
+
+
+def recipient_types_for(donor_type: str) -> Tuple[str, ...]:
+    # Who can receive from this donor type
+    return RECIPIENT_TYPES.get(donor_type, ())
+
+
+def donor_types_for(recipient_type: str) -> Tuple[str, ...]:
+    # Who can give to this recipient type
+    return DONOR_TYPES.get(recipient_type, ())
@@ -0,0 +1,160 @@
+import asyncio
+import importlib
+import itertools
+import logging
+from collections import deque
+from typing import Dict, List
+
+from matching import match_requests
+from metrics import dispatch_notifications, dispatch_time_to_first_notification
+from ratelimit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+URGENCY_RANK = {"emergency": 0, "critical": 1, "high": 2, "medium": 3, "low": 4}
+
+
+def priority(request: dict) -> tuple:
+    # Emergencies first, then by urgency, then oldest first
+    return (not request.get("is_emergency"), URGENCY_RANK.get(request.get("urgency"), len(URGENCY_RANK)), request.get("created_at", ""))
+
+
+class LogSink:
+    # Stand-in for an SMS/email gateway
+    async def send(self, donor: dict, request: dict):
+        logger.info("Notify donor %s (%s) about %s request %s in %s",
+                    donor["id"], donor["user"].get("phone"), request["blood_type"], request["id"], request.get("location"))
+
+
+def load_sink(spec: str):
+    # "log" or "package.module:factory"; the factory returns an object with async send(donor, request)
+    if spec == "log":
+        return LogSink()
+    module_name, _, attr = spec.partition(":")
+    return getattr(importlib.import_module(module_name), attr)()
+
+
+# Fans new blood requests out to compatible available donors. New requests wait in a priority
+# queue and are matched in batches (one bounded donor query per compatible type per batch); a
+# lone request waits match_window seconds so that a burst shares one batch. Notifications wait
+# in a second priority queue drained by workers through a shared token bucket, with exponential
+# backoff retries for failed sends.
+class Dispatcher:
+    def __init__(self, db, sink, donors_per_request: int = 10, rate: float = 20, burst: int = 50,
+                 workers: int = 4, match_batch: int = 50, match_window: float = 0.01, max_attempts: int = 3,
+                 retry_delay: float = 1.0):
+        self.db = db
+        self.sink = sink
+        self.donors_per_request = donors_per_request
+        self.bucket = TokenBucket(rate, burst)
+        self.workers = workers
+        self.match_batch = match_batch
+        self.match_window = match_window
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self._requests: asyncio.PriorityQueue = asyncio.PriorityQueue()
+        self._notifications: asyncio.PriorityQueue = asyncio.PriorityQueue()
+        self._seq = itertools.count()
+        # request id -> (submitted at, notifications still outstanding) until the first send succeeds
+        self._waiting: Dict[str, list] = {}
+        self._first_notification: deque = deque(maxlen=1000)
+        self._tasks: List[asyncio.Task] = []
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self.unmatched = 0
+
+    def start(self):
+        self._tasks.append(asyncio.create_task(self._match_loop(), name="dispatch-match"))
+        for n in range(self.workers):
+            self._tasks.append(asyncio.create_task(self._notify_loop(), name=f"dispatch-notify-{n}"))
+
+    def submit(self, request: dict):
+        self._waiting[request["id"]] = [asyncio.get_running_loop().time(), 0]
+        self._requests.put_nowait((priority(request), next(self._seq), request))
+
+    async def _match_loop(self):
+        while True:
+            batch = [(await self._requests.get())[2]]
+            if self.match_window and self._requests.empty():
+                await asyncio.sleep(self.match_window)
+            while len(batch) < self.match_batch and not self._requests.empty():
+                batch.append(self._requests.get_nowait()[2])
+            try:
+                matches = await match_requests(self.db, batch, per_request=self.donors_per_request)
+            except Exception:
+                logger.exception("Matching %s requests for dispatch failed", len(batch))
+                for request in batch:
+                    self._waiting.pop(request["id"], None)
+                continue
+            for request in batch:
+                donors = matches.get(request["id"], [])
+                # The requested donor, if any, does not need to be told twice
+                donors = [donor for donor in donors if donor["id"] != request.get("donor_id")]
+                if not donors:
+                    self.unmatched += 1
+                    self._waiting.pop(request["id"], None)
+                    continue
+                waiting = self._waiting.get(request["id"])
+                if waiting:
+                    waiting[1] += len(donors)
+                for donor in donors:
+                    self._notifications.put_nowait((priority(request), next(self._seq), 1, donor, request))
+
+    async def _notify_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await self._notifications.get()
+            rank, _, attempt, donor, request = item
+            await self.bucket.acquire()
+            try:
+                await self.sink.send(donor, request)
+            except Exception:
+                if attempt < self.max_attempts:
+                    self.retried += 1
+                    dispatch_notifications.inc(outcome="retried")
+                    retry = (rank, next(self._seq), attempt + 1, donor, request)
+                    loop.call_later(self.retry_delay * 2 ** (attempt - 1), self._notifications.put_nowait, retry)
+                    continue
+                self.failed += 1
+                dispatch_notifications.inc(outcome="failed")
+                logger.exception("Giving up notifying donor %s about request %s", donor["id"], request["id"])
+                self._settle(request, sent=False)
+                continue
+            self.sent += 1
+            dispatch_notifications.inc(outcome="sent")
+            self._settle(request, sent=True)
+
+    def _settle(self, request: dict, sent: bool):
+        waiting = self._waiting.get(request["id"])
+        if waiting is None:
+            return
+        if sent:
+            elapsed = asyncio.get_running_loop().time() - waiting[0]
+            dispatch_time_to_first_notification.observe(elapsed, emergency=str(bool(request.get("is_emergency"))).lower())
+            self._first_notification.append(elapsed)
+            del self._waiting[request["id"]]
+            return
+        waiting[1] -= 1
+        if waiting[1] <= 0:
+            del self._waiting[request["id"]]
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def stats(self) -> dict:
+        samples = sorted(self._first_notification)
+        pick = lambda q: round(samples[min(len(samples) - 1, int(q * len(samples)))], 4) if samples else None
+        return {
+            "queued_requests": self._requests.qsize(),
+            "queued_notifications": self._notifications.qsize(),
+            "sent": self.sent,
+            "failed": self.failed,
+            "retried": self.retried,
+            "unmatched": self.unmatched,
+            "time_to_first_notification_p50": pick(0.5),
+            "time_to_first_notification_p95": pick(0.95),
+        }
@@ -0,0 +1,58 @@
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional
+
+from pymongo import UpdateOne
+
+# Minimum days between a donation of this type and the donor's next donation
+DEFAULT_DEFERRAL_DAYS = {
+    "whole_blood": 56,
+    "double_red_cells": 112,
+    "plasma": 28,
+    "platelets": 7,
+}
+DEFAULT_DONATION_TYPE = "whole_blood"
+
+
+def parse_deferrals(spec: str) -> Dict[str, int]:
+    # "platelets=14,plasma=28" overrides or adds to the defaults
+    deferrals = dict(DEFAULT_DEFERRAL_DAYS)
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        donation_type, _, days = item.partition("=")
+        deferrals[donation_type.strip()] = int(days)
+    return deferrals
+
+
+def next_eligible(donation_date: str, donation_type: str, deferrals: Dict[str, int]) -> str:
+    date = datetime.fromisoformat(donation_date)
+    return (date + timedelta(days=deferrals[donation_type])).isoformat()
+
+
+def eligible_filter(now: Optional[str] = None) -> dict:
+    # Every donor document carries eligible_from, so "eligible now" is one index range
+    return {"eligible_from": {"$lte": now or datetime.now(timezone.utc).isoformat()}}
+
+
+async def sync_eligible_flags(db) -> int:
+    # Flips the denormalized `eligible` flag in bulk: back on for donors whose deferral has
+    # passed, off for donors given a future eligible_from by an import
+    now = datetime.now(timezone.utc).isoformat()
+    restored = await db.donors.update_many({"eligible": False, "eligible_from": {"$lte": now}}, {"$set": {"eligible": True}})
+    deferred = await db.donors.update_many({"eligible_from": {"$gt": now}, "eligible": {"$ne": False}}, {"$set": {"eligible": False}})
+    return restored.modified_count + deferred.modified_count
+
+
+async def backfill_eligibility(db, deferrals: Dict[str, int], batch_size: int = 1000) -> int:
+    # Donors from before eligibility tracking: assume their last donation was whole blood
+    now = datetime.now(timezone.utc).isoformat()
+    updated = 0
+    operations = []
+    async for donor in db.donors.find({"eligible_from": {"$exists": False}}, {"_id": 0, "id": 1, "last_donation_date": 1, "created_at": 1}):
+        last = donor.get("last_donation_date")
+        eligible_from = next_eligible(last, DEFAULT_DONATION_TYPE, deferrals) if last else donor["created_at"]
+        operations.append(UpdateOne({"id": donor["id"]}, {"$set": {"eligible_from": eligible_from, "eligible": eligible_from <= now}}))
+        if len(operations) >= batch_size:
+            updated += (await db.donors.bulk_write(operations, ordered=False)).modified_count
+            operations = []
+    if operations:
+        updated += (await db.donors.bulk_write(operations, ordered=False)).modified_count
+    return updated
@@ -0,0 +1,93 @@
+import asyncio
+import logging
+from typing import Callable, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+ACTIVITY = "activity"
+REQUEST_CREATED = "request.created"
+REQUEST_UPDATED = "request.updated"
+
+
+class Subscription:
+    def __init__(self, bus: "EventBus", accepts: Optional[Callable[[dict], bool]], max_queue: int):
+        self.bus = bus
+        self.accepts = accepts
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+
+    def offer(self, event: dict):
+        if self.accepts is not None and not self.accepts(event):
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # A slow client loses events rather than stalling every publisher
+            self.bus.dropped += 1
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[dict]:
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        self.bus.unsubscribe(self)
+
+
+# In-process fan-out of small change events to connected clients
+class EventBus:
+    def __init__(self, max_queue: int = 100):
+        self.max_queue = max_queue
+        self.published = 0
+        self.dropped = 0
+        self._subscriptions: Set[Subscription] = set()
+
+    def subscribe(self, accepts: Optional[Callable[[dict], bool]] = None) -> Subscription:
+        subscription = Subscription(self, accepts, self.max_queue)
+        self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        self._subscriptions.discard(subscription)
+
+    def publish(self, event_type: str, data: dict):
+        event = {"type": event_type, "data": data}
+        self.published += 1
+        for subscription in list(self._subscriptions):
+            subscription.offer(event)
+
+    def stats(self) -> dict:
+        return {
+            "subscribers": len(self._subscriptions),
+            "published": self.published,
+            "dropped": self.dropped
+        }
+
+
+async def watch_change_streams(db, bus: EventBus, retry_seconds: float = 5):
+    # Feeds the bus from Mongo change streams so every worker sees writes made by the others.
+    # Requires a replica set.
+    pipeline = [{"$match": {
+        "operationType": {"$in": ["insert", "update", "replace"]},
+        "ns.coll": {"$in": ["activities", "blood_requests"]}
+    }}]
+    while True:
+        try:
+            async with db.watch(pipeline, full_document="updateLookup") as stream:
+                async for change in stream:
+                    doc = change.get("fullDocument")
+                    if not doc:
+                        continue
+                    doc.pop("_id", None)
+                    doc.pop("recorded_at", None)
+                    if change["ns"]["coll"] == "activities":
+                        bus.publish(ACTIVITY, doc)
+                    elif change["operationType"] == "insert":
+                        bus.publish(REQUEST_CREATED, doc)
+                    else:
+                        bus.publish(REQUEST_UPDATED, doc)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Change stream failed, retrying in %ss", retry_seconds)
+            await asyncio.sleep(retry_seconds)
@@ -0,0 +1,122 @@
+from typing import Optional, Tuple
+
+from pymongo import UpdateOne
+
+from pipelines import join_users
+
+# Offline geocoding table: lower-case city name -> (longitude, latitude)
+CITY_COORDINATES = {
+    "mumbai": (72.8777, 19.0760),
+    "delhi": (77.1025, 28.7041),
+    "new delhi": (77.2090, 28.6139),
+    "bangalore": (77.5946, 12.9716),
+    "bengaluru": (77.5946, 12.9716),
+    "hyderabad": (78.4867, 17.3850),
+    "chennai": (80.2707, 13.0827),
+    "kolkata": (88.3639, 22.5726),
+    "pune": (73.8567, 18.5204),
+    "ahmedabad": (72.5714, 23.0225),
+    "jaipur": (75.7873, 26.9124),
+    "lucknow": (80.9462, 26.8467),
+    "surat": (72.8311, 21.1702),
+    "kanpur": (80.3319, 26.4499),
+    "nagpur": (79.0882, 21.1458),
+    "indore": (75.8577, 22.7196),
+    "bhopal": (77.4126, 23.2599),
+    "patna": (85.1376, 25.5941),
+    "thane": (72.9781, 19.2183),
+    "navi mumbai": (73.0297, 19.0330),
+    "noida": (77.3910, 28.5355),
+    "gurgaon": (77.0266, 28.4595),
+    "gurugram": (77.0266, 28.4595),
+    "ghaziabad": (77.4538, 28.6692),
+    "faridabad": (77.3178, 28.4089),
+    "chandigarh": (76.7794, 30.7333),
+    "ludhiana": (75.8573, 30.9010),
+    "amritsar": (74.8723, 31.6340),
+    "agra": (78.0081, 27.1767),
+    "varanasi": (82.9739, 25.3176),
+    "vadodara": (73.1812, 22.3072),
+    "rajkot": (70.8022, 22.3039),
+    "nashik": (73.7898, 19.9975),
+    "aurangabad": (75.3433, 19.8762),
+    "visakhapatnam": (83.2185, 17.6868),
+    "vijayawada": (80.6480, 16.5062),
+    "coimbatore": (76.9558, 11.0168),
+    "madurai": (78.1198, 9.9252),
+    "kochi": (76.2673, 9.9312),
+    "thiruvananthapuram": (76.9366, 8.5241),
+    "mysore": (76.6394, 12.2958),
+    "mysuru": (76.6394, 12.2958),
+    "mangalore": (74.8560, 12.9141),
+    "goa": (73.8278, 15.4909),
+    "bhubaneswar": (85.8245, 20.2961),
+    "raipur": (81.6296, 21.2514),
+    "ranchi": (85.3096, 23.3441),
+    "guwahati": (91.7362, 26.1445),
+    "dehradun": (78.0322, 30.3165),
+    "jodhpur": (73.0243, 26.2389),
+    "udaipur": (73.7125, 24.5854),
+    "srinagar": (74.7973, 34.0837),
+    "jammu": (74.8570, 32.7266),
+}
+
+
+def normalize_location(location: Optional[str]) -> str:
+    # The key locations are grouped and compared by, in matching, leaderboards and analytics
+    return (location or "").strip().lower()
+
+
+def geocode(location: Optional[str]) -> Optional[Tuple[float, float]]:
+    if not location:
+        return None
+    name = normalize_location(location)
+    if name in CITY_COORDINATES:
+        return CITY_COORDINATES[name]
+    # "Andheri, Mumbai" or "Pune, Maharashtra": try each comma-separated part
+    for part in name.split(","):
+        coordinates = CITY_COORDINATES.get(part.strip())
+        if coordinates:
+            return coordinates
+    return None
+
+
+def geo_point(location: Optional[str]) -> Optional[dict]:
+    coordinates = geocode(location)
+    if coordinates is None:
+        return None
+    return {"type": "Point", "coordinates": list(coordinates)}
+
+
+def geo_near_stage(lng: float, lat: float, query: dict, radius_km: Optional[float] = None) -> dict:
+    # Must be the first stage of a pipeline; results come back nearest first
+    stage = {
+        "near": {"type": "Point", "coordinates": [lng, lat]},
+        "key": "location_point",
+        "distanceField": "distance_m",
+        "spherical": True,
+        "query": query,
+    }
+    if radius_km is not None:
+        stage["maxDistance"] = radius_km * 1000
+    return {"$geoNear": stage}
+
+
+async def backfill_donor_coordinates(db, batch_size: int = 1000) -> int:
+    # Gives donors registered before coordinates existed a location_point from their user's location
+    pipeline = [
+        {"$match": {"location_point": {"$exists": False}}},
+        *join_users(),
+        {"$project": {"id": 1, "user.location": 1}},
+    ]
+    updated = 0
+    operations = []
+    async for doc in db.donors.aggregate(pipeline):
+        # Unknown locations get null so they are not retried on every start
+        operations.append(UpdateOne({"id": doc["id"]}, {"$set": {"location_point": geo_point(doc["user"].get("location"))}}))
+        if len(operations) >= batch_size:
+            updated += (await db.donors.bulk_write(operations, ordered=False)).modified_count
+            operations = []
+    if operations:
+        updated += (await db.donors.bulk_write(operations, ordered=False)).modified_count
+    return updated
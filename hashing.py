@@ -0,0 +1,109 @@
+import asyncio
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, List, Optional
+
+
+class HasherBusyError(Exception):
+    pass
+
+
+# Runs passlib hash/verify in a bounded thread pool so bcrypt never blocks the event loop.
+# The bcrypt C extension releases the GIL, so threads give real parallelism here.
+class PasswordHasher:
+    def __init__(self, context, max_workers: int = 4, max_queue: int = 256):
+        self.context = context
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="password-hash")
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.queued = 0
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    async def hash(self, password: str) -> str:
+        return await self._run(self.context.hash, password)
+
+    async def verify(self, password: str, hashed_password: str) -> bool:
+        return await self._run(self.context.verify, password, hashed_password)
+
+    async def _run(self, func: Callable, *args):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_workers)
+        if self.queued >= self.max_queue:
+            self.rejected += 1
+            raise HasherBusyError("Password hashing queue is full")
+
+        self.queued += 1
+        enqueued_at = time.monotonic()
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.queued -= 1
+        waited = time.monotonic() - enqueued_at
+        self.total_wait_seconds += waited
+        self.max_wait_seconds = max(self.max_wait_seconds, waited)
+
+        self.in_flight += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+        finally:
+            self.in_flight -= 1
+            self.completed += 1
+            self._semaphore.release()
+
+    def stats(self) -> dict:
+        return {
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "queued": self.queued,
+            "in_flight": self.in_flight,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "avg_wait_seconds": self.total_wait_seconds / self.completed if self.completed else 0.0,
+            "max_wait_seconds": self.max_wait_seconds,
+        }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+
+_worker_context = None
+
+
+def _hash_batch(config: str, passwords: List[str]) -> List[str]:
+    # Runs in a worker process; the CryptContext is rebuilt once per process from its config
+    global _worker_context
+    if _worker_context is None:
+        from passlib.context import CryptContext
+        _worker_context = CryptContext.from_string(config)
+    return [_worker_context.hash(password) for password in passwords]
+
+
+# Hashes whole import chunks across processes, one slice per worker. Kept separate from
+# PasswordHasher so a bulk import cannot starve interactive logins of hashing threads.
+class BatchPasswordHasher:
+    def __init__(self, context, workers: int = 4):
+        self.config = context.to_string()
+        self.workers = workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    async def hash_many(self, passwords: List[str]) -> List[str]:
+        if not passwords:
+            return []
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        loop = asyncio.get_running_loop()
+        size = -(-len(passwords) // self.workers)
+        slices = [passwords[start:start + size] for start in range(0, len(passwords), size)]
+        hashed = await asyncio.gather(*(
+            loop.run_in_executor(self._executor, _hash_batch, self.config, batch) for batch in slices
+        ))
+        return [value for batch in hashed for value in batch]
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
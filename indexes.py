@@ -0,0 +1,174 @@
+import asyncio
+import logging
+import os
+import sys
+from typing import List
+
+from pymongo import ASCENDING, DESCENDING, GEOSPHERE, IndexModel
+
+logger = logging.getLogger(__name__)
+
+# Required indexes per collection, kept next to the queries in server.py that rely on them
+INDEXES = {
+    "users": [
+        IndexModel([("id", ASCENDING)], unique=True, name="id_unique"),
+        IndexModel([("email", ASCENDING)], unique=True, name="email_unique"),
+    ],
+    "donors": [
+        IndexModel([("id", ASCENDING)], unique=True, name="id_unique"),
+        IndexModel([("user_id", ASCENDING)], unique=True, name="user_id_unique"),
+        # eligible_from trails the sort keys so "eligible now" is filtered inside the index scan
+        IndexModel([("blood_type", ASCENDING), ("available", ASCENDING), ("created_at", ASCENDING), ("id", ASCENDING), ("eligible_from", ASCENDING)], name="blood_type_available_eligible_page"),
+        IndexModel([("available", ASCENDING), ("created_at", ASCENDING), ("id", ASCENDING), ("eligible_from", ASCENDING)], name="available_eligible_page"),
+        IndexModel([("available", ASCENDING), ("blood_type", ASCENDING), ("eligible_from", ASCENDING)], name="available_blood_type_eligible"),
+        # Donor matching: longest-rested eligible donors of one blood type
+        IndexModel([("blood_type", ASCENDING), ("available", ASCENDING), ("last_donation_date", ASCENDING), ("id", ASCENDING), ("eligible_from", ASCENDING)], name="blood_type_available_rested"),
+        IndexModel([("eligible_from", ASCENDING), ("eligible", ASCENDING)], name="eligible_from_flag"),
+        IndexModel([("eligible_from", ASCENDING)], name="ineligible_until", partialFilterExpression={"eligible": False}),
+        IndexModel([("created_at", ASCENDING), ("id", ASCENDING)], name="page"),
+        IndexModel([("total_donations", DESCENDING)], name="total_donations"),
+        IndexModel([("location_point", GEOSPHERE), ("available", ASCENDING), ("blood_type", ASCENDING)], name="location_point_geo"),
+    ],
+    "blood_requests": [
+        IndexModel([("id", ASCENDING)], unique=True, name="id_unique"),
+        # Request pages list emergencies first: is_emergency leads the sort
+        IndexModel([("recipient_id", ASCENDING), ("is_emergency", DESCENDING), ("created_at", DESCENDING), ("id", DESCENDING)], name="recipient_emergency_page"),
+        IndexModel([("donor_id", ASCENDING), ("is_emergency", DESCENDING), ("created_at", DESCENDING), ("id", DESCENDING)], name="donor_emergency_page"),
+        IndexModel([("blood_type", ASCENDING), ("status", ASCENDING), ("is_emergency", DESCENDING), ("created_at", DESCENDING), ("id", DESCENDING)], name="blood_type_status_emergency_page"),
+        IndexModel([("status", ASCENDING), ("is_emergency", ASCENDING)], name="status_emergency"),
+        IndexModel([("is_emergency", DESCENDING), ("created_at", DESCENDING), ("id", DESCENDING)], name="emergency_page"),
+    ],
+    "donation_history": [
+        IndexModel([("id", ASCENDING)], unique=True, name="id_unique"),
+        # One donation per request; older documents without request_id are left out
+        IndexModel([("request_id", ASCENDING)], unique=True, name="request_id_unique",
+                   partialFilterExpression={"request_id": {"$type": "string"}}),
+        IndexModel([("donor_id", ASCENDING), ("donation_date", DESCENDING), ("id", DESCENDING)], name="donor_page"),
+        IndexModel([("recipient_id", ASCENDING), ("donation_date", DESCENDING), ("id", DESCENDING)], name="recipient_page"),
+        IndexModel([("donation_date", DESCENDING), ("id", DESCENDING)], name="page"),
+    ],
+    "activities": [
+        IndexModel([("timestamp", DESCENDING)], name="timestamp"),
+    ],
+    # Written by retention.archive_old_records; donation history pages read across both collections
+    "blood_requests_archive": [
+        IndexModel([("id", ASCENDING)], unique=True, name="id_unique"),
+        IndexModel([("status", ASCENDING)], name="status"),
+    ],
+    "donation_history_archive": [
+        IndexModel([("id", ASCENDING)], unique=True, name="id_unique"),
+        IndexModel([("donor_id", ASCENDING), ("donation_date", DESCENDING), ("id", DESCENDING)], name="donor_page"),
+        IndexModel([("recipient_id", ASCENDING), ("donation_date", DESCENDING), ("id", DESCENDING)], name="recipient_page"),
+        IndexModel([("donation_date", DESCENDING), ("id", DESCENDING)], name="page"),
+    ],
+    # revocation.RevocationList: entries expire with the tokens they revoke; workers sync by created_at
+    "revocations": [
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+        IndexModel([("created_at", ASCENDING)], name="created_at"),
+    ],
+    # Rollups maintained by analytics.AnalyticsStore; _id is the bucket key itself
+    "analytics_rollups": [
+        IndexModel([("granularity", ASCENDING), ("bucket", ASCENDING)], name="granularity_bucket"),
+    ],
+}
+
+# Indexes replaced by the ones above, dropped by ensure_indexes when still present
+OBSOLETE_INDEXES = {
+    "donors": ["blood_type_available_page", "available_page"],
+    "blood_requests": ["recipient_page", "donor_page", "blood_type_status_page", "page"],
+}
+
+# Representative route queries: (collection, filter, sort). Values are placeholders,
+# only the shape matters for the plan.
+ROUTE_QUERIES = [
+    ("users", {"id": "user-id"}, None),
+    ("users", {"email": "someone@example.com"}, None),
+    ("donors", {"user_id": "user-id"}, None),
+    ("donors", {"id": "donor-id"}, None),
+    ("donors", {"available": True}, [("created_at", 1), ("id", 1)]),
+    ("donors", {"available": True, "blood_type": "O-"}, [("created_at", 1), ("id", 1)]),
+    ("donors", {}, [("total_donations", -1)]),
+    ("donors", {"available": True, "blood_type": "O-", "eligible_from": {"$lte": "2024-01-01T00:00:00+00:00"}}, [("created_at", 1), ("id", 1)]),
+    ("donors", {"available": True, "blood_type": "O-", "eligible_from": {"$lte": "2024-01-01T00:00:00+00:00"}}, [("last_donation_date", 1), ("id", 1)]),
+    ("donors", {"eligible": False, "eligible_from": {"$lte": "2024-01-01T00:00:00+00:00"}}, None),
+    ("blood_requests", {"id": "request-id"}, None),
+    ("blood_requests", {"recipient_id": "user-id"}, [("is_emergency", -1), ("created_at", -1), ("id", -1)]),
+    ("blood_requests", {"$or": [{"donor_id": "donor-id"}, {"blood_type": {"$in": ["O-", "O+"]}, "status": "pending"}]}, [("is_emergency", -1), ("created_at", -1), ("id", -1)]),
+    ("blood_requests", {}, [("is_emergency", -1), ("created_at", -1), ("id", -1)]),
+    ("blood_requests", {"status": "pending", "is_emergency": True}, None),
+    ("donation_history", {"request_id": "request-id"}, None),
+    ("donation_history", {"donor_id": "donor-id"}, [("donation_date", -1), ("id", -1)]),
+    ("donation_history", {"recipient_id": "user-id"}, [("donation_date", -1), ("id", -1)]),
+    ("donation_history", {}, [("donation_date", -1), ("id", -1)]),
+    ("activities", {}, [("timestamp", -1)]),
+    ("donation_history_archive", {"donor_id": "donor-id"}, [("donation_date", -1), ("id", -1)]),
+    ("donation_history_archive", {"recipient_id": "user-id"}, [("donation_date", -1), ("id", -1)]),
+    ("donation_history_archive", {}, [("donation_date", -1), ("id", -1)]),
+    ("analytics_rollups", {"granularity": "day", "bucket": {"$gte": "2024-01-01", "$lte": "2024-01-31"}, "blood_type": "O-"}, None),
+]
+
+
+async def ensure_indexes(db) -> None:
+    for collection, indexes in INDEXES.items():
+        names = await db[collection].create_indexes(indexes)
+        logger.info("Ensured indexes on %s: %s", collection, ", ".join(names))
+    # Only once their replacements exist
+    for collection, names in OBSOLETE_INDEXES.items():
+        existing = await db[collection].index_information()
+        for name in names:
+            if name in existing:
+                await db[collection].drop_index(name)
+                logger.info("Dropped obsolete index %s on %s", name, collection)
+
+
+def _plan_stages(plan) -> List[str]:
+    stages = []
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            stages.append(plan["stage"])
+        for value in plan.values():
+            stages.extend(_plan_stages(value))
+    elif isinstance(plan, list):
+        for item in plan:
+            stages.extend(_plan_stages(item))
+    return stages
+
+
+async def find_collection_scans(db, queries=ROUTE_QUERIES) -> List[str]:
+    offenders = []
+    for collection, query, sort in queries:
+        cursor = db[collection].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        explain = await cursor.explain()
+        winning_plan = explain.get("queryPlanner", {}).get("winningPlan", {})
+        if "COLLSCAN" in _plan_stages(winning_plan):
+            offenders.append(f"{collection} {query} sort={sort}")
+    return offenders
+
+
+async def _main() -> int:
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+    from pathlib import Path
+
+    load_dotenv(Path(__file__).parent / '.env')
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    db = client[os.environ['DB_NAME']]
+    try:
+        await ensure_indexes(db)
+        offenders = await find_collection_scans(db)
+    finally:
+        client.close()
+
+    for offender in offenders:
+        print(f"COLLSCAN: {offender}")
+    if offenders:
+        return 1
+    print(f"All {len(ROUTE_QUERIES)} route queries use an index")
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(asyncio.run(_main()))
@@ -0,0 +1,44 @@
+import logging
+import os
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+# Picks one worker process per host to run jobs that must not run N times in parallel
+# (stats reconciliation, archiving, backfills). The OS drops the lock when its holder exits,
+# and the remaining workers try again on their next tick.
+class LeaderLock:
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+
+    @property
+    def held(self) -> bool:
+        return self._file is not None
+
+    def acquire(self) -> bool:
+        if self._file is not None:
+            return True
+        if fcntl is None:
+            # No flock on this platform: every process leads, as before
+            self._file = True
+            return True
+        handle = open(self.path, "a")
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            handle.close()
+            return False
+        self._file = handle
+        logger.info("Worker %s is now the leader", os.getpid())
+        return True
+
+    def release(self):
+        if self._file is not None and self._file is not True:
+            self._file.close()
+        self._file = None
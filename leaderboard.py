@@ -0,0 +1,139 @@
+import bisect
+import logging
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional, Tuple
+
+from geo import normalize_location
+from pipelines import join_users
+
+logger = logging.getLogger(__name__)
+
+Key = Tuple[int, str]
+
+
+class _Partition:
+    # Keys sorted best first, bounded to `capacity`
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.keys: List[Key] = []
+
+    def offer(self, key: Key) -> Tuple[bool, Optional[Key]]:
+        if len(self.keys) >= self.capacity and key >= self.keys[-1]:
+            return False, None
+        bisect.insort(self.keys, key)
+        if len(self.keys) > self.capacity:
+            return True, self.keys.pop()
+        return True, None
+
+    def remove(self, key: Key) -> bool:
+        i = bisect.bisect_left(self.keys, key)
+        if i < len(self.keys) and self.keys[i] == key:
+            del self.keys[i]
+            return True
+        return False
+
+
+# Top-K donors overall, per blood type and per location, kept in memory and pre-enriched
+# with user fields and achievements. Donation totals only ever grow, so a donor that falls
+# out of a partition can only re-enter through record_donation, which carries its document.
+class Leaderboard:
+    def __init__(self, k: int, achievements: Callable[[int], List[str]]):
+        self.k = k
+        self.achievements = achievements
+        # Bumped on every change, for conditional GETs of the leaderboard
+        self.version = 0
+        self._reset()
+
+    def _reset(self):
+        self.entries: Dict[str, dict] = {}
+        self._keys: Dict[str, Key] = {}
+        self._refs: Dict[str, int] = defaultdict(int)
+        self._partitions: Dict[tuple, _Partition] = defaultdict(lambda: _Partition(self.k))
+
+    def _partition_names(self, entry: dict) -> List[tuple]:
+        return [("all",), ("blood_type", entry["blood_type"]), ("location", normalize_location(entry["location"]))]
+
+    def make_entry(self, donor: dict, user: dict) -> dict:
+        total_donations = donor.get("total_donations", 0)
+        return {
+            "id": donor["id"],
+            "user_id": donor["user_id"],
+            "blood_type": donor["blood_type"],
+            "available": donor["available"],
+            "last_donation_date": donor.get("last_donation_date"),
+            "total_donations": total_donations,
+            "location": user.get("location") or "",
+            "name": user["name"],
+            "phone": user["phone"],
+            "email": user["email"],
+            "achievements": self.achievements(total_donations)
+        }
+
+    def upsert(self, entry: dict):
+        self.version += 1
+        donor_id = entry["id"]
+        old_key = self._keys.pop(donor_id, None)
+        if old_key is not None:
+            for name in self._partition_names(self.entries[donor_id]):
+                if self._partitions[name].remove(old_key):
+                    self._refs[donor_id] -= 1
+
+        key = (-entry["total_donations"], donor_id)
+        for name in self._partition_names(entry):
+            inserted, evicted = self._partitions[name].offer(key)
+            if inserted:
+                self._refs[donor_id] += 1
+            if evicted is not None:
+                self._evicted(evicted[1])
+
+        if self._refs[donor_id] > 0:
+            self.entries[donor_id] = entry
+            self._keys[donor_id] = key
+        else:
+            self._forget(donor_id)
+
+    def _evicted(self, donor_id: str):
+        self._refs[donor_id] -= 1
+        if self._refs[donor_id] <= 0:
+            self._forget(donor_id)
+
+    def _forget(self, donor_id: str):
+        self._refs.pop(donor_id, None)
+        self.entries.pop(donor_id, None)
+        self._keys.pop(donor_id, None)
+
+    def record_donation(self, donor: dict, user: dict):
+        self.upsert(self.make_entry(donor, user))
+
+    def set_available(self, donor_id: str, available: bool):
+        entry = self.entries.get(donor_id)
+        if entry is not None:
+            entry["available"] = available
+            self.version += 1
+
+    def top(self, limit: Optional[int] = None, blood_type: Optional[str] = None, location: Optional[str] = None) -> List[dict]:
+        if blood_type:
+            name = ("blood_type", blood_type)
+        elif location:
+            name = ("location", normalize_location(location))
+        else:
+            name = ("all",)
+        partition = self._partitions.get(name)
+        if partition is None:
+            return []
+        return [self.entries[donor_id] for _, donor_id in partition.keys[:limit or self.k]]
+
+    async def rebuild(self, db):
+        # Stream donors best first; once a partition is full, lower totals are rejected cheaply
+        fresh = Leaderboard(self.k, self.achievements)
+        pipeline = [
+            {"$sort": {"total_donations": -1}},
+            *join_users(),
+        ]
+        count = 0
+        async for doc in db.donors.aggregate(pipeline):
+            fresh.upsert(fresh.make_entry(doc, doc["user"]))
+            count += 1
+        self.entries, self._keys, self._refs, self._partitions = fresh.entries, fresh._keys, fresh._refs, fresh._partitions
+        self.version += 1
+        logger.info("Rebuilt leaderboard from %s donors (%s partitions)", count, len(self._partitions))
@@ -0,0 +1,116 @@
+import asyncio
+from collections import defaultdict
+from typing import Dict, Iterable, List
+
+from compatibility import BLOOD_TYPE_INDEX, CAN_GIVE_TO, donor_types_for
+from eligibility import eligible_filter
+from geo import normalize_location
+from pipelines import join_users
+
+MATCH_CANDIDATE_LIMIT = 50000
+# Candidates loaded per compatible donor type and per donor wanted: same-city donors are
+# preferred among the longest-rested per_request * MATCH_CANDIDATE_FACTOR donors of each type
+MATCH_CANDIDATE_FACTOR = 10
+
+# For each recipient type, compatible donor types in the order they should be asked:
+# the exact type first, then the most specific types, keeping universal donors (O-) for last.
+DONOR_PREFERENCE: Dict[str, List[str]] = {
+    recipient: sorted(
+        donor_types_for(recipient),
+        key=lambda donor: (donor != recipient, bin(CAN_GIVE_TO[BLOOD_TYPE_INDEX[donor]]).count("1"))
+    )
+    for recipient in BLOOD_TYPE_INDEX
+}
+
+
+class DonorPool:
+    # Available donors loaded once and indexed by blood type and by (blood type, location).
+    # Lists keep the database order: donors who rested longest come first.
+    def __init__(self, donors: Iterable[dict]):
+        self.by_type: Dict[str, List[dict]] = defaultdict(list)
+        self.by_type_location: Dict[tuple, List[dict]] = defaultdict(list)
+        for donor in donors:
+            self.by_type[donor["blood_type"]].append(donor)
+            location = normalize_location(donor["user"].get("location"))
+            self.by_type_location[(donor["blood_type"], location)].append(donor)
+        # Donors proposed by exclusive matching, and per bucket the length of its claimed prefix
+        self.claimed: set = set()
+        self._start: Dict[tuple, int] = defaultdict(int)
+
+    def claim(self, donors: Iterable[dict]):
+        self.claimed.update(donor["id"] for donor in donors)
+
+    def _unclaimed(self, bucket: tuple, candidates: List[dict]):
+        # Claims only ever grow, so a bucket's leading claimed donors are skipped for good
+        # instead of being rescanned by every later request
+        start = self._start[bucket]
+        while start < len(candidates) and candidates[start]["id"] in self.claimed:
+            start += 1
+        self._start[bucket] = start
+        for position in range(start, len(candidates)):
+            if candidates[position]["id"] not in self.claimed:
+                yield position, candidates[position]
+
+    def rank(self, request: dict, limit: int, skip_claimed: bool = False) -> List[dict]:
+        location = normalize_location(request.get("location"))
+        scored = {}
+        for priority, donor_type in enumerate(DONOR_PREFERENCE.get(request["blood_type"], [])):
+            for remote, bucket, candidates in ((0, (donor_type, location), self.by_type_location.get((donor_type, location), [])),
+                                               (1, (donor_type,), self.by_type.get(donor_type, []))):
+                donors = self._unclaimed(bucket, candidates) if skip_claimed else enumerate(candidates)
+                for taken, (position, donor) in enumerate(donors):
+                    if taken >= limit:
+                        break
+                    key = (remote, priority, position)
+                    if donor["id"] not in scored or key < scored[donor["id"]][0]:
+                        scored[donor["id"]] = (key, donor)
+        ranked = sorted(scored.values(), key=lambda item: item[0])
+        return [donor for _, donor in ranked[:limit]]
+
+
+def candidate_limits(requests: List[dict], per_request: int, exclusive: bool = False) -> Dict[str, int]:
+    # Exclusive matching hands each donor to one request, so its demand adds up over the batch
+    limits: Dict[str, int] = defaultdict(int)
+    wanted = per_request * MATCH_CANDIDATE_FACTOR
+    for request in requests:
+        for donor_type in donor_types_for(request["blood_type"]):
+            limits[donor_type] = limits[donor_type] + wanted if exclusive else max(limits[donor_type], wanted)
+    return {donor_type: min(limit, MATCH_CANDIDATE_LIMIT) for donor_type, limit in limits.items()}
+
+
+async def load_donor_pool(db, limits: Dict[str, int]) -> DonorPool:
+    # One bounded query per donor type, each walking the blood_type_available_rested index;
+    # only the donors kept are joined with their users
+    def pipeline(donor_type: str, limit: int) -> List[dict]:
+        return [
+            # Only donors past their deferral period can be asked
+            {"$match": {"available": True, "blood_type": donor_type, **eligible_filter()}},
+            {"$sort": {"last_donation_date": 1, "id": 1}},
+            {"$limit": limit},
+            *join_users(),
+        ]
+    results = await asyncio.gather(*(
+        db.donors.aggregate(pipeline(donor_type, limit)).to_list(None) for donor_type, limit in sorted(limits.items())
+    ))
+    return DonorPool(donor for donors in results for donor in donors)
+
+
+async def match_requests(db, requests: List[dict], per_request: int = 5, exclusive: bool = False) -> Dict[str, List[dict]]:
+    limits = candidate_limits(requests, per_request, exclusive)
+    if not limits:
+        return {request["id"]: [] for request in requests}
+    pool = await load_donor_pool(db, limits)
+    return match_pool(pool, requests, per_request, exclusive)
+
+
+def match_pool(pool: DonorPool, requests: List[dict], per_request: int = 5, exclusive: bool = False) -> Dict[str, List[dict]]:
+    # With exclusive matching a donor is proposed to one request only, emergencies first
+    if exclusive:
+        requests = sorted(requests, key=lambda r: (not r.get("is_emergency"), r.get("created_at", "")))
+    matches = {}
+    for request in requests:
+        donors = pool.rank(request, per_request, skip_claimed=exclusive)
+        if exclusive:
+            pool.claim(donors)
+        matches[request["id"]] = donors
+    return matches
@@ -0,0 +1,250 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+from collections import Counter as _Tally, defaultdict, deque
+from pathlib import Path
+from typing import Callable, Dict, Optional, Sequence, Tuple
+
+from pymongo import monitoring
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        # pymongo listeners run on driver threads, route metrics on the event loop
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def render(self) -> str:
+        header = f"# HELP {self.name} {self.documentation}\n# TYPE {self.name} {self.kind}\n"
+        return header + "".join(self._samples())
+
+    def _samples(self):
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = defaultdict(float)
+
+    def inc(self, amount: float = 1, **labels):
+        with self._lock:
+            self._values[self._key(labels)] += amount
+
+    def _samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield f"{self.name}{_format_labels(self.label_names, key)} {value}\n"
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (), callback: Optional[Callable[[], float]] = None):
+        super().__init__(name, documentation, labels)
+        self.callback = callback
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def _samples(self):
+        if self.callback is not None:
+            yield f"{self.name} {self.callback()}\n"
+            return
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield f"{self.name}{_format_labels(self.label_names, key)} {value}\n"
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # per-bucket counts, then sum and count
+                series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def counts(self) -> Dict[Tuple[str, ...], int]:
+        # Observations so far per label values, e.g. for before/after deltas in benchmarks
+        with self._lock:
+            return {key: series[-1] for key, series in self._series.items()}
+
+    def _samples(self):
+        with self._lock:
+            items = [(key, list(series)) for key, series in self._series.items()]
+        for key, series in items:
+            for bound, count in zip(self.buckets, series):
+                labels = _format_labels(self.label_names, key, 'le="%s"' % bound)
+                yield f"{self.name}_bucket{labels} {count}\n"
+            labels = _format_labels(self.label_names, key, 'le="+Inf"')
+            yield f"{self.name}_bucket{labels} {series[-1]}\n"
+            yield f"{self.name}_sum{_format_labels(self.label_names, key)} {series[-2]}\n"
+            yield f"{self.name}_count{_format_labels(self.label_names, key)} {series[-1]}\n"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labels: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labels))
+
+    def gauge(self, name: str, documentation: str, labels: Sequence[str] = (), callback: Optional[Callable[[], float]] = None) -> Gauge:
+        return self.register(Gauge(name, documentation, labels, callback))
+
+    def histogram(self, name: str, documentation: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labels, buckets))
+
+    def render(self) -> str:
+        return "".join(metric.render() for metric in self._metrics.values())
+
+
+registry = Registry()
+
+http_request_duration = registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template", ("method", "route", "status"))
+mongo_command_duration = registry.histogram(
+    "mongo_command_duration_seconds", "MongoDB command latency by collection", ("collection", "command"))
+mongo_command_failures = registry.counter(
+    "mongo_command_failures_total", "Failed MongoDB commands", ("collection", "command"))
+event_loop_lag = registry.histogram(
+    "event_loop_lag_seconds", "Delay between a scheduled wakeup and when the event loop ran it",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0))
+dispatch_time_to_first_notification = registry.histogram(
+    "dispatch_time_to_first_notification_seconds", "Time from a new blood request to its first donor notification",
+    ("emergency",), buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0))
+dispatch_notifications = registry.counter(
+    "dispatch_notifications_total", "Donor notification attempts by outcome", ("outcome",))
+
+
+# Times every command sent by the driver, so per-request query counts (and N+1 patterns) show up
+class MongoCommandListener(monitoring.CommandListener):
+    def __init__(self):
+        self._pending: Dict[tuple, tuple] = {}
+        self._lock = threading.Lock()
+
+    def started(self, event):
+        collection = event.command.get(event.command_name)
+        if not isinstance(collection, str):
+            collection = ""
+        with self._lock:
+            self._pending[(event.connection_id, event.request_id)] = (collection, event.command_name)
+
+    def _finish(self, event):
+        with self._lock:
+            return self._pending.pop((event.connection_id, event.request_id), ("", event.command_name))
+
+    def succeeded(self, event):
+        collection, command = self._finish(event)
+        mongo_command_duration.observe(event.duration_micros / 1e6, collection=collection, command=command)
+
+    def failed(self, event):
+        collection, command = self._finish(event)
+        mongo_command_duration.observe(event.duration_micros / 1e6, collection=collection, command=command)
+        mongo_command_failures.inc(collection=collection, command=command)
+
+
+async def monitor_event_loop_lag(interval: float = 0.5):
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        event_loop_lag.observe(max(0.0, loop.time() - start - interval))
+
+
+# Opt-in sampling profiler for slow requests. A daemon thread samples the event loop thread's
+# stack while requests are in flight; when a request exceeds the threshold, the samples taken
+# during its lifetime are written as collapsed stacks (flamegraph.pl / speedscope format).
+# Concurrent requests share the loop thread, so a dump can include their frames too.
+class SlowRequestProfiler:
+    def __init__(self, threshold_seconds: float, output_dir: str, interval: float = 0.005, max_samples: int = 20000):
+        self.threshold_seconds = threshold_seconds
+        self.output_dir = Path(output_dir)
+        self.interval = interval
+        self._samples: deque = deque(maxlen=max_samples)
+        self._active = 0
+        self._thread_id: Optional[int] = None
+        self._wakeup = threading.Event()
+        self.dumps = 0
+
+    def start(self):
+        self._thread_id = threading.get_ident()
+        threading.Thread(target=self._run, name="slow-request-profiler", daemon=True).start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait()
+            frame = sys._current_frames().get(self._thread_id)
+            if frame is not None:
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                self._samples.append((time.monotonic(), ";".join(reversed(stack))))
+            time.sleep(self.interval)
+
+    def request_started(self) -> float:
+        self._active += 1
+        self._wakeup.set()
+        return time.monotonic()
+
+    def request_finished(self, started_at: float, route: str):
+        self._active -= 1
+        if self._active == 0:
+            self._wakeup.clear()
+        duration = time.monotonic() - started_at
+        if duration < self.threshold_seconds:
+            return
+        folded = _Tally(stack for at, stack in list(self._samples) if at >= started_at)
+        if not folded:
+            return
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        name = f"{int(time.time() * 1000)}-{route.strip('/').replace('/', '_') or 'root'}-{int(duration * 1000)}ms.folded"
+        (self.output_dir / name).write_text("".join(f"{stack} {count}\n" for stack, count in folded.items()))
+        self.dumps += 1
@@ -0,0 +1,22 @@
+from typing import List
+
+
+# Aggregation stages and expressions shared by the modules that query donors and locations
+
+
+def normalized_location(field: str = "$location") -> dict:
+    # geo.normalize_location as an aggregation expression
+    return {"$toLower": {"$trim": {"input": {"$ifNull": [field, ""]}}}}
+
+
+def users_lookup(local_field: str, as_field: str) -> dict:
+    return {"$lookup": {"from": "users", "localField": local_field, "foreignField": "id", "as": as_field}}
+
+
+def join_users() -> List[dict]:
+    # Each donor with its user under `user`; Mongo ids and the password hash are dropped
+    return [
+        users_lookup("user_id", "user"),
+        {"$unwind": "$user"},
+        {"$project": {"_id": 0, "user._id": 0, "user.password_hash": 0}},
+    ]
@@ -0,0 +1,56 @@
+import asyncio
+import time
+from collections import OrderedDict
+
+
+# Classic token bucket: `rate` tokens per second refill up to `capacity`
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self, tokens: float = 1) -> bool:
+        self._refill(time.monotonic())
+        if self.tokens >= tokens:
+            self.tokens -= tokens
+            return True
+        return False
+
+    def wait_time(self, tokens: float = 1) -> float:
+        self._refill(time.monotonic())
+        return max(0.0, (tokens - self.tokens) / self.rate)
+
+    async def acquire(self, tokens: float = 1):
+        while not self.try_acquire(tokens):
+            await asyncio.sleep(self.wait_time(tokens))
+
+
+# One bucket per client key (user id or IP). Idle keys are evicted least recently used first,
+# which only ever resets a client to a full bucket.
+class RateLimiter:
+    def __init__(self, rate: float, burst: float, max_keys: int = 100000):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self.limited = 0
+
+    def check(self, key: str) -> float:
+        # 0 when the request may proceed, otherwise seconds until it would be allowed
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(self.rate, self.burst)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        if bucket.try_acquire():
+            return 0.0
+        self.limited += 1
+        return bucket.wait_time()
@@ -0,0 +1,70 @@
+import logging
+from datetime import datetime, timedelta, timezone
+
+from pymongo.errors import BulkWriteError, OperationFailure
+
+logger = logging.getLogger(__name__)
+
+REQUEST_ARCHIVE = "blood_requests_archive"
+DONATION_ARCHIVE = "donation_history_archive"
+ARCHIVABLE_STATUSES = ["completed", "cancelled"]
+
+
+async def ensure_activity_ttl(db, retention_seconds: int):
+    # TTL indexes need a BSON date; activities store an ISO string timestamp, so a
+    # recorded_at date is added on write and backfilled here for older documents.
+    await db.activities.update_many(
+        {"recorded_at": {"$exists": False}},
+        [{"$set": {"recorded_at": {"$dateFromString": {"dateString": "$timestamp"}}}}]
+    )
+    try:
+        await db.activities.create_index("recorded_at", name="recorded_at_ttl", expireAfterSeconds=retention_seconds)
+    except OperationFailure:
+        # The index exists with another retention period
+        await db.command("collMod", "activities", index={"name": "recorded_at_ttl", "expireAfterSeconds": retention_seconds})
+
+
+def _compact(doc: dict) -> dict:
+    # Archived documents drop the Mongo _id and any null fields
+    return {key: value for key, value in doc.items() if key != "_id" and value is not None}
+
+
+async def _move(db, source: str, target: str, query: dict, batch_size: int) -> int:
+    moved = 0
+    while True:
+        batch = await db[source].find(query, {"_id": 0}).limit(batch_size).to_list(batch_size)
+        if not batch:
+            return moved
+        try:
+            await db[target].insert_many([_compact(doc) for doc in batch], ordered=False)
+        except BulkWriteError as e:
+            # Documents already archived by an interrupted earlier run are fine, anything else is not
+            if any(error["code"] != 11000 for error in e.details.get("writeErrors", [])):
+                raise
+        # Only delete once the archive copy is durable
+        result = await db[source].delete_many({"id": {"$in": [doc["id"] for doc in batch]}})
+        moved += result.deleted_count
+
+
+async def archive_old_records(db, request_age_days: float, donation_age_days: float, batch_size: int = 1000) -> dict:
+    now = datetime.now(timezone.utc)
+    moved = {"blood_requests": 0, "donation_history": 0}
+    if request_age_days > 0:
+        cutoff = (now - timedelta(days=request_age_days)).isoformat()
+        moved["blood_requests"] = await _move(db, "blood_requests", REQUEST_ARCHIVE, {
+            "status": {"$in": ARCHIVABLE_STATUSES},
+            "updated_at": {"$lt": cutoff}
+        }, batch_size)
+    if donation_age_days > 0:
+        cutoff = (now - timedelta(days=donation_age_days)).isoformat()
+        moved["donation_history"] = await _move(db, "donation_history", DONATION_ARCHIVE, {
+            "donation_date": {"$lt": cutoff}
+        }, batch_size)
+    if any(moved.values()):
+        logger.info("Archived %s blood requests and %s donations", moved["blood_requests"], moved["donation_history"])
+    return moved
+
+
+def union_with_archive(archive: str, match: dict, *stages: dict) -> dict:
+    # Pipeline stage that appends matching archived documents to the hot collection's results
+    return {"$unionWith": {"coll": archive, "pipeline": [{"$match": match}, *stages]}}
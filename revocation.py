@@ -0,0 +1,117 @@
+import hashlib
+import logging
+import math
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class BloomFilter:
+    # Double hashing over one blake2b digest; about 1.2 bytes per entry at a 1% error rate
+    def __init__(self, capacity: int, error_rate: float = 0.01):
+        self.capacity = max(1, capacity)
+        self.size = max(8, int(-self.capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / self.capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1, h2 = int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, item: str):
+        if item in self:
+            return
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+# Revoked tokens (logout, refresh rotation) and users (ban), stored in db.revocations and
+# mirrored in memory so authentication needs no per-request lookup. Token ids go into a Bloom
+# filter: a miss proves the token was not revoked when the filter was last synced, and the rare
+# hit is confirmed against Mongo. User revocations are few and kept exactly, as the time before
+# which that user's tokens are void.
+class RevocationList:
+    def __init__(self, db, capacity: int = 100000, error_rate: float = 0.01, full_sync_every: float = 3600):
+        self.collection = db.revocations
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.full_sync_every = full_sync_every
+        self._filter = BloomFilter(capacity, error_rate)
+        self._users: Dict[str, float] = {}
+        self._synced_to: Optional[datetime] = None
+        self._loaded_at: Optional[datetime] = None
+        self.confirmations = 0
+        self.false_positives = 0
+
+    def _apply(self, doc: dict, bloom: Optional[BloomFilter] = None, users: Optional[Dict[str, float]] = None):
+        bloom = self._filter if bloom is None else bloom
+        users = self._users if users is None else users
+        if doc["kind"] == "user":
+            users[doc["subject"]] = max(users.get(doc["subject"], 0), doc["revoked_before"])
+        else:
+            bloom.add(doc["_id"])
+
+    async def revoke_token(self, jti: str, user_id: str, expires_at: datetime) -> bool:
+        # False when the token was already revoked, which lets a refresh token be spent only once
+        doc = {"_id": jti, "kind": "token", "subject": user_id, "expires_at": expires_at, "created_at": datetime.now(timezone.utc)}
+        result = await self.collection.update_one({"_id": jti}, {"$setOnInsert": doc}, upsert=True)
+        self._apply(doc)
+        return result.upserted_id is not None
+
+    async def revoke_user(self, user_id: str, lifetime: timedelta):
+        # Every token issued so far for this user is void; entries outlive the longest token
+        now = datetime.now(timezone.utc)
+        doc = {
+            "_id": f"user:{user_id}", "kind": "user", "subject": user_id,
+            "revoked_before": now.timestamp(), "expires_at": now + lifetime, "created_at": now
+        }
+        await self.collection.replace_one({"_id": doc["_id"]}, doc, upsert=True)
+        self._apply(doc)
+
+    async def is_revoked(self, payload: dict) -> bool:
+        # Tokens issued within the revocation's second are void too
+        revoked_before = self._users.get(payload.get("sub"))
+        if revoked_before is not None and payload.get("iat", 0) <= revoked_before:
+            return True
+        jti = payload.get("jti")
+        if jti is None or jti not in self._filter:
+            return False
+        self.confirmations += 1
+        if await self.collection.find_one({"_id": jti}, {"_id": 1}):
+            return True
+        self.false_positives += 1
+        return False
+
+    async def sync(self, full: bool = False):
+        # Incremental by created_at, with some overlap for writes from workers with skewed clocks.
+        # A full reload drops expired entries and resizes the filter.
+        now = datetime.now(timezone.utc)
+        if full or self._loaded_at is None or (now - self._loaded_at).total_seconds() >= self.full_sync_every:
+            total = await self.collection.count_documents({"kind": "token"})
+            bloom, users = BloomFilter(max(self.capacity, total * 2), self.error_rate), {}
+            async for doc in self.collection.find({"expires_at": {"$gt": now}}):
+                self._apply(doc, bloom, users)
+            self._filter, self._users = bloom, users
+            self._loaded_at = now
+        else:
+            async for doc in self.collection.find({"created_at": {"$gte": self._synced_to - timedelta(seconds=30)}}):
+                self._apply(doc)
+            if self._filter.count > self._filter.capacity:
+                return await self.sync(full=True)
+        self._synced_to = now
+
+    def stats(self) -> dict:
+        return {
+            "tokens": self._filter.count,
+            "users": len(self._users),
+            "filter_bytes": len(self._filter.bits),
+            "confirmations": self.confirmations,
+            "false_positives": self.false_positives,
+        }
@@ -0,0 +1,36 @@
+import json
+from typing import List, Type
+
+from fastapi import Response
+from pydantic import BaseModel, TypeAdapter
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def dumps(content) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, separators=(",", ":"), ensure_ascii=False).encode()
+
+
+# Serializes lists of documents for one response model without building a model per document.
+# "validate" checks the whole list in one TypeAdapter call and dumps it from pydantic-core;
+# "trust" skips validation for documents read from our own collections and only fills defaults.
+class ListSerializer:
+    def __init__(self, model: Type[BaseModel]):
+        self.model = model
+        self.projection = {"_id": 0, **{name: 1 for name in model.model_fields}}
+        self.defaults = {name: field.default for name, field in model.model_fields.items() if not field.is_required()}
+        self.adapter = TypeAdapter(List[model])
+
+    def render(self, docs: List[dict], mode: str) -> bytes:
+        if mode == "trust":
+            return dumps([{**self.defaults, **doc} for doc in docs])
+        return self.adapter.dump_json(self.adapter.validate_python(docs))
+
+    def response(self, docs: List[dict], mode: str, response: Response) -> Response:
+        # Returning a Response bypasses response_model; carry over headers set on the injected one
+        return Response(self.render(docs, mode), media_type="application/json", headers=dict(response.headers))
@@ -1,34 +1,223 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, status
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Query, Request, Response, status
+from fastapi.responses import StreamingResponse, JSONResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
 import os
+import re
+import json
+import base64
+import math
+from urllib.parse import urlencode
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field, ConfigDict, EmailStr
-from typing import List, Optional
+from typing import List, Literal, Optional
 import uuid
+import time
+import asyncio
+import tempfile
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone, timedelta
 from passlib.context import CryptContext
 import jwt
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from pymongo.errors import DuplicateKeyError
+from indexes import ensure_indexes, find_collection_scans
+from cache import TTLCache, MemoryBackend, SQLiteBackend
+from hashing import PasswordHasher, BatchPasswordHasher, HasherBusyError
+from stats import StatsStore
+from compatibility import BLOOD_TYPES, is_compatible, recipient_types_for, donor_types_for
+from geo import geocode, geo_point, geo_near_stage, backfill_donor_coordinates
+from matching import match_requests
+from leaderboard import Leaderboard
+from metrics import registry, http_request_duration, MongoCommandListener, monitor_event_loop_lag, SlowRequestProfiler
+from activity_log import ActivityWriter
+from events import EventBus, watch_change_streams, ACTIVITY, REQUEST_CREATED, REQUEST_UPDATED
+from serialization import ListSerializer
+from bulk import BulkImporter, parse_records, read_chunks, format_records, export_donors, export_donations, DONOR_FIELDS, DONATION_FIELDS, FORMATS
+from dispatch import Dispatcher, load_sink
+from leader import LeaderLock
+from eligibility import parse_deferrals, next_eligible, sync_eligible_flags, backfill_eligibility, DEFAULT_DONATION_TYPE
+from ratelimit import RateLimiter
+from analytics import AnalyticsStore, GRANULARITIES, METRICS, DIMENSIONS, MAX_POINTS, BUCKET_STEPS
+from versions import VersionStore, local_version, make_etag, etag_matches
+from revocation import RevocationList
+from shortages import ShortageAnalyzer, region_for
+from retention import ensure_activity_ttl, archive_old_records, union_with_archive, DONATION_ARCHIVE
+from pipelines import join_users
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
+# MongoDB connection; the pool is per worker process, so size it for N workers x MONGO_MAX_POOL_SIZE
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+MONGO_POOL_OPTIONS = {
+    option: int(os.environ[env])
+    for option, env in (
+        ("maxPoolSize", "MONGO_MAX_POOL_SIZE"),
+        ("minPoolSize", "MONGO_MIN_POOL_SIZE"),
+        ("maxIdleTimeMS", "MONGO_MAX_IDLE_TIME_MS"),
+        ("waitQueueTimeoutMS", "MONGO_WAIT_QUEUE_TIMEOUT_MS"),
+        ("connectTimeoutMS", "MONGO_CONNECT_TIMEOUT_MS"),
+        ("socketTimeoutMS", "MONGO_SOCKET_TIMEOUT_MS"),
+        ("serverSelectionTimeoutMS", "MONGO_SERVER_SELECTION_TIMEOUT_MS"),
+    )
+    if os.environ.get(env)
+}
+# Connections opened before the worker starts accepting requests
+MONGO_WARMUP_CONNECTIONS = int(os.environ.get('MONGO_WARMUP_CONNECTIONS', str(MONGO_POOL_OPTIONS.get("minPoolSize", 4))))
+client = AsyncIOMotorClient(mongo_url, event_listeners=[MongoCommandListener()], **MONGO_POOL_OPTIONS)
 db = client[os.environ['DB_NAME']]
 
+# State shared between the worker processes of one host: the optional SQLite cache and the
+# lock that elects the worker running singleton jobs
+SHARED_STATE_DIR = Path(os.environ.get('SHARED_STATE_DIR', tempfile.gettempdir()))
+leader_lock = LeaderLock(str(SHARED_STATE_DIR / f"blood-bank-{os.environ['DB_NAME']}.lock"))
+stats_store = StatsStore(db)
+analytics_store = AnalyticsStore(db)
+# Multi-document transactions need a replica set or sharded cluster
+MONGO_TRANSACTIONS = os.environ.get('MONGO_TRANSACTIONS', '').lower() in ('1', 'true', 'yes')
+STATS_RECONCILE_SECONDS = float(os.environ.get('STATS_RECONCILE_SECONDS', '300'))
+
+# Server-push events; with EVENTS_CHANGE_STREAM=1 the bus is fed from Mongo change streams instead
+event_bus = EventBus(max_queue=int(os.environ.get('EVENTS_MAX_QUEUE', '100')))
+EVENTS_CHANGE_STREAM = os.environ.get('EVENTS_CHANGE_STREAM', '').lower() in ('1', 'true', 'yes')
+EVENTS_KEEPALIVE_SECONDS = 15
+
+# In-memory leaderboard, rebuilt from Mongo on startup and every LEADERBOARD_REFRESH_SECONDS
+LEADERBOARD_SIZE = int(os.environ.get('LEADERBOARD_SIZE', '10'))
+LEADERBOARD_REFRESH_SECONDS = float(os.environ.get('LEADERBOARD_REFRESH_SECONDS', '300'))
+
+# Write-behind activity log, flushed in batches and on shutdown. With several workers set
+# ACTIVITY_REFRESH_SECONDS so each worker's ring picks up activities written by the others.
+ACTIVITY_REFRESH_SECONDS = float(os.environ.get('ACTIVITY_REFRESH_SECONDS', '0'))
+activity_writer = ActivityWriter(
+    db,
+    batch_size=int(os.environ.get('ACTIVITY_BATCH_SIZE', '100')),
+    flush_interval=float(os.environ.get('ACTIVITY_FLUSH_SECONDS', '0.5')),
+    max_backlog=int(os.environ.get('ACTIVITY_MAX_BACKLOG', '10000'))
+)
+
+# Retention: activities expire through a TTL index, finished requests and old donations are
+# moved to archive collections by a periodic job (0 disables either)
+ACTIVITY_RETENTION_DAYS = float(os.environ.get('ACTIVITY_RETENTION_DAYS', '90'))
+REQUEST_ARCHIVE_DAYS = float(os.environ.get('REQUEST_ARCHIVE_DAYS', '180'))
+DONATION_ARCHIVE_DAYS = float(os.environ.get('DONATION_ARCHIVE_DAYS', '730'))
+ARCHIVE_INTERVAL_SECONDS = float(os.environ.get('ARCHIVE_INTERVAL_SECONDS', '3600'))
+
+# Donor eligibility: deferral days per donation type ("platelets=14,plasma=28" overrides the
+# defaults) and how often the denormalized `eligible` flag is re-synced in bulk
+DEFERRAL_DAYS = parse_deferrals(os.environ.get('ELIGIBILITY_DEFERRAL_DAYS', ''))
+ELIGIBILITY_SYNC_SECONDS = float(os.environ.get('ELIGIBILITY_SYNC_SECONDS', '300'))
+
+# Compatible supply vs pending demand per blood type and city, recomputed in each worker every
+# SHORTAGE_REFRESH_SECONDS (uses numpy when installed). A cell is a shortage below
+# SHORTAGE_MIN_DONORS_PER_REQUEST available, eligible compatible donors per pending request.
+SHORTAGE_REFRESH_SECONDS = float(os.environ.get('SHORTAGE_REFRESH_SECONDS', '60'))
+shortage_analyzer = ShortageAnalyzer(db, min_donors_per_request=float(os.environ.get('SHORTAGE_MIN_DONORS_PER_REQUEST', '3')))
+
+# Notifies compatible donors about new requests, emergencies first (DISPATCH_SINK=none disables)
+DISPATCH_SINK = os.environ.get('DISPATCH_SINK', 'log')
+dispatcher = Dispatcher(
+    db,
+    load_sink(DISPATCH_SINK),
+    donors_per_request=int(os.environ.get('DISPATCH_DONORS_PER_REQUEST', '10')),
+    rate=float(os.environ.get('DISPATCH_RATE_PER_SECOND', '20')),
+    burst=int(os.environ.get('DISPATCH_BURST', '50')),
+    workers=int(os.environ.get('DISPATCH_WORKERS', '4')),
+    match_window=float(os.environ.get('DISPATCH_MATCH_WINDOW_MS', '10')) / 1000,
+    max_attempts=int(os.environ.get('DISPATCH_MAX_ATTEMPTS', '3'))
+) if DISPATCH_SINK != 'none' else None
+
+# Token bucket per user (JWT subject) or client IP; RATE_LIMIT_PER_SECOND=0 disables it.
+# Behind a reverse proxy set RATE_LIMIT_TRUST_PROXY=1 so X-Forwarded-For identifies clients.
+RATE_LIMIT_PER_SECOND = float(os.environ.get('RATE_LIMIT_PER_SECOND', '0'))
+RATE_LIMIT_TRUST_PROXY = os.environ.get('RATE_LIMIT_TRUST_PROXY', '').lower() in ('1', 'true', 'yes')
+rate_limiter = RateLimiter(
+    RATE_LIMIT_PER_SECOND,
+    float(os.environ.get('RATE_LIMIT_BURST', str(max(1, RATE_LIMIT_PER_SECOND * 2))))
+) if RATE_LIMIT_PER_SECOND > 0 else None
+
+# Public reads (donor search, stats) are coalesced and micro-cached per query string
+public_cache = TTLCache(ttl=float(os.environ.get('PUBLIC_CACHE_TTL_SECONDS', '2')), backend=MemoryBackend(max_size=1000))
+
+# Opt-in list serialization that skips per-document models: "validate" or "trust"
+FAST_SERIALIZATION = os.environ.get('FAST_SERIALIZATION', '').lower()
+if FAST_SERIALIZATION not in ('', 'validate', 'trust'):
+    raise ValueError("FAST_SERIALIZATION must be 'validate' or 'trust'")
+
+# Opt-in profiler: requests slower than SLOW_REQUEST_PROFILE_MS dump collapsed stacks
+SLOW_REQUEST_PROFILE_MS = os.environ.get('SLOW_REQUEST_PROFILE_MS')
+slow_request_profiler = SlowRequestProfiler(
+    threshold_seconds=float(SLOW_REQUEST_PROFILE_MS) / 1000,
+    output_dir=os.environ.get('SLOW_REQUEST_PROFILE_DIR', str(ROOT_DIR / 'profiles'))
+) if SLOW_REQUEST_PROFILE_MS else None
+
+# Periodic jobs started on startup and cancelled on shutdown
+background_tasks: List[asyncio.Task] = []
+
 # JWT Configuration
 SECRET_KEY = os.environ.get('JWT_SECRET_KEY', 'your-secret-key-change-in-production')
 ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7  # 7 days
+# Access tokens carry the user claims the handlers need and are short-lived; refresh tokens
+# are exchanged (once each) for a new pair at /auth/refresh
+ACCESS_TOKEN_EXPIRE_MINUTES = float(os.environ.get('ACCESS_TOKEN_EXPIRE_MINUTES', '15'))
+REFRESH_TOKEN_EXPIRE_DAYS = float(os.environ.get('REFRESH_TOKEN_EXPIRE_DAYS', '7'))
+USER_CLAIMS = ("email", "name", "phone", "role", "location", "created_at")
+
+# Logged-out tokens and banned users, mirrored from db.revocations into every worker. A revocation
+# made in another worker is enforced here within REVOCATION_SYNC_SECONDS.
+REVOCATION_SYNC_SECONDS = float(os.environ.get('REVOCATION_SYNC_SECONDS', '10'))
+revocations = RevocationList(db, capacity=int(os.environ.get('REVOCATION_FILTER_CAPACITY', '100000')))
+
+# Authenticated user cache (USER_CACHE_TTL_SECONDS=0 disables it). CACHE_BACKEND=sqlite shares it
+# between the workers of a host so invalidations reach all of them.
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'memory')
+CACHE_SQLITE_PATH = os.environ.get('CACHE_SQLITE_PATH', str(SHARED_STATE_DIR / 'blood-bank-cache.sqlite3'))
+
+def cache_backend(namespace: str, max_size: int):
+    if CACHE_BACKEND == 'sqlite':
+        return SQLiteBackend(CACHE_SQLITE_PATH, namespace)
+    return MemoryBackend(max_size=max_size)
+
+user_cache = TTLCache(
+    ttl=float(os.environ.get('USER_CACHE_TTL_SECONDS', '60')),
+    backend=cache_backend(f"users:{os.environ['DB_NAME']}", int(os.environ.get('USER_CACHE_MAX_SIZE', '10000')))
+)
+
+# Conditional GETs: list endpoints send strong ETags built from version tokens that the write
+# handlers bump, and answer a matching If-None-Match with 304 before touching Mongo. A 304 is
+# only correct if every worker sees every bump, so versions live in the SQLite file in
+# SHARED_STATE_DIR whatever CACHE_BACKEND says. ETAG_VERSIONS=memory keeps them per worker (a
+# single worker only); ETAG_VERSIONS=off drops ETags, e.g. behind a load balancer spanning hosts.
+ETAG_VERSIONS = os.environ.get('ETAG_VERSIONS', 'sqlite')
+versions = VersionStore(
+    SQLiteBackend(CACHE_SQLITE_PATH, f"versions:{os.environ['DB_NAME']}") if ETAG_VERSIONS == 'sqlite' else MemoryBackend(max_size=100000),
+    ttl=float(os.environ.get('ETAG_VERSION_TTL_SECONDS', '3600')),
+    executor=ThreadPoolExecutor(1, thread_name_prefix="etag-versions") if ETAG_VERSIONS == 'sqlite' else None
+)
+
+# Pagination
+PAGE_SIZE_MAX = 1000
+DONOR_SORT = [("created_at", 1), ("id", 1)]
+REQUEST_SORT = [("is_emergency", -1), ("created_at", -1), ("id", -1)]
+DONATION_SORT = [("donation_date", -1), ("id", -1)]
 
 # Password hashing
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+password_hasher = PasswordHasher(
+    pwd_context,
+    max_workers=int(os.environ.get('PASSWORD_HASH_WORKERS', str(min(4, os.cpu_count() or 1)))),
+    max_queue=int(os.environ.get('PASSWORD_HASH_MAX_QUEUE', '256'))
+)
+# Bulk imports hash in worker processes, separate from the request-path hasher
+bulk_hasher = BatchPasswordHasher(pwd_context, workers=int(os.environ.get('BULK_HASH_WORKERS', str(os.cpu_count() or 1))))
+# Import uploads larger than this are spooled to a temporary file
+BULK_UPLOAD_MEMORY_BYTES = int(os.environ.get('BULK_UPLOAD_MEMORY_BYTES', str(8 << 20)))
 security = HTTPBearer()
+optional_security = HTTPBearer(auto_error=False)
 
 # Create the main app without a prefix
 app = FastAPI()
@@ -37,6 +226,9 @@ app = FastAPI()
 api_router = APIRouter(prefix="/api")
 
 # Models
+# Blood types end up in Mongo field paths (stats counters), so only known ones are accepted
+BloodType = Literal[tuple(BLOOD_TYPES)]
+
 class UserBase(BaseModel):
     email: EmailStr
     name: str
@@ -44,8 +236,10 @@ class UserBase(BaseModel):
     role: str  # donor, recipient, admin
 
 class UserRegister(UserBase):
+    # Admins see donor contact exports, imports and bans, so nobody can sign up as one
+    role: Literal["donor", "recipient"]
     password: str
-    blood_type: Optional[str] = None
+    blood_type: Optional[BloodType] = None
     location: Optional[str] = None
 
 class UserLogin(BaseModel):
@@ -62,6 +256,13 @@ class TokenResponse(BaseModel):
     access_token: str
     token_type: str
     user: User
+    refresh_token: Optional[str] = None
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
+class LogoutRequest(BaseModel):
+    refresh_token: Optional[str] = None
 
 class DonorProfile(BaseModel):
     model_config = ConfigDict(extra="ignore")
@@ -76,9 +277,12 @@ class DonorProfile(BaseModel):
     phone: str
     email: str
     achievements: List[str] = []
+    eligible: bool = True
+    eligible_from: Optional[str] = None
+    distance_km: Optional[float] = None  # only set by nearest-donor searches
 
 class DonorCreate(BaseModel):
-    blood_type: str
+    blood_type: BloodType
     available: bool = True
     last_donation_date: Optional[str] = None
 
@@ -99,16 +303,20 @@ class BloodRequest(BaseModel):
     created_at: str
     updated_at: str
 
+# Both end up in stats counter field paths, so only known values are accepted
+Urgency = Literal["low", "medium", "high", "critical", "emergency"]
+RequestStatus = Literal["pending", "accepted", "completed", "cancelled"]
+
 class BloodRequestCreate(BaseModel):
     donor_id: Optional[str] = None
-    blood_type: str
+    blood_type: BloodType
     location: str
-    urgency: str
+    urgency: Urgency
     message: Optional[str] = None
     is_emergency: bool = False
 
 class BloodRequestUpdate(BaseModel):
-    status: str
+    status: RequestStatus
 
 class DonorAvailabilityUpdate(BaseModel):
     available: bool
@@ -124,10 +332,12 @@ class DonationHistory(BaseModel):
     location: str
     donation_date: str
     units: int = 1
+    donation_type: str = DEFAULT_DONATION_TYPE
 
 class DonationHistoryCreate(BaseModel):
     request_id: str
     units: int = 1
+    donation_type: str = DEFAULT_DONATION_TYPE
 
 class Activity(BaseModel):
     model_config = ConfigDict(extra="ignore")
@@ -138,6 +348,15 @@ class Activity(BaseModel):
     blood_type: Optional[str] = None
     timestamp: str
 
+class DonorMatchRequest(BaseModel):
+    request_ids: Optional[List[str]] = None  # defaults to every pending request
+    per_request: int = Field(5, ge=1, le=50)
+    exclusive: bool = False
+
+class RequestMatches(BaseModel):
+    request_id: str
+    donors: List[DonorProfile]
+
 class CompatibilityCheck(BaseModel):
     donor_type: str
     recipient_type: str
@@ -148,36 +367,79 @@ class CompatibilityResult(BaseModel):
     donor_type: str
     recipient_type: str
 
+blood_request_serializer = ListSerializer(BloodRequest)
+donation_history_serializer = ListSerializer(DonationHistory)
+
 # Helper Functions
-def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
+async def hash_password(password: str) -> str:
+    try:
+        return await password_hasher.hash(password)
+    except HasherBusyError:
+        raise HTTPException(status_code=503, detail="Server is busy, please retry")
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    try:
+        return await password_hasher.verify(plain_password, hashed_password)
+    except HasherBusyError:
+        raise HTTPException(status_code=503, detail="Server is busy, please retry")
 
-def create_access_token(data: dict) -> str:
+def create_access_token(data: dict, token_type: str = "access", lifetime: Optional[timedelta] = None) -> str:
     to_encode = data.copy()
-    expire = datetime.now(timezone.utc) + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire})
+    now = datetime.now(timezone.utc)
+    expire = now + (lifetime or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
+    to_encode.update({"exp": expire, "iat": now, "jti": uuid.uuid4().hex, "type": token_type})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> dict:
+def token_response(user: dict) -> TokenResponse:
+    # Claims go stale if a bulk import rewrites the user, at most until the access token expires
+    claims = {"sub": user["id"], **{claim: user.get(claim) for claim in USER_CLAIMS}}
+    return TokenResponse(
+        access_token=create_access_token(claims),
+        refresh_token=create_access_token({"sub": user["id"]}, "refresh", timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)),
+        token_type="bearer",
+        user=User(**{claim: user.get(claim) for claim in USER_CLAIMS}, id=user["id"])
+    )
+
+def decode_token(token: str, token_type: str = "access") -> dict:
     try:
-        token = credentials.credentials
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id: str = payload.get("sub")
-        if user_id is None:
-            raise HTTPException(status_code=401, detail="Invalid authentication credentials")
-        
-        user = await db.users.find_one({"id": user_id}, {"_id": 0})
-        if user is None:
-            raise HTTPException(status_code=401, detail="User not found")
-        return user
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Token has expired")
-    except jwt.JWTError:
+    except jwt.PyJWTError:
         raise HTTPException(status_code=401, detail="Could not validate credentials")
+    # Tokens issued before refresh tokens existed have no type and are access tokens
+    if payload.get("sub") is None or payload.get("type", "access") != token_type:
+        raise HTTPException(status_code=401, detail="Invalid authentication credentials")
+    return payload
+
+def token_expiry(payload: dict) -> datetime:
+    return datetime.fromtimestamp(payload["exp"], timezone.utc)
+
+async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> dict:
+    return await authenticate_token(credentials.credentials)
+
+async def authenticate_token(token: str) -> dict:
+    payload = decode_token(token)
+    if await revocations.is_revoked(payload):
+        raise HTTPException(status_code=401, detail="Token has been revoked")
+    user_id: str = payload["sub"]
+    if "role" in payload:
+        # The token carries everything handlers read from the user, so no lookup
+        return {"id": user_id, **{claim: payload.get(claim) for claim in USER_CLAIMS}}
+    
+    # Older tokens only carry the subject
+    user = await user_cache.get_or_load(
+        user_id,
+        lambda: db.users.find_one({"id": user_id}, {"_id": 0, "password_hash": 0})
+    )
+    if user is None or user.get("banned"):
+        raise HTTPException(status_code=401, detail="User not found")
+    return user
+
+def invalidate_user(user_id: str):
+    # Must be called by every code path that modifies a users document
+    user_cache.invalidate(user_id)
 
 def calculate_achievements(total_donations: int) -> List[str]:
     achievements = []
@@ -193,23 +455,112 @@ def calculate_achievements(total_donations: int) -> List[str]:
         achievements.append("Guardian Angel")
     return achievements
 
+leaderboard = Leaderboard(LEADERBOARD_SIZE, calculate_achievements)
+
 def check_blood_compatibility(donor_type: str, recipient_type: str) -> tuple[bool, str]:
-    compatibility_map = {
-        'O-': ['O-', 'O+', 'A-', 'A+', 'B-', 'B+', 'AB-', 'AB+'],
-        'O+': ['O+', 'A+', 'B+', 'AB+'],
-        'A-': ['A-', 'A+', 'AB-', 'AB+'],
-        'A+': ['A+', 'AB+'],
-        'B-': ['B-', 'B+', 'AB-', 'AB+'],
-        'B+': ['B+', 'AB+'],
-        'AB-': ['AB-', 'AB+'],
-        'AB+': ['AB+']
-    }
-    
-    if donor_type in compatibility_map and recipient_type in compatibility_map[donor_type]:
+    # Backed by the precomputed bitmask table in compatibility.py
+    if is_compatible(donor_type, recipient_type):
         return True, f"{donor_type} blood can be donated to {recipient_type}"
     else:
         return False, f"{donor_type} blood is NOT compatible with {recipient_type}"
 
+def donor_profile_pipeline(match: dict, location: Optional[str] = None, limit: Optional[int] = 1000, sort: Optional[list] = None, near: Optional[dict] = None) -> List[dict]:
+    if near:
+        # $geoNear filters with `match` and returns donors nearest first
+        pipeline = [near]
+    else:
+        pipeline = [{"$match": match}]
+    if sort and not near:
+        pipeline.append({"$sort": dict(sort)})
+    if limit and not location:
+        # Without a user-side filter the limit can be applied before the join
+        pipeline.append({"$limit": limit})
+    pipeline += join_users()
+    if location:
+        # Case-insensitive substring match, same semantics as the old Python-side filter
+        pipeline.append({"$match": {"user.location": {"$regex": re.escape(location), "$options": "i"}}})
+        if limit:
+            pipeline.append({"$limit": limit})
+    return pipeline
+
+def donor_profile_from_doc(doc: dict) -> DonorProfile:
+    user = doc["user"]
+    total_donations = doc.get("total_donations", 0)
+    return DonorProfile(
+        id=doc["id"],
+        user_id=doc["user_id"],
+        blood_type=doc["blood_type"],
+        available=doc["available"],
+        last_donation_date=doc.get("last_donation_date"),
+        total_donations=total_donations,
+        location=user.get("location") or "",
+        name=user["name"],
+        phone=user["phone"],
+        email=user["email"],
+        achievements=calculate_achievements(total_donations),
+        eligible=doc.get("eligible", True),
+        eligible_from=doc.get("eligible_from"),
+        distance_km=round(doc["distance_m"] / 1000, 2) if "distance_m" in doc else None
+    )
+
+def encode_cursor(doc: dict, sort: list) -> str:
+    values = [doc.get(field) for field, _ in sort]
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+def decode_cursor(cursor: str, sort: list) -> list:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(values, list) or len(values) != len(sort):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+def apply_cursor(query: dict, sort: list, cursor: Optional[str]) -> dict:
+    if not cursor:
+        return query
+    values = decode_cursor(cursor, sort)
+    # Keyset condition: (a > x) or (a == x and b > y) ..., with $lt for descending keys
+    clauses = []
+    for i, (field, direction) in enumerate(sort):
+        clause = {prev_field: values[j] for j, (prev_field, _) in enumerate(sort[:i])}
+        clause[field] = {"$gt" if direction == 1 else "$lt": values[i]}
+        clauses.append(clause)
+    keyset = {"$or": clauses}
+    return {"$and": [query, keyset]} if query else keyset
+
+async def fetch_page(cursor, limit: int, sort: list, response: Response) -> List[dict]:
+    # Read one extra document to know whether another page exists
+    docs = await cursor.to_list(limit + 1)
+    if len(docs) > limit:
+        docs = docs[:limit]
+        response.headers["X-Next-Cursor"] = encode_cursor(docs[-1], sort)
+    return docs
+
+def ndjson_response(cursor, to_model) -> StreamingResponse:
+    async def generate():
+        async for doc in cursor:
+            yield to_model(doc).model_dump_json() + "\n"
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+def not_modified(request: Request, response: Response, *parts: str) -> Optional[Response]:
+    if ETAG_VERSIONS == 'off':
+        return None
+    # The ETag covers the route, its query string and whatever the caller passes (user, versions)
+    etag = make_etag(request.url.path, urlencode(sorted(request.query_params.multi_items())), *parts)
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "no-cache"
+    return None
+
+def blood_requests_changed(*recipient_ids: str):
+    versions.bump("blood_requests", *(f"blood_requests:{recipient_id}" for recipient_id in recipient_ids))
+
+def publish_event(event_type: str, doc: dict):
+    if not EVENTS_CHANGE_STREAM:
+        event_bus.publish(event_type, {k: v for k, v in doc.items() if k != "_id"})
+
 async def create_activity(activity_type: str, message: str, user_name: str, blood_type: Optional[str] = None):
     activity_doc = {
         "id": str(uuid.uuid4()),
@@ -219,7 +570,8 @@ async def create_activity(activity_type: str, message: str, user_name: str, bloo
         "blood_type": blood_type,
         "timestamp": datetime.now(timezone.utc).isoformat()
     }
-    await db.activities.insert_one(activity_doc)
+    activity_writer.write(activity_doc)
+    publish_event(ACTIVITY, activity_doc)
 
 # Routes
 @api_router.post("/auth/register", response_model=TokenResponse)
@@ -238,10 +590,13 @@ async def register(user_data: UserRegister):
         "phone": user_data.phone,
         "role": user_data.role,
         "location": user_data.location,
-        "password_hash": hash_password(user_data.password),
+        "password_hash": await hash_password(user_data.password),
         "created_at": datetime.now(timezone.utc).isoformat()
     }
-    await db.users.insert_one(user_doc)
+    try:
+        await db.users.insert_one(user_doc)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Email already registered")
     
     # If donor, create donor profile
     if user_data.role == "donor" and user_data.blood_type:
@@ -252,9 +607,15 @@ async def register(user_data: UserRegister):
             "available": True,
             "last_donation_date": None,
             "total_donations": 0,
+            "location_point": geo_point(user_data.location),
             "created_at": datetime.now(timezone.utc).isoformat()
         }
+        donor_doc["eligible_from"] = donor_doc["created_at"]
+        donor_doc["eligible"] = True
         await db.donors.insert_one(donor_doc)
+        versions.bump("donors")
+        await stats_store.user_registered(donor_blood_type=user_data.blood_type)
+        leaderboard.upsert(leaderboard.make_entry(donor_doc, user_doc))
         
         # Create activity
         await create_activity(
@@ -263,49 +624,55 @@ async def register(user_data: UserRegister):
             user_data.name,
             user_data.blood_type
         )
+    else:
+        await stats_store.user_registered()
     
-    # Create token
-    access_token = create_access_token(data={"sub": user_id})
-    
-    user_response = User(
-        id=user_id,
-        email=user_data.email,
-        name=user_data.name,
-        phone=user_data.phone,
-        role=user_data.role,
-        location=user_data.location,
-        created_at=user_doc["created_at"]
-    )
-    
-    return TokenResponse(
-        access_token=access_token,
-        token_type="bearer",
-        user=user_response
-    )
+    return token_response(user_doc)
 
 @api_router.post("/auth/login", response_model=TokenResponse)
 async def login(credentials: UserLogin):
     user = await db.users.find_one({"email": credentials.email}, {"_id": 0})
-    if not user or not verify_password(credentials.password, user["password_hash"]):
+    # Bulk-imported donors may not have a password yet
+    if not user or not user.get("password_hash") or not await verify_password(credentials.password, user["password_hash"]):
         raise HTTPException(status_code=401, detail="Invalid email or password")
+    if user.get("banned"):
+        raise HTTPException(status_code=403, detail="This account has been banned")
     
-    access_token = create_access_token(data={"sub": user["id"]})
-    
-    user_response = User(
-        id=user["id"],
-        email=user["email"],
-        name=user["name"],
-        phone=user["phone"],
-        role=user["role"],
-        location=user.get("location"),
-        created_at=user["created_at"]
-    )
-    
-    return TokenResponse(
-        access_token=access_token,
-        token_type="bearer",
-        user=user_response
-    )
+    return token_response(user)
+
+@api_router.post("/auth/refresh", response_model=TokenResponse)
+async def refresh_tokens(data: RefreshRequest):
+    payload = decode_token(data.refresh_token, "refresh")
+    if await revocations.is_revoked(payload):
+        raise HTTPException(status_code=401, detail="Token has been revoked")
+    # Fresh claims, and a ban since the last refresh is seen here
+    user = await db.users.find_one({"id": payload["sub"]}, {"_id": 0, "password_hash": 0})
+    if not user or user.get("banned"):
+        raise HTTPException(status_code=401, detail="User not found")
+    # Each refresh token is spent once; a replayed one loses the race on the revocation insert
+    if not await revocations.revoke_token(payload["jti"], user["id"], token_expiry(payload)):
+        raise HTTPException(status_code=401, detail="Token has been revoked")
+    return token_response(user)
+
+@api_router.post("/auth/logout")
+async def logout(data: Optional[LogoutRequest] = None, credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security)):
+    # Either token is enough: a client whose access token has expired still holds its refresh token
+    tokens = []
+    if credentials:
+        tokens.append((credentials.credentials, "access"))
+    if data and data.refresh_token:
+        tokens.append((data.refresh_token, "refresh"))
+    if not tokens:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    for token, token_type in tokens:
+        try:
+            payload = decode_token(token, token_type)
+        except HTTPException:
+            # Expired or invalid tokens are unusable already
+            continue
+        if "jti" in payload:
+            await revocations.revoke_token(payload["jti"], payload["sub"], token_expiry(payload))
+    return {"message": "Logged out"}
 
 @api_router.get("/profile", response_model=User)
 async def get_profile(current_user: dict = Depends(get_current_user)):
@@ -320,41 +687,81 @@ async def get_profile(current_user: dict = Depends(get_current_user)):
     )
 
 @api_router.get("/donors", response_model=List[DonorProfile])
-async def get_donors(blood_type: Optional[str] = None, location: Optional[str] = None, available: Optional[bool] = None):
+async def get_donors(
+    request: Request,
+    response: Response,
+    blood_type: Optional[str] = None,
+    location: Optional[str] = None,
+    available: Optional[bool] = None,
+    eligible: Optional[bool] = None,
+    compatible_with: Optional[str] = None,
+    near: Optional[str] = None,
+    lat: Optional[float] = Query(None, ge=-90, le=90),
+    lng: Optional[float] = Query(None, ge=-180, le=180),
+    radius_km: Optional[float] = Query(None, gt=0),
+    limit: int = Query(PAGE_SIZE_MAX, ge=1, le=PAGE_SIZE_MAX),
+    cursor: Optional[str] = None,
+    stream: bool = False
+):
+    donors_version, = await versions.current("donors")
+    # Results of an eligibility filter change with the clock alone, so those are not tagged
+    if eligible is None and not stream:
+        cached = not_modified(request, response, donors_version)
+        if cached:
+            return cached
+    
     query = {}
     if available is not None:
         query["available"] = available
+    if eligible is not None:
+        # Past their deferral period right now, whatever the last flag sync said
+        now = datetime.now(timezone.utc).isoformat()
+        query["eligible_from"] = {"$lte": now} if eligible else {"$gt": now}
     if blood_type:
         query["blood_type"] = blood_type
+    elif compatible_with:
+        # Every donor type that can give to the recipient's blood type
+        query["blood_type"] = {"$in": list(donor_types_for(compatible_with))}
     
-    donors = await db.donors.find(query, {"_id": 0}).to_list(1000)
+    # Nearest-donor mode: `near` is a city name, or pass explicit lat/lng
+    geo_stage = None
+    if near or (lat is not None and lng is not None):
+        if near:
+            coordinates = geocode(near)
+            if coordinates is None:
+                raise HTTPException(status_code=400, detail=f"Unknown location: {near}")
+            lng, lat = coordinates
+        if cursor:
+            raise HTTPException(status_code=400, detail="Cursor pagination is not supported for nearest-donor searches")
+        geo_stage = geo_near_stage(lng, lat, query, radius_km)
+        # The text filter is redundant once results are distance-sorted
+        location = None
+    else:
+        query = apply_cursor(query, DONOR_SORT, cursor)
     
-    # Enrich with user data
-    result = []
-    for donor in donors:
-        user = await db.users.find_one({"id": donor["user_id"]}, {"_id": 0})
-        if user:
-            # Filter by location if specified
-            if location and location.lower() not in user.get("location", "").lower():
-                continue
-            
-            achievements = calculate_achievements(donor.get("total_donations", 0))
-            
-            result.append(DonorProfile(
-                id=donor["id"],
-                user_id=donor["user_id"],
-                blood_type=donor["blood_type"],
-                available=donor["available"],
-                last_donation_date=donor.get("last_donation_date"),
-                total_donations=donor.get("total_donations", 0),
-                location=user.get("location", ""),
-                name=user["name"],
-                phone=user["phone"],
-                email=user["email"],
-                achievements=achievements
-            ))
+    # Join donors with their users in a single aggregation instead of one find_one per donor
+    if stream:
+        pipeline = donor_profile_pipeline(query, location=location, limit=None, sort=DONOR_SORT, near=geo_stage)
+        return ndjson_response(db.donors.aggregate(pipeline), donor_profile_from_doc)
     
-    return result
+    async def load_page():
+        page_response = Response()
+        if geo_stage:
+            pipeline = donor_profile_pipeline(query, limit=limit, near=geo_stage)
+            donors = await db.donors.aggregate(pipeline).to_list(limit)
+        else:
+            pipeline = donor_profile_pipeline(query, location=location, limit=limit + 1, sort=DONOR_SORT)
+            donors = await fetch_page(db.donors.aggregate(pipeline), limit, DONOR_SORT, page_response)
+        return {
+            "donors": [donor_profile_from_doc(donor) for donor in donors],
+            "next_cursor": page_response.headers.get("X-Next-Cursor")
+        }
+    
+    # Identical searches in flight at the same time share one aggregation
+    page = await public_cache.get_or_load(f"donors@{donors_version}?" + urlencode(sorted(request.query_params.multi_items())), load_page)
+    if page["next_cursor"]:
+        response.headers["X-Next-Cursor"] = page["next_cursor"]
+    return page["donors"]
 
 @api_router.get("/donors/me", response_model=DonorProfile)
 async def get_my_donor_profile(current_user: dict = Depends(get_current_user)):
@@ -366,6 +773,9 @@ async def get_my_donor_profile(current_user: dict = Depends(get_current_user)):
         raise HTTPException(status_code=404, detail="Donor profile not found")
     
     achievements = calculate_achievements(donor.get("total_donations", 0))
+    # The donor's own view is exact; the stored flag can lag by up to one sync interval
+    eligible_from = donor.get("eligible_from")
+    eligible = eligible_from <= datetime.now(timezone.utc).isoformat() if eligible_from else donor.get("eligible", True)
     
     return DonorProfile(
         id=donor["id"],
@@ -378,7 +788,9 @@ async def get_my_donor_profile(current_user: dict = Depends(get_current_user)):
         name=current_user["name"],
         phone=current_user["phone"],
         email=current_user["email"],
-        achievements=achievements
+        achievements=achievements,
+        eligible=eligible,
+        eligible_from=eligible_from
     )
 
 @api_router.put("/donors/me/availability")
@@ -386,40 +798,33 @@ async def update_donor_availability(update: DonorAvailabilityUpdate, current_use
     if current_user["role"] != "donor":
         raise HTTPException(status_code=403, detail="Only donors can access this endpoint")
     
-    result = await db.donors.update_one(
+    previous = await db.donors.find_one_and_update(
         {"user_id": current_user["id"]},
-        {"$set": {"available": update.available}}
+        {"$set": {"available": update.available}},
+        projection={"_id": 0, "id": 1, "available": 1}
     )
     
-    if result.matched_count == 0:
+    if previous is None:
         raise HTTPException(status_code=404, detail="Donor profile not found")
+    leaderboard.set_available(previous["id"], update.available)
+    versions.bump("donors")
+    await stats_store.donor_availability_changed(previous["available"], update.available)
     
     return {"message": "Availability updated successfully", "available": update.available}
 
 @api_router.get("/donors/leaderboard", response_model=List[DonorProfile])
-async def get_donor_leaderboard():
-    donors = await db.donors.find({}, {"_id": 0}).sort("total_donations", -1).limit(10).to_list(10)
-    
-    result = []
-    for donor in donors:
-        user = await db.users.find_one({"id": donor["user_id"]}, {"_id": 0})
-        if user:
-            achievements = calculate_achievements(donor.get("total_donations", 0))
-            result.append(DonorProfile(
-                id=donor["id"],
-                user_id=donor["user_id"],
-                blood_type=donor["blood_type"],
-                available=donor["available"],
-                last_donation_date=donor.get("last_donation_date"),
-                total_donations=donor.get("total_donations", 0),
-                location=user.get("location", ""),
-                name=user["name"],
-                phone=user["phone"],
-                email=user["email"],
-                achievements=achievements
-            ))
-    
-    return result
+async def get_donor_leaderboard(
+    request: Request,
+    response: Response,
+    limit: int = Query(LEADERBOARD_SIZE, ge=1, le=LEADERBOARD_SIZE),
+    blood_type: Optional[str] = None,
+    location: Optional[str] = None
+):
+    cached = not_modified(request, response, local_version(leaderboard.version))
+    if cached:
+        return cached
+    # Served from the in-memory leaderboard, entries are already enriched
+    return leaderboard.top(limit, blood_type=blood_type, location=location)
 
 @api_router.post("/blood-requests", response_model=BloodRequest)
 async def create_blood_request(request_data: BloodRequestCreate, current_user: dict = Depends(get_current_user)):
@@ -453,6 +858,12 @@ async def create_blood_request(request_data: BloodRequestCreate, current_user: d
     }
     
     await db.blood_requests.insert_one(request_doc)
+    blood_requests_changed(current_user["id"])
+    await stats_store.request_created(request_doc)
+    await analytics_store.request_created(request_doc)
+    publish_event(REQUEST_CREATED, request_doc)
+    if dispatcher:
+        dispatcher.submit(request_doc)
     
     # Create activity
     urgency_text = "🚨 EMERGENCY" if request_data.is_emergency else request_data.urgency.upper()
@@ -466,32 +877,78 @@ async def create_blood_request(request_data: BloodRequestCreate, current_user: d
     return BloodRequest(**request_doc)
 
 @api_router.get("/blood-requests", response_model=List[BloodRequest])
-async def get_blood_requests(current_user: dict = Depends(get_current_user)):
+async def get_blood_requests(
+    request: Request,
+    response: Response,
+    limit: int = Query(PAGE_SIZE_MAX, ge=1, le=PAGE_SIZE_MAX),
+    cursor: Optional[str] = None,
+    stream: bool = False,
+    current_user: dict = Depends(get_current_user)
+):
+    if not stream:
+        # A recipient only sees their own requests (and loses archived ones); donors and
+        # admins see requests anyone creates
+        if current_user["role"] == "recipient":
+            scope = await versions.current(f"blood_requests:{current_user['id']}", "blood_requests:archive")
+        else:
+            scope = await versions.current("blood_requests")
+        cached = not_modified(request, response, current_user["role"], current_user["id"], *scope)
+        if cached:
+            return cached
+    
     if current_user["role"] == "donor":
         # Get donor profile
         donor = await db.donors.find_one({"user_id": current_user["id"]}, {"_id": 0})
         if not donor:
             return []
         
-        # Get requests for this donor or matching blood type
-        requests = await db.blood_requests.find({
+        # Get requests for this donor or for any blood type this donor can give to
+        query = {
             "$or": [
                 {"donor_id": donor["id"]},
-                {"blood_type": donor["blood_type"], "status": "pending"}
+                {"blood_type": {"$in": list(recipient_types_for(donor["blood_type"]))}, "status": "pending"}
             ]
-        }, {"_id": 0}).sort("is_emergency", -1).sort("created_at", -1).to_list(1000)
+        }
     elif current_user["role"] == "recipient":
         # Get requests created by this recipient
-        requests = await db.blood_requests.find(
-            {"recipient_id": current_user["id"]},
-            {"_id": 0}
-        ).sort("created_at", -1).to_list(1000)
+        query = {"recipient_id": current_user["id"]}
     else:
         # Admin - get all requests
-        requests = await db.blood_requests.find({}, {"_id": 0}).sort("is_emergency", -1).sort("created_at", -1).to_list(1000)
+        query = {}
+    
+    requests_cursor = db.blood_requests.find(apply_cursor(query, REQUEST_SORT, cursor), blood_request_serializer.projection).sort(REQUEST_SORT)
+    if stream:
+        return ndjson_response(requests_cursor, lambda req: BloodRequest(**req))
     
+    requests = await fetch_page(requests_cursor.limit(limit + 1), limit, REQUEST_SORT, response)
+    if FAST_SERIALIZATION:
+        return blood_request_serializer.response(requests, FAST_SERIALIZATION, response)
     return [BloodRequest(**req) for req in requests]
 
+@api_router.get("/blood-requests/{request_id}/matches", response_model=List[DonorProfile])
+async def get_request_matches(request_id: str, limit: int = Query(10, ge=1, le=50), current_user: dict = Depends(get_current_user)):
+    request = await db.blood_requests.find_one({"id": request_id}, {"_id": 0})
+    if not request:
+        raise HTTPException(status_code=404, detail="Request not found")
+    if current_user["role"] == "donor" or (current_user["role"] == "recipient" and request["recipient_id"] != current_user["id"]):
+        raise HTTPException(status_code=403, detail="Not authorized to match this request")
+    
+    matches = await match_requests(db, [request], per_request=limit)
+    return [donor_profile_from_doc(donor) for donor in matches[request_id]]
+
+@api_router.post("/blood-requests/match", response_model=List[RequestMatches])
+async def match_blood_requests(data: DonorMatchRequest, current_user: dict = Depends(get_current_user)):
+    if current_user["role"] != "admin":
+        raise HTTPException(status_code=403, detail="Only admins can batch match requests")
+    
+    query = {"id": {"$in": data.request_ids}} if data.request_ids else {"status": "pending"}
+    requests = await db.blood_requests.find(query, {"_id": 0}).to_list(None)
+    matches = await match_requests(db, requests, per_request=data.per_request, exclusive=data.exclusive)
+    return [
+        RequestMatches(request_id=request_id, donors=[donor_profile_from_doc(donor) for donor in donors])
+        for request_id, donors in matches.items()
+    ]
+
 @api_router.put("/blood-requests/{request_id}")
 async def update_blood_request(request_id: str, update: BloodRequestUpdate, current_user: dict = Depends(get_current_user)):
     request = await db.blood_requests.find_one({"id": request_id}, {"_id": 0})
@@ -502,75 +959,184 @@ async def update_blood_request(request_id: str, update: BloodRequestUpdate, curr
     if current_user["role"] == "recipient" and request["recipient_id"] != current_user["id"]:
         raise HTTPException(status_code=403, detail="Not authorized to update this request")
     
-    result = await db.blood_requests.update_one(
+    now = datetime.now(timezone.utc).isoformat()
+    previous = await db.blood_requests.find_one_and_update(
         {"id": request_id},
-        {"$set": {"status": update.status, "updated_at": datetime.now(timezone.utc).isoformat()}}
+        {"$set": {"status": update.status, "updated_at": now}},
+        projection={"_id": 0}
     )
     
-    if result.matched_count == 0:
+    if previous is None:
         raise HTTPException(status_code=404, detail="Request not found")
+    blood_requests_changed(previous["recipient_id"])
+    await stats_store.request_status_changed(previous, update.status)
+    await analytics_store.request_status_changed(previous, update.status, now)
+    publish_event(REQUEST_UPDATED, {**previous, "status": update.status})
     
     return {"message": "Request updated successfully", "status": update.status}
 
+# Per donor, the latest requests whose donation has been counted. The marker makes the
+# counter update idempotent, so an interrupted donation can simply be applied again. Retries
+# follow within seconds, while deferral periods keep real donations days apart.
+COUNTED_REQUESTS_KEPT = 20
+
+async def apply_donation(donation_doc: dict, eligible_from: str, session=None) -> tuple[Optional[dict], Optional[dict]]:
+    # Returns the request as it was and the donor after the update, or None for the donor
+    # when this donation had already been counted
+    request_id = donation_doc["request_id"]
+    now = donation_doc["donation_date"]
+    
+    async def donor_update():
+        # The pre-image is matched by the guard itself, while some servers and mocks re-run the
+        # filter to fetch a post-image; the donor after the update follows from the update
+        donor = await db.donors.find_one_and_update(
+            {"id": donation_doc["donor_id"], "counted_requests": {"$ne": request_id}},
+            {
+                "$inc": {"total_donations": 1},
+                "$set": {"last_donation_date": now, "eligible": False},
+                # A shorter deferral (platelets after whole blood) must not bring the date forward
+                "$max": {"eligible_from": eligible_from},
+                "$push": {"counted_requests": {"$each": [request_id], "$slice": -COUNTED_REQUESTS_KEPT}}
+            },
+            projection={"_id": 0, "counted_requests": 0},
+            session=session
+        )
+        if donor is None:
+            return None
+        return {
+            **donor,
+            "total_donations": donor.get("total_donations", 0) + 1,
+            "last_donation_date": now,
+            "eligible": False,
+            "eligible_from": max(donor.get("eligible_from") or "", eligible_from)
+        }
+    
+    def request_update():
+        return db.blood_requests.find_one_and_update(
+            {"id": request_id},
+            {"$set": {"status": "completed", "updated_at": now}},
+            projection={"_id": 0},
+            session=session
+        )
+    
+    if session is None:
+        return tuple(await asyncio.gather(request_update(), donor_update()))
+    # Operations sharing a session must not run concurrently, and Motor starts an
+    # operation as soon as it is created, so each is created only when awaited
+    previous = await request_update()
+    return previous, await donor_update()
+
+async def write_donation(donation_doc: dict, eligible_from: str) -> tuple[Optional[dict], Optional[dict]]:
+    # The insert claims request_id through its unique index
+    if MONGO_TRANSACTIONS:
+        async def write(session):
+            await db.donation_history.insert_one(dict(donation_doc), session=session)
+            return await apply_donation(donation_doc, eligible_from, session)
+        async with await client.start_session() as session:
+            return await session.with_transaction(write)
+    
+    # Without transactions the donation stays marked pending until both updates are applied;
+    # a retry that finds it pending applies them again (see record_donation)
+    await db.donation_history.insert_one({**donation_doc, "pending": True})
+    result = await apply_donation(donation_doc, eligible_from)
+    await db.donation_history.update_one({"id": donation_doc["id"]}, {"$unset": {"pending": ""}})
+    return result
+
+async def donation_recorded(donation_doc: dict, request: dict, previous: Optional[dict], updated_donor: Optional[dict], current_user: dict):
+    blood_requests_changed(request["recipient_id"])
+    versions.bump("donors")
+    if updated_donor is None:
+        # Another attempt counted this donation and does the bookkeeping
+        return
+    await asyncio.gather(
+        stats_store.donation_recorded(previous or request),
+        analytics_store.donation_recorded(donation_doc, previous or request)
+    )
+    leaderboard.record_donation(updated_donor, current_user)
+    publish_event(REQUEST_UPDATED, {**(previous or request), "status": "completed"})
+    
+    # Create activity
+    await create_activity(
+        "donation",
+        f"Successful {request['blood_type']} donation completed",
+        current_user["name"],
+        request["blood_type"]
+    )
+
 @api_router.post("/donations", response_model=DonationHistory)
 async def record_donation(donation_data: DonationHistoryCreate, current_user: dict = Depends(get_current_user)):
     if current_user["role"] != "donor":
         raise HTTPException(status_code=403, detail="Only donors can record donations")
+    if donation_data.donation_type not in DEFERRAL_DAYS:
+        raise HTTPException(status_code=400, detail=f"Unknown donation type: {donation_data.donation_type}")
+    
+    donor, existing = await asyncio.gather(
+        db.donors.find_one({"user_id": current_user["id"]}, {"_id": 0}),
+        db.donation_history.find_one({"request_id": donation_data.request_id}, {"_id": 0})
+    )
+    if not donor:
+        raise HTTPException(status_code=404, detail="Donor profile not found")
+    # Idempotent on request_id: a retried call returns the donation already recorded
+    if existing:
+        return await replay_donation(existing, donor, current_user)
     
-    # Get request details
     request = await db.blood_requests.find_one({"id": donation_data.request_id}, {"_id": 0})
     if not request:
         raise HTTPException(status_code=404, detail="Request not found")
     
-    # Get donor profile
-    donor = await db.donors.find_one({"user_id": current_user["id"]}, {"_id": 0})
-    if not donor:
-        raise HTTPException(status_code=404, detail="Donor profile not found")
-    
     # Create donation history
+    now = datetime.now(timezone.utc).isoformat()
     donation_doc = {
         "id": str(uuid.uuid4()),
+        "request_id": donation_data.request_id,
         "donor_id": donor["id"],
         "donor_name": current_user["name"],
         "recipient_id": request["recipient_id"],
         "recipient_name": request["recipient_name"],
         "blood_type": request["blood_type"],
         "location": request["location"],
-        "donation_date": datetime.now(timezone.utc).isoformat(),
-        "units": donation_data.units
+        "donation_date": now,
+        "units": donation_data.units,
+        "donation_type": donation_data.donation_type
     }
-    await db.donation_history.insert_one(donation_doc)
-    
-    # Update donor stats
-    new_total = donor.get("total_donations", 0) + 1
-    await db.donors.update_one(
-        {"id": donor["id"]},
-        {
-            "$set": {
-                "last_donation_date": donation_doc["donation_date"],
-                "total_donations": new_total
-            }
-        }
-    )
     
-    # Update request status
-    await db.blood_requests.update_one(
-        {"id": donation_data.request_id},
-        {"$set": {"status": "completed", "updated_at": datetime.now(timezone.utc).isoformat()}}
-    )
-    
-    # Create activity
-    await create_activity(
-        "donation",
-        f"Successful {request['blood_type']} donation completed",
-        current_user["name"],
-        request["blood_type"]
-    )
+    try:
+        previous, updated_donor = await write_donation(
+            donation_doc, next_eligible(now, donation_data.donation_type, DEFERRAL_DAYS))
+    except DuplicateKeyError:
+        # A concurrent call for the same request won the unique request_id index
+        existing = await db.donation_history.find_one({"request_id": donation_data.request_id}, {"_id": 0})
+        return await replay_donation(existing, donor, current_user)
     
+    await donation_recorded(donation_doc, request, previous, updated_donor, current_user)
     return DonationHistory(**donation_doc)
 
+async def replay_donation(existing: dict, donor: dict, current_user: dict) -> DonationHistory:
+    # Only the donor who recorded a donation may replay it; the request is taken for anyone else
+    if existing["donor_id"] != donor["id"]:
+        raise HTTPException(status_code=409, detail="A donation was already recorded for this request")
+    if existing.get("pending"):
+        # The caller is the donation's own donor, so the leaderboard and activity stay theirs
+        await finish_donation(existing, current_user)
+    return DonationHistory(**existing)
+
+async def finish_donation(donation_doc: dict, current_user: dict):
+    # An earlier attempt inserted the donation but stopped before both updates were applied
+    eligible_from = next_eligible(donation_doc["donation_date"], donation_doc.get("donation_type", DEFAULT_DONATION_TYPE), DEFERRAL_DAYS)
+    request = await db.blood_requests.find_one({"id": donation_doc["request_id"]}, {"_id": 0})
+    previous, updated_donor = await apply_donation(donation_doc, eligible_from)
+    await db.donation_history.update_one({"id": donation_doc["id"]}, {"$unset": {"pending": ""}})
+    if request:
+        await donation_recorded(donation_doc, request, previous, updated_donor, current_user)
+
 @api_router.get("/donations/history", response_model=List[DonationHistory])
-async def get_donation_history(current_user: dict = Depends(get_current_user)):
+async def get_donation_history(
+    response: Response,
+    limit: int = Query(PAGE_SIZE_MAX, ge=1, le=PAGE_SIZE_MAX),
+    cursor: Optional[str] = None,
+    stream: bool = False,
+    current_user: dict = Depends(get_current_user)
+):
     if current_user["role"] == "donor":
         donor = await db.donors.find_one({"user_id": current_user["id"]}, {"_id": 0})
         if not donor:
@@ -581,13 +1147,80 @@ async def get_donation_history(current_user: dict = Depends(get_current_user)):
     else:
         query = {}
     
-    history = await db.donation_history.find(query, {"_id": 0}).sort("donation_date", -1).to_list(1000)
+    # Reads the hot collection and the archive, each side bounded by its own sorted index walk
+    match = apply_cursor(query, DONATION_SORT, cursor)
+    sort = dict(DONATION_SORT)
+    page = [{"$limit": limit + 1}] if not stream else []
+    archived = union_with_archive(DONATION_ARCHIVE, match, {"$sort": sort}, *page)
+    history_cursor = db.donation_history.aggregate(
+        [{"$match": match}, {"$sort": sort}, *page, archived, {"$project": donation_history_serializer.projection}, {"$sort": sort}, *page],
+        allowDiskUse=stream
+    )
+    if stream:
+        return ndjson_response(history_cursor, lambda h: DonationHistory(**h))
+    
+    history = await fetch_page(history_cursor, limit, DONATION_SORT, response)
+    if FAST_SERIALIZATION:
+        return donation_history_serializer.response(history, FAST_SERIALIZATION, response)
     return [DonationHistory(**h) for h in history]
 
 @api_router.get("/activities", response_model=List[Activity])
-async def get_activities():
-    activities = await db.activities.find({}, {"_id": 0}).sort("timestamp", -1).limit(50).to_list(50)
-    return [Activity(**a) for a in activities]
+async def get_activities(request: Request, response: Response):
+    cached = not_modified(request, response, local_version(activity_writer.version))
+    if cached:
+        return cached
+    # Answered from the writer's in-memory ring of the latest entries
+    return [Activity(**a) for a in activity_writer.recent(50)]
+
+@api_router.get("/events")
+async def stream_events(request: Request, token: Optional[str] = None):
+    # EventSource cannot send headers, so the token may also be passed as a query parameter
+    if token is None:
+        scheme, _, credentials = request.headers.get("authorization", "").partition(" ")
+        token = credentials if scheme.lower() == "bearer" else None
+    if not token:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    current_user = await authenticate_token(token)
+    
+    if current_user["role"] == "donor":
+        donor = await db.donors.find_one({"user_id": current_user["id"]}, {"_id": 0})
+        
+        def accepts(event: dict) -> bool:
+            data = event["data"]
+            if event["type"] == ACTIVITY:
+                return True
+            # Without a donor profile GET /blood-requests returns nothing, and so does the stream
+            if donor is None:
+                return False
+            if data.get("donor_id") == donor["id"]:
+                return True
+            if event["type"] == REQUEST_CREATED:
+                return is_compatible(donor["blood_type"], data["blood_type"]) and data["status"] == "pending"
+            return is_compatible(donor["blood_type"], data["blood_type"])
+    elif current_user["role"] == "recipient":
+        def accepts(event: dict) -> bool:
+            return event["type"] == ACTIVITY or event["data"].get("recipient_id") == current_user["id"]
+    else:
+        accepts = None
+    
+    subscription = event_bus.subscribe(accepts)
+    
+    async def generate():
+        try:
+            while not await request.is_disconnected():
+                event = await subscription.get(timeout=EVENTS_KEEPALIVE_SECONDS)
+                if event is None:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: {event['type']}\ndata: {json.dumps(event['data'])}\n\n"
+        finally:
+            subscription.close()
+    
+    return StreamingResponse(
+        generate(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 @api_router.post("/check-compatibility", response_model=CompatibilityResult)
 async def check_compatibility(data: CompatibilityCheck):
@@ -599,55 +1232,268 @@ async def check_compatibility(data: CompatibilityCheck):
         recipient_type=data.recipient_type
     )
 
+async def set_banned(user_id: str, banned: bool, current_user: dict):
+    if current_user["role"] != "admin":
+        raise HTTPException(status_code=403, detail="Only admins can ban users")
+    if user_id == current_user["id"]:
+        raise HTTPException(status_code=400, detail="Admins cannot ban themselves")
+    result = await db.users.update_one({"id": user_id}, {"$set": {"banned": banned}})
+    if result.matched_count == 0:
+        raise HTTPException(status_code=404, detail="User not found")
+    invalidate_user(user_id)
+
+@api_router.post("/admin/users/{user_id}/ban")
+async def ban_user(user_id: str, current_user: dict = Depends(get_current_user)):
+    await set_banned(user_id, True, current_user)
+    # Voids every token issued so far; login and refresh are refused while banned
+    await revocations.revoke_user(user_id, timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS))
+    return {"message": "User banned"}
+
+@api_router.post("/admin/users/{user_id}/unban")
+async def unban_user(user_id: str, current_user: dict = Depends(get_current_user)):
+    await set_banned(user_id, False, current_user)
+    return {"message": "User unbanned"}
+
+def bulk_format(fmt: str) -> str:
+    if fmt not in FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(FORMATS)}")
+    return fmt
+
+async def read_upload(request: Request):
+    # While a StreamingResponse streams, Starlette listens for the client disconnect and that
+    # listener consumes request body messages, so the upload is read before the response starts
+    upload = tempfile.SpooledTemporaryFile(max_size=BULK_UPLOAD_MEMORY_BYTES)
+    async for chunk in request.stream():
+        upload.write(chunk)
+    upload.seek(0)
+    return upload
+
+def bulk_import_response(importer: BulkImporter, events, upload, activity_type: str, noun: str, user_name: str) -> StreamingResponse:
+    # Bulk writes skip the per-request bookkeeping, so catch up once at the end
+    async def catch_up():
+        for user_id in importer.touched_user_ids:
+            invalidate_user(user_id)
+        versions.bump("donors")
+        await stats_store.reconcile()
+        await sync_eligible_flags(db)
+        await leaderboard.rebuild(db)
+        if importer.imported:
+            await create_activity(activity_type, f"{importer.imported} {noun} imported", user_name)
+    
+    async def generate():
+        try:
+            async for event in events:
+                yield json.dumps(event) + "\n"
+        finally:
+            upload.close()
+            # A client disconnect cancels this generator mid-import; the rows written so far
+            # still need the catch-up, so it runs as its own task
+            run_in_background(catch_up(), f"{noun} import catch-up")
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+@api_router.post("/admin/import/donors")
+async def import_donors(
+    request: Request,
+    fmt: str = Query("csv", alias="format"),
+    update_existing: bool = False,
+    current_user: dict = Depends(get_current_user)
+):
+    if current_user["role"] != "admin":
+        raise HTTPException(status_code=403, detail="Only admins can import donors")
+    fmt = bulk_format(fmt)
+    upload = await read_upload(request)
+    importer = BulkImporter(db, bulk_hasher, DEFERRAL_DAYS, update_existing=update_existing)
+    events = importer.import_donors(parse_records(read_chunks(upload), fmt))
+    return bulk_import_response(importer, events, upload, "registration", "donors", current_user["name"])
+
+@api_router.post("/admin/import/donations")
+async def import_donations(request: Request, fmt: str = Query("csv", alias="format"), current_user: dict = Depends(get_current_user)):
+    if current_user["role"] != "admin":
+        raise HTTPException(status_code=403, detail="Only admins can import donations")
+    fmt = bulk_format(fmt)
+    upload = await read_upload(request)
+    importer = BulkImporter(db, bulk_hasher, DEFERRAL_DAYS, analytics=analytics_store)
+    events = importer.import_donations(parse_records(read_chunks(upload), fmt))
+    return bulk_import_response(importer, events, upload, "donation", "historical donations", current_user["name"])
+
+@api_router.get("/admin/export/donors")
+async def export_donor_list(fmt: str = Query("csv", alias="format"), current_user: dict = Depends(get_current_user)):
+    if current_user["role"] != "admin":
+        raise HTTPException(status_code=403, detail="Only admins can export donors")
+    fmt = bulk_format(fmt)
+    return StreamingResponse(
+        format_records(export_donors(db), fmt, DONOR_FIELDS),
+        media_type="text/csv" if fmt == "csv" else "application/x-ndjson",
+        headers={"Content-Disposition": f"attachment; filename=donors.{fmt}"}
+    )
+
+@api_router.get("/admin/export/donations")
+async def export_donation_history(fmt: str = Query("csv", alias="format"), current_user: dict = Depends(get_current_user)):
+    if current_user["role"] != "admin":
+        raise HTTPException(status_code=403, detail="Only admins can export donations")
+    fmt = bulk_format(fmt)
+    return StreamingResponse(
+        format_records(export_donations(db), fmt, DONATION_FIELDS),
+        media_type="text/csv" if fmt == "csv" else "application/x-ndjson",
+        headers={"Content-Disposition": f"attachment; filename=donations.{fmt}"}
+    )
+
 @api_router.get("/stats")
 async def get_stats():
-    total_users = await db.users.count_documents({})
-    total_donors = await db.donors.count_documents({})
-    available_donors = await db.donors.count_documents({"available": True})
-    total_requests = await db.blood_requests.count_documents({})
-    pending_requests = await db.blood_requests.count_documents({"status": "pending"})
-    completed_requests = await db.blood_requests.count_documents({"status": "completed"})
-    emergency_requests = await db.blood_requests.count_documents({"is_emergency": True, "status": "pending"})
-    total_donations = await db.donation_history.count_documents({})
-    
-    # Blood type distribution
-    pipeline = [
-        {"$group": {"_id": "$blood_type", "count": {"$sum": 1}}},
-        {"$sort": {"count": -1}}
-    ]
-    blood_type_dist = await db.donors.aggregate(pipeline).to_list(10)
+    # Served from the incrementally maintained stats document (see stats.py)
+    return await public_cache.get_or_load("stats", stats_store.get)
+
+def parse_range_bound(value: Optional[str], name: str) -> Optional[datetime]:
+    if value is None:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"{name} must be an ISO date or datetime")
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+@api_router.get("/analytics/timeseries")
+async def get_analytics_timeseries(
+    metric: str = "requests",
+    granularity: str = "day",
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    blood_type: Optional[str] = None,
+    location: Optional[str] = None,
+    urgency: Optional[str] = None,
+    group_by: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    if current_user["role"] != "admin":
+        raise HTTPException(status_code=403, detail="Only admins can view analytics")
+    if metric not in METRICS:
+        raise HTTPException(status_code=400, detail=f"metric must be one of {', '.join(METRICS)}")
+    if granularity not in GRANULARITIES:
+        raise HTTPException(status_code=400, detail=f"granularity must be one of {', '.join(GRANULARITIES)}")
+    if group_by is not None and group_by not in DIMENSIONS:
+        raise HTTPException(status_code=400, detail=f"group_by must be one of {', '.join(DIMENSIONS)}")
     
-    # Request urgency distribution
-    urgency_pipeline = [
-        {"$match": {"status": "pending"}},
-        {"$group": {"_id": "$urgency", "count": {"$sum": 1}}}
-    ]
-    urgency_dist = await db.blood_requests.aggregate(urgency_pipeline).to_list(10)
-    
-    return {
-        "total_users": total_users,
-        "total_donors": total_donors,
-        "available_donors": available_donors,
-        "total_requests": total_requests,
-        "pending_requests": pending_requests,
-        "completed_requests": completed_requests,
-        "emergency_requests": emergency_requests,
-        "total_donations": total_donations,
-        "blood_type_distribution": blood_type_dist,
-        "urgency_distribution": urgency_dist
-    }
+    # Default window: the last 48 hours or 30 days
+    end_at = parse_range_bound(end, "end") or datetime.now(timezone.utc)
+    start_at = parse_range_bound(start, "start") or end_at - BUCKET_STEPS[granularity] * (47 if granularity == "hour" else 29)
+    if start_at > end_at:
+        raise HTTPException(status_code=400, detail="start must not be after end")
+    if (end_at - start_at) / BUCKET_STEPS[granularity] >= MAX_POINTS:
+        raise HTTPException(status_code=400, detail=f"Range spans more than {MAX_POINTS} {granularity} buckets")
+    
+    filters = {name: value for name, value in (("blood_type", blood_type), ("location", location), ("urgency", urgency)) if value}
+    series = await analytics_store.timeseries(metric, granularity, start_at, end_at, filters, group_by)
+    return {"metric": metric, "granularity": granularity, "group_by": group_by, "series": series}
+
+@api_router.get("/analytics/shortages")
+async def get_shortages(
+    blood_type: Optional[str] = None,
+    location: Optional[str] = None,
+    shortages_only: bool = False,
+    current_user: dict = Depends(get_current_user)
+):
+    if current_user["role"] != "admin":
+        raise HTTPException(status_code=403, detail="Only admins can view analytics")
+    # Served from the last scheduled computation
+    result = await shortage_analyzer.get()
+    cells = result["cells"]
+    if blood_type:
+        cells = [cell for cell in cells if cell["blood_type"] == blood_type]
+    if location:
+        region = region_for(location)
+        cells = [cell for cell in cells if cell["location"] == region]
+    if shortages_only:
+        cells = [cell for cell in cells if cell["shortage"]]
+    return {**result, "cells": cells}
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    return Response(registry.render(), media_type="text/plain; version=0.0.4")
+
+registry.gauge("password_hash_queue_depth", "Password hash/verify calls waiting for a worker",
+               callback=lambda: password_hasher.queued)
+registry.gauge("password_hash_in_flight", "Password hash/verify calls running", callback=lambda: password_hasher.in_flight)
+registry.gauge("password_hash_rejected", "Password hash/verify calls rejected because the queue was full",
+               callback=lambda: password_hasher.rejected)
+registry.gauge("user_cache_hits", "Authenticated user cache hits", callback=lambda: user_cache.hits)
+registry.gauge("user_cache_misses", "Authenticated user cache misses", callback=lambda: user_cache.misses)
+registry.gauge("activity_backlog", "Activities waiting to be flushed", callback=lambda: activity_writer.stats()["backlog"])
+registry.gauge("activity_dropped", "Activities dropped because the backlog was full or a flush failed",
+               callback=lambda: activity_writer.dropped)
+registry.gauge("public_cache_coalesced", "Public reads answered by joining an identical in-flight query",
+               callback=lambda: public_cache.stats()["coalesced"])
+registry.gauge("etag_version_bumps", "Version bumps that invalidate conditional GET ETags", callback=lambda: versions.bumps)
+registry.gauge("revoked_tokens", "Revoked token ids in the in-memory filter", callback=lambda: revocations.stats()["tokens"])
+registry.gauge("revocation_filter_false_positives", "Filter hits that Mongo showed were not revoked",
+               callback=lambda: revocations.false_positives)
+registry.gauge("public_cache_hits", "Public reads answered from the micro-cache", callback=lambda: public_cache.hits)
+if rate_limiter:
+    registry.gauge("rate_limited_requests", "Requests rejected with 429 by the rate limiter", callback=lambda: rate_limiter.limited)
+registry.gauge("event_subscribers", "Connected server-push clients", callback=lambda: event_bus.stats()["subscribers"])
+if dispatcher:
+    registry.gauge("dispatch_queued_requests", "New requests waiting to be matched for dispatch",
+                   callback=lambda: dispatcher.stats()["queued_requests"])
+    registry.gauge("dispatch_queued_notifications", "Donor notifications waiting for a worker or the rate limit",
+                   callback=lambda: dispatcher.stats()["queued_notifications"])
 
 # Include the router in the main app
 app.include_router(api_router)
 
+def rate_limit_key(request: Request) -> str:
+    # Signature check only, no database read: an invalid token falls back to the client address
+    authorization = request.headers.get("authorization", "")
+    if authorization.lower().startswith("bearer "):
+        try:
+            subject = jwt.decode(authorization[7:], SECRET_KEY, algorithms=[ALGORITHM]).get("sub")
+            if subject:
+                return f"user:{subject}"
+        except jwt.PyJWTError:
+            pass
+    forwarded = request.headers.get("x-forwarded-for") if RATE_LIMIT_TRUST_PROXY else None
+    if forwarded:
+        return f"ip:{forwarded.split(',')[0].strip()}"
+    return f"ip:{request.client.host if request.client else 'unknown'}"
+
+# Registered before CORSMiddleware so 429 responses still carry CORS headers
+@app.middleware("http")
+async def rate_limit(request: Request, call_next):
+    if rate_limiter is None or request.url.path == "/metrics":
+        return await call_next(request)
+    retry_after = rate_limiter.check(rate_limit_key(request))
+    if retry_after:
+        return JSONResponse(
+            status_code=429,
+            content={"detail": "Too many requests"},
+            headers={"Retry-After": str(math.ceil(retry_after))}
+        )
+    return await call_next(request)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    profile_started_at = slow_request_profiler.request_started() if slow_request_profiler else None
+    start = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        # Label by route template so /blood-requests/{request_id} is one series
+        route = request.scope.get("route")
+        path = route.path if route is not None else "unmatched"
+        http_request_duration.observe(time.perf_counter() - start, method=request.method, route=path, status=status_code)
+        if slow_request_profiler:
+            slow_request_profiler.request_finished(profile_started_at, path)
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -655,6 +1501,109 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-@app.on_event("shutdown")
-async def shutdown_db_client():
+def start_periodic(interval: float, job, name: str, leader_only: bool = False):
+    async def run():
+        while True:
+            await asyncio.sleep(interval)
+            # Jobs that must run once per deployment only run in the worker holding the lock
+            if leader_only and not leader_lock.acquire():
+                continue
+            try:
+                await job()
+            except Exception:
+                logger.exception("Periodic job %s failed", name)
+    background_tasks.append(asyncio.create_task(run(), name=name))
+
+def run_in_background(coro, name: str):
+    # Outlives the request that started it; cancelled with the other background tasks at shutdown
+    def forget(task):
+        if task in background_tasks:
+            background_tasks.remove(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("Background task %s failed", task.get_name(), exc_info=task.exception())
+    task = asyncio.create_task(coro, name=name)
+    task.add_done_callback(forget)
+    background_tasks.append(task)
+
+async def warm_up_database():
+    # Opens pool connections and checks the server before the worker takes traffic
+    await asyncio.gather(*(client.admin.command("ping") for _ in range(max(1, MONGO_WARMUP_CONNECTIONS))))
+    await ensure_indexes(db)
+    if ACTIVITY_RETENTION_DAYS > 0:
+        await ensure_activity_ttl(db, int(ACTIVITY_RETENTION_DAYS * 86400))
+    if os.environ.get('VERIFY_QUERY_PLANS', '').lower() in ('1', 'true', 'yes'):
+        for offender in await find_collection_scans(db):
+            logger.warning("Route query does a collection scan: %s", offender)
+
+def start_background_jobs():
+    if STATS_RECONCILE_SECONDS > 0:
+        start_periodic(STATS_RECONCILE_SECONDS, stats_store.reconcile, "stats-reconcile", leader_only=True)
+    if REQUEST_ARCHIVE_DAYS > 0 or DONATION_ARCHIVE_DAYS > 0:
+        start_periodic(ARCHIVE_INTERVAL_SECONDS, archive_records, "archiver", leader_only=True)
+    if ELIGIBILITY_SYNC_SECONDS > 0:
+        start_periodic(ELIGIBILITY_SYNC_SECONDS, sync_eligibility, "eligibility-sync", leader_only=True)
+    # In-process state is refreshed in every worker
+    if REVOCATION_SYNC_SECONDS > 0:
+        start_periodic(REVOCATION_SYNC_SECONDS, revocations.sync, "revocation-sync")
+    if LEADERBOARD_REFRESH_SECONDS > 0:
+        start_periodic(LEADERBOARD_REFRESH_SECONDS, lambda: leaderboard.rebuild(db), "leaderboard-rebuild")
+    if ACTIVITY_REFRESH_SECONDS > 0:
+        start_periodic(ACTIVITY_REFRESH_SECONDS, activity_writer.refresh_recent, "activity-refresh")
+    if SHORTAGE_REFRESH_SECONDS > 0:
+        start_periodic(SHORTAGE_REFRESH_SECONDS, shortage_analyzer.refresh, "shortage-refresh")
+    background_tasks.append(asyncio.create_task(monitor_event_loop_lag(), name="event-loop-lag"))
+    if slow_request_profiler:
+        slow_request_profiler.start()
+    if EVENTS_CHANGE_STREAM:
+        background_tasks.append(asyncio.create_task(watch_change_streams(db, event_bus), name="change-streams"))
+    if dispatcher:
+        dispatcher.start()
+    if leader_lock.acquire():
+        background_tasks.append(asyncio.create_task(backfill_donors(), name="donor-backfill"))
+        background_tasks.append(asyncio.create_task(backfill_analytics(), name="analytics-backfill"))
+
+async def archive_records():
+    moved = await archive_old_records(db, REQUEST_ARCHIVE_DAYS, DONATION_ARCHIVE_DAYS)
+    if moved["blood_requests"]:
+        versions.bump("blood_requests", "blood_requests:archive")
+
+async def sync_eligibility():
+    if await sync_eligible_flags(db):
+        versions.bump("donors")
+
+async def backfill_donors():
+    # Fields added after donors were first created: coordinates and eligibility
+    updated = await backfill_donor_coordinates(db)
+    if updated:
+        logger.info("Backfilled coordinates for %s donors", updated)
+    updated = await backfill_eligibility(db, DEFERRAL_DAYS)
+    if updated:
+        logger.info("Backfilled eligibility for %s donors", updated)
+    versions.bump("donors")
+
+async def backfill_analytics():
+    # Databases from before the rollups existed; later writes keep them current
+    if await db.analytics_rollups.estimated_document_count() == 0:
+        await analytics_store.backfill()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await warm_up_database()
+    await activity_writer.start()
+    await leaderboard.rebuild(db)
+    await revocations.sync(full=True)
+    start_background_jobs()
+    yield
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    background_tasks.clear()
+    if dispatcher:
+        await dispatcher.close()
+    await activity_writer.close()
     client.close()
+    password_hasher.shutdown()
+    bulk_hasher.shutdown()
+    leader_lock.release()
+
+app.router.lifespan_context = lifespan
@@ -0,0 +1,124 @@
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from cache import SingleFlight
+from compatibility import BLOOD_TYPES, BLOOD_TYPE_INDEX, is_compatible
+from eligibility import eligible_filter
+from geo import CITY_COORDINATES, geocode
+from pipelines import normalized_location
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+logger = logging.getLogger(__name__)
+
+UNKNOWN_REGION = "unknown"
+
+# Regions are the cities of the geocoding table; aliases sharing coordinates share a region
+_REGION_BY_COORDINATES: Dict[Tuple[float, float], str] = {}
+for _name, _coordinates in CITY_COORDINATES.items():
+    _REGION_BY_COORDINATES.setdefault(tuple(_coordinates), _name)
+
+# COMPATIBILITY[d][r] is 1 when donor type d can give to recipient type r
+COMPATIBILITY = [[int(is_compatible(donor, recipient)) for recipient in BLOOD_TYPES] for donor in BLOOD_TYPES]
+
+
+def region_for(location: Optional[str]) -> str:
+    coordinates = geocode(location)
+    return _REGION_BY_COORDINATES[tuple(coordinates)] if coordinates else UNKNOWN_REGION
+
+
+def region_for_point(coordinates: Optional[list]) -> str:
+    return _REGION_BY_COORDINATES.get(tuple(coordinates), UNKNOWN_REGION) if coordinates else UNKNOWN_REGION
+
+
+def compatible_supply(supply: List[List[int]]) -> List[List[int]]:
+    # supply is donor type x region; the result is recipient type x region: donors of any
+    # type that can give to that recipient, in that region. A (8 x 8)^T @ (8 x regions) product.
+    if np is not None:
+        return (np.array(COMPATIBILITY, dtype=np.int64).T @ np.array(supply, dtype=np.int64)).tolist()
+    regions = len(supply[0]) if supply else 0
+    return [
+        [sum(COMPATIBILITY[d][r] * supply[d][column] for d in range(len(BLOOD_TYPES))) for column in range(regions)]
+        for r in range(len(BLOOD_TYPES))
+    ]
+
+
+# Where compatible supply cannot cover pending demand. Mongo reduces the donors and pending
+# requests to counts per blood type and location with $group, so the arrays are at most
+# 8 x regions however many donors there are; the compatibility product runs on those.
+class ShortageAnalyzer:
+    def __init__(self, db, min_donors_per_request: float = 3):
+        self.db = db
+        self.min_donors_per_request = min_donors_per_request
+        self.latest: Optional[dict] = None
+        self._flight = SingleFlight()
+
+    async def _counts(self) -> Tuple[Dict[Tuple[str, str], int], Dict[Tuple[str, str], int]]:
+        donors = await self.db.donors.aggregate([
+            {"$match": {"available": True, **eligible_filter()}},
+            {"$group": {"_id": {"blood_type": "$blood_type", "at": "$location_point.coordinates"}, "count": {"$sum": 1}}},
+        ]).to_list(None)
+        requests = await self.db.blood_requests.aggregate([
+            {"$match": {"status": "pending"}},
+            {"$group": {"_id": {"blood_type": "$blood_type", "location": normalized_location()}, "count": {"$sum": 1}}},
+        ]).to_list(None)
+        supply: Dict[Tuple[str, str], int] = {}
+        for row in donors:
+            key = (row["_id"].get("blood_type"), region_for_point(row["_id"].get("at")))
+            supply[key] = supply.get(key, 0) + row["count"]
+        demand: Dict[Tuple[str, str], int] = {}
+        for row in requests:
+            key = (row["_id"].get("blood_type"), region_for(row["_id"].get("location")))
+            demand[key] = demand.get(key, 0) + row["count"]
+        return supply, demand
+
+    def analyze(self, supply: Dict[Tuple[str, str], int], demand: Dict[Tuple[str, str], int]) -> dict:
+        regions = sorted({region for _, region in supply} | {region for _, region in demand})
+        column = {region: i for i, region in enumerate(regions)}
+        supply_matrix = [[0] * len(regions) for _ in BLOOD_TYPES]
+        for (blood_type, region), count in supply.items():
+            if blood_type in BLOOD_TYPE_INDEX:
+                supply_matrix[BLOOD_TYPE_INDEX[blood_type]][column[region]] += count
+        compatible = compatible_supply(supply_matrix)
+
+        cells = []
+        for (blood_type, region), pending in demand.items():
+            if blood_type not in BLOOD_TYPE_INDEX or not pending:
+                continue
+            donors = compatible[BLOOD_TYPE_INDEX[blood_type]][column[region]]
+            cells.append({
+                "blood_type": blood_type,
+                "location": region,
+                "pending_requests": pending,
+                "compatible_donors": donors,
+                "donors_per_request": round(donors / pending, 2),
+                "shortage": donors < pending * self.min_donors_per_request,
+            })
+        # Worst covered first
+        cells.sort(key=lambda cell: (cell["donors_per_request"], -cell["pending_requests"]))
+        return {
+            "min_donors_per_request": self.min_donors_per_request,
+            "regions": len(regions),
+            "shortages": sum(cell["shortage"] for cell in cells),
+            "cells": cells,
+        }
+
+    async def refresh(self) -> dict:
+        async def compute():
+            start = time.perf_counter()
+            supply, demand = await self._counts()
+            result = self.analyze(supply, demand)
+            result["computed_at"] = datetime.now(timezone.utc).isoformat()
+            result["compute_ms"] = round((time.perf_counter() - start) * 1000, 1)
+            self.latest = result
+            return result
+        # Concurrent callers (first requests after startup, the periodic job) share one computation
+        return await self._flight.do("shortages", compute)
+
+    async def get(self) -> dict:
+        return self.latest if self.latest is not None else await self.refresh()
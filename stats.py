@@ -0,0 +1,112 @@
+import logging
+from datetime import datetime, timezone
+from typing import Optional
+
+from retention import REQUEST_ARCHIVE, DONATION_ARCHIVE
+
+logger = logging.getLogger(__name__)
+
+STATS_ID = "global"
+
+
+# Counters for GET /api/stats, kept in a single document in db.stats and maintained with
+# $inc by the write handlers. reconcile() recomputes everything from source to correct drift.
+class StatsStore:
+    def __init__(self, db):
+        self.db = db
+
+    async def _inc(self, counters: dict):
+        counters = {path: value for path, value in counters.items() if value}
+        if counters:
+            await self.db.stats.update_one({"_id": STATS_ID}, {"$inc": counters}, upsert=True)
+
+    async def user_registered(self, donor_blood_type: Optional[str] = None):
+        counters = {"total_users": 1}
+        if donor_blood_type:
+            counters.update({
+                "total_donors": 1,
+                "available_donors": 1,
+                f"blood_types.{donor_blood_type}": 1
+            })
+        await self._inc(counters)
+
+    async def donor_availability_changed(self, was_available: bool, available: bool):
+        if was_available != available:
+            await self._inc({"available_donors": 1 if available else -1})
+
+    async def request_created(self, request: dict):
+        counters = {"total_requests": 1}
+        counters.update(self._status_delta(request, request["status"], 1))
+        await self._inc(counters)
+
+    async def request_status_changed(self, request: dict, new_status: str):
+        # `request` is the document as it was before the update
+        old_status = request["status"]
+        if old_status == new_status:
+            return
+        counters = self._status_delta(request, old_status, -1)
+        for path, value in self._status_delta(request, new_status, 1).items():
+            counters[path] = counters.get(path, 0) + value
+        await self._inc(counters)
+
+    async def donation_recorded(self, request: dict):
+        await self._inc({"total_donations": 1})
+        await self.request_status_changed(request, "completed")
+
+    def _status_delta(self, request: dict, status: str, sign: int) -> dict:
+        delta = {f"requests_by_status.{status}": sign}
+        if status == "pending":
+            delta[f"pending_by_urgency.{request['urgency']}"] = sign
+            if request.get("is_emergency"):
+                delta["emergency_requests"] = sign
+        return delta
+
+    async def reconcile(self) -> dict:
+        blood_types = await self.db.donors.aggregate([
+            {"$group": {"_id": "$blood_type", "count": {"$sum": 1}}}
+        ]).to_list(None)
+        # Archived requests and donations still count towards the totals
+        statuses = await self.db.blood_requests.aggregate([
+            {"$unionWith": {"coll": REQUEST_ARCHIVE, "pipeline": [{"$project": {"status": 1}}]}},
+            {"$group": {"_id": "$status", "count": {"$sum": 1}}}
+        ]).to_list(None)
+        urgencies = await self.db.blood_requests.aggregate([
+            {"$match": {"status": "pending"}},
+            {"$group": {"_id": "$urgency", "count": {"$sum": 1}}}
+        ]).to_list(None)
+
+        doc = {
+            "total_users": await self.db.users.count_documents({}),
+            "total_donors": await self.db.donors.count_documents({}),
+            "available_donors": await self.db.donors.count_documents({"available": True}),
+            "total_requests": sum(s["count"] for s in statuses),
+            "emergency_requests": await self.db.blood_requests.count_documents({"is_emergency": True, "status": "pending"}),
+            "total_donations": await self.db.donation_history.count_documents({}) + await self.db[DONATION_ARCHIVE].count_documents({}),
+            "requests_by_status": {s["_id"]: s["count"] for s in statuses if s["_id"]},
+            "pending_by_urgency": {u["_id"]: u["count"] for u in urgencies if u["_id"]},
+            "blood_types": {b["_id"]: b["count"] for b in blood_types if b["_id"]},
+            "reconciled_at": datetime.now(timezone.utc).isoformat()
+        }
+        await self.db.stats.replace_one({"_id": STATS_ID}, doc, upsert=True)
+        logger.info("Reconciled stats: %s users, %s donors, %s requests", doc["total_users"], doc["total_donors"], doc["total_requests"])
+        return doc
+
+    async def get(self) -> dict:
+        doc = await self.db.stats.find_one({"_id": STATS_ID})
+        if doc is None or "reconciled_at" not in doc:
+            doc = await self.reconcile()
+
+        by_status = doc.get("requests_by_status", {})
+        blood_types = sorted(doc.get("blood_types", {}).items(), key=lambda item: item[1], reverse=True)
+        return {
+            "total_users": doc.get("total_users", 0),
+            "total_donors": doc.get("total_donors", 0),
+            "available_donors": doc.get("available_donors", 0),
+            "total_requests": doc.get("total_requests", 0),
+            "pending_requests": by_status.get("pending", 0),
+            "completed_requests": by_status.get("completed", 0),
+            "emergency_requests": doc.get("emergency_requests", 0),
+            "total_donations": doc.get("total_donations", 0),
+            "blood_type_distribution": [{"_id": bt, "count": count} for bt, count in blood_types if count > 0],
+            "urgency_distribution": [{"_id": u, "count": count} for u, count in doc.get("pending_by_urgency", {}).items() if count > 0]
+        }
@@ -0,0 +1,68 @@
+# Run with `pytest tests`; needs httpx, plus mongomock-motor (with pymongo<4.9) unless
+# TEST_MONGO_URL points at a mongod
+import asyncio
+import contextlib
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT_DIR))
+
+# A real mongod when TEST_MONGO_URL is set, mongomock-motor otherwise
+TEST_MONGO_URL = os.environ.get("TEST_MONGO_URL")
+os.environ["MONGO_URL"] = TEST_MONGO_URL or "mongodb://localhost:27017"
+os.environ["DB_NAME"] = os.environ.get("TEST_DB_NAME", "blood_bank_test")
+if not TEST_MONGO_URL:
+    try:
+        import motor.motor_asyncio
+        from mongomock_motor import AsyncMongoMockClient
+    except ImportError:
+        collect_ignore_glob = ["test_*.py"]
+    else:
+        motor.motor_asyncio.AsyncIOMotorClient = AsyncMongoMockClient
+
+SEEDED_COLLECTIONS = ("users", "donors", "blood_requests")
+
+# The app keeps queues and locks at module level, bound to the first loop that uses them
+loop = asyncio.new_event_loop()
+
+
+@pytest.fixture(scope="session")
+def client():
+    # One lifespan for the whole session: shutdown stops executors that cannot be restarted
+    httpx = pytest.importorskip("httpx")
+    server = pytest.importorskip("server")
+    stack = contextlib.AsyncExitStack()
+
+    async def start():
+        await stack.enter_async_context(server.app.router.lifespan_context(server.app))
+        transport = httpx.ASGITransport(app=server.app)
+        return await stack.enter_async_context(httpx.AsyncClient(transport=transport, base_url="http://test", timeout=60))
+
+    yield loop.run_until_complete(start())
+    loop.run_until_complete(stack.aclose())
+
+
+@pytest.fixture
+def run(client):
+    # run(scenario) awaits scenario(client, data) against the app, on freshly seeded collections
+    server = pytest.importorskip("server")
+    from benchmarks.seed import generate
+
+    async def seeded():
+        data = generate(200, server.pwd_context.hash("test-password"))
+        for collection in SEEDED_COLLECTIONS + ("donation_history", "donation_history_archive", "stats"):
+            await server.db[collection].delete_many({})
+        for collection in SEEDED_COLLECTIONS:
+            await server.db[collection].insert_many([dict(doc) for doc in data[collection]])
+        # Seeding bypasses the write handlers, so cached pages and ETags are invalidated here
+        server.versions.bump("donors", "blood_requests")
+        return data
+
+    async def session(scenario):
+        await scenario(client, await seeded())
+
+    return lambda scenario: loop.run_until_complete(session(scenario))
@@ -0,0 +1,127 @@
+from datetime import datetime, timedelta, timezone
+
+import jwt
+import pytest
+
+server = pytest.importorskip("server")
+
+PASSWORD = "test-password"
+
+
+def bearer(token):
+    return {"Authorization": f"Bearer {token}"}
+
+
+def user_with_role(data, role):
+    return next(user for user in data["users"] if user["role"] == role)
+
+
+async def login(client, user):
+    response = await client.post("/api/auth/login", json={"email": user["email"], "password": PASSWORD})
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_refresh_token_is_spent_once(run):
+    async def scenario(client, data):
+        tokens = await login(client, user_with_role(data, "donor"))
+        response = await client.post("/api/auth/refresh", json={"refresh_token": tokens["refresh_token"]})
+        assert response.status_code == 200
+        rotated = response.json()
+        response = await client.post("/api/auth/refresh", json={"refresh_token": tokens["refresh_token"]})
+        assert response.status_code == 401
+        response = await client.post("/api/auth/refresh", json={"refresh_token": rotated["refresh_token"]})
+        assert response.status_code == 200
+
+    run(scenario)
+
+
+def test_access_token_is_not_a_refresh_token(run):
+    async def scenario(client, data):
+        tokens = await login(client, user_with_role(data, "donor"))
+        response = await client.post("/api/auth/refresh", json={"refresh_token": tokens["access_token"]})
+        assert response.status_code == 401
+
+    run(scenario)
+
+
+def test_logout_revokes_both_tokens(run):
+    async def scenario(client, data):
+        tokens = await login(client, user_with_role(data, "recipient"))
+        assert (await client.get("/api/profile", headers=bearer(tokens["access_token"]))).status_code == 200
+        response = await client.post("/api/auth/logout", headers=bearer(tokens["access_token"]),
+                                     json={"refresh_token": tokens["refresh_token"]})
+        assert response.status_code == 200
+        assert (await client.get("/api/profile", headers=bearer(tokens["access_token"]))).status_code == 401
+        response = await client.post("/api/auth/refresh", json={"refresh_token": tokens["refresh_token"]})
+        assert response.status_code == 401
+
+    run(scenario)
+
+
+def test_logout_with_only_the_refresh_token(run):
+    async def scenario(client, data):
+        tokens = await login(client, user_with_role(data, "recipient"))
+        response = await client.post("/api/auth/logout", json={"refresh_token": tokens["refresh_token"]})
+        assert response.status_code == 200
+        response = await client.post("/api/auth/refresh", json={"refresh_token": tokens["refresh_token"]})
+        assert response.status_code == 401
+
+    run(scenario)
+
+
+def test_logout_ignores_unusable_tokens(run):
+    async def scenario(client, data):
+        response = await client.post("/api/auth/logout", headers=bearer("not-a-jwt"), json={"refresh_token": "not-a-jwt"})
+        assert response.status_code == 200
+        assert (await client.post("/api/auth/logout")).status_code == 401
+        assert (await client.get("/api/profile", headers=bearer("not-a-jwt"))).status_code == 401
+
+    run(scenario)
+
+
+def test_ban_voids_issued_tokens_and_blocks_login(run):
+    async def scenario(client, data):
+        admin, user = user_with_role(data, "admin"), user_with_role(data, "donor")
+        tokens = await login(client, user)
+        admin_headers = bearer(server.token_response(admin).access_token)
+        response = await client.post(f"/api/admin/users/{user['id']}/ban", headers=bearer(tokens["access_token"]))
+        assert response.status_code == 403
+        response = await client.post(f"/api/admin/users/{user['id']}/ban", headers=admin_headers)
+        assert response.status_code == 200
+        assert (await client.get("/api/profile", headers=bearer(tokens["access_token"]))).status_code == 401
+        response = await client.post("/api/auth/refresh", json={"refresh_token": tokens["refresh_token"]})
+        assert response.status_code == 401
+        response = await client.post("/api/auth/login", json={"email": user["email"], "password": PASSWORD})
+        assert response.status_code == 403
+
+    run(scenario)
+
+
+def legacy_token(user):
+    # Issued before tokens carried a type, an id or the user's claims
+    expires = datetime.now(timezone.utc) + timedelta(minutes=5)
+    return jwt.encode({"sub": user["id"], "exp": expires}, server.SECRET_KEY, algorithm=server.ALGORITHM)
+
+
+def test_legacy_subject_only_token_loads_the_user(run):
+    async def scenario(client, data):
+        user = user_with_role(data, "recipient")
+        response = await client.get("/api/profile", headers=bearer(legacy_token(user)))
+        assert response.status_code == 200
+        assert response.json()["email"] == user["email"]
+        assert response.json()["role"] == "recipient"
+
+    run(scenario)
+
+
+def test_legacy_token_of_a_banned_user_is_refused(run):
+    async def scenario(client, data):
+        admin, user = user_with_role(data, "admin"), user_with_role(data, "recipient")
+        token = legacy_token(user)
+        assert (await client.get("/api/profile", headers=bearer(token))).status_code == 200
+        response = await client.post(f"/api/admin/users/{user['id']}/ban", headers=bearer(server.token_response(admin).access_token))
+        assert response.status_code == 200
+        assert (await client.get("/api/profile", headers=bearer(token))).status_code == 401
+
+    run(scenario)
@@ -0,0 +1,67 @@
+import pytest
+
+server = pytest.importorskip("server")
+
+
+def bearer(user):
+    return {"Authorization": f"Bearer {server.token_response(user).access_token}"}
+
+
+def users_with_role(data, role):
+    return [user for user in data["users"] if user["role"] == role]
+
+
+async def revalidate(client, path, etag, headers=None):
+    return await client.get(path, headers={**(headers or {}), "If-None-Match": etag})
+
+
+def test_donor_list_answers_304_until_a_donor_changes(run):
+    async def scenario(client, data):
+        response = await client.get("/api/donors")
+        etag = response.headers["ETag"]
+        response = await revalidate(client, "/api/donors", etag)
+        assert response.status_code == 304
+        assert response.content == b""
+        # Another query string is another representation
+        assert (await revalidate(client, "/api/donors?limit=5", etag)).status_code == 200
+
+        donor_user = next(user for user in data["users"] if user["id"] == data["donors"][0]["user_id"])
+        response = await client.put("/api/donors/me/availability", headers=bearer(donor_user), json={"available": False})
+        assert response.status_code == 200
+        response = await revalidate(client, "/api/donors", etag)
+        assert response.status_code == 200
+        assert response.headers["ETag"] != etag
+
+    run(scenario)
+
+
+def test_eligibility_filtered_donors_are_not_tagged(run):
+    async def scenario(client, data):
+        response = await client.get("/api/donors?eligible=true")
+        assert response.status_code == 200
+        assert "ETag" not in response.headers
+
+    run(scenario)
+
+
+def test_request_list_etags_are_per_user_and_scope(run):
+    async def scenario(client, data):
+        first, second = users_with_role(data, "recipient")[:2]
+        admin = users_with_role(data, "admin")[0]
+        etags = {}
+        for user in (first, second, admin):
+            response = await client.get("/api/blood-requests", headers=bearer(user))
+            etags[user["id"]] = response.headers["ETag"]
+        assert len(set(etags.values())) == 3
+        # Another user's tag does not validate
+        assert (await revalidate(client, "/api/blood-requests", etags[second["id"]], bearer(first))).status_code == 200
+
+        response = await client.post("/api/blood-requests", headers=bearer(second),
+                                     json={"blood_type": "B+", "location": "Springfield", "urgency": "low"})
+        assert response.status_code == 200
+        # Only lists that can contain the new request change
+        assert (await revalidate(client, "/api/blood-requests", etags[first["id"]], bearer(first))).status_code == 304
+        assert (await revalidate(client, "/api/blood-requests", etags[second["id"]], bearer(second))).status_code == 200
+        assert (await revalidate(client, "/api/blood-requests", etags[admin["id"]], bearer(admin))).status_code == 200
+
+    run(scenario)
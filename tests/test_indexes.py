@@ -0,0 +1,18 @@
+import os
+
+import pytest
+
+if not os.environ.get("TEST_MONGO_URL"):
+    pytest.skip("query plans need a real mongod, set TEST_MONGO_URL", allow_module_level=True)
+
+server = pytest.importorskip("server")
+
+from indexes import ROUTE_QUERIES, find_collection_scans  # noqa: E402
+
+
+def test_route_queries_use_an_index(run):
+    async def scenario(client, data):
+        # The lifespan has run ensure_indexes; seeded data keeps the planner from trivial plans
+        assert await find_collection_scans(server.db, ROUTE_QUERIES) == []
+
+    run(scenario)
@@ -0,0 +1,78 @@
+import pytest
+
+server = pytest.importorskip("server")
+
+
+def bearer(user):
+    return {"Authorization": f"Bearer {server.token_response(user).access_token}"}
+
+
+async def pages(client, path, limit, headers=None, **filters):
+    # Follows X-Next-Cursor to the end and returns every page
+    params, result = {"limit": limit, **filters}, []
+    while True:
+        response = await client.get(path, params=params, headers=headers)
+        assert response.status_code == 200
+        result.append(response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            return result
+        params["cursor"] = cursor
+
+
+class _Reversed:
+    def __init__(self, value):
+        self.value = value
+
+    def __eq__(self, other):
+        return self.value == other.value
+
+    def __lt__(self, other):
+        return self.value > other.value
+
+
+def sort_key(doc, sort):
+    # Descending keys compare reversed; the sort fields here are strings and booleans
+    return tuple(value if direction == 1 else _Reversed(value) for value, (_, direction) in zip((doc[field] for field, _ in sort), sort))
+
+
+def test_donor_pages_cover_every_donor_once(run):
+    async def scenario(client, data):
+        result = await pages(client, "/api/donors", 7)
+        assert all(len(page) == 7 for page in result[:-1])
+        ids = [donor["id"] for page in result for donor in page]
+        assert len(ids) == len(set(ids)) == len(data["donors"])
+        by_id = {donor["id"]: donor for donor in data["donors"]}
+        ordered = [by_id[donor_id] for donor_id in ids]
+        assert ordered == sorted(ordered, key=lambda donor: sort_key(donor, server.DONOR_SORT))
+
+    run(scenario)
+
+
+def test_donor_pages_keep_their_filter(run):
+    async def scenario(client, data):
+        result = await pages(client, "/api/donors", 3, blood_type="O+")
+        ids = {donor["id"] for page in result for donor in page}
+        assert ids == {donor["id"] for donor in data["donors"] if donor["blood_type"] == "O+"}
+
+    run(scenario)
+
+
+def test_request_pages_follow_the_request_order(run):
+    async def scenario(client, data):
+        admin = next(user for user in data["users"] if user["role"] == "admin")
+        result = await pages(client, "/api/blood-requests", 11, bearer(admin))
+        requests = [request for page in result for request in page]
+        assert len({request["id"] for request in requests}) == len(requests) == len(data["blood_requests"])
+        assert requests == sorted(requests, key=lambda request: sort_key(request, server.REQUEST_SORT))
+
+    run(scenario)
+
+
+def test_malformed_cursor_is_rejected(run):
+    async def scenario(client, data):
+        for cursor in ("not-base64!", "WzFd"):
+            response = await client.get("/api/donors", params={"cursor": cursor})
+            assert response.status_code == 400
+
+    run(scenario)
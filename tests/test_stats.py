@@ -0,0 +1,65 @@
+from datetime import datetime, timezone
+
+import pytest
+
+server = pytest.importorskip("server")
+
+from stats import STATS_ID  # noqa: E402
+
+
+def bearer(tokens):
+    return {"Authorization": f"Bearer {tokens['access_token']}"}
+
+
+async def register(client, role, **fields):
+    response = await client.post("/api/auth/register", json={
+        "email": f"stats-{role}@example.com", "name": f"Stats {role.title()}", "phone": "555-0100",
+        "password": "test-password", "role": role, "location": "Springfield", **fields
+    })
+    assert response.status_code == 200
+    return response.json()
+
+
+async def create_request(client, tokens, **fields):
+    response = await client.post("/api/blood-requests", headers=bearer(tokens), json={
+        "blood_type": "AB-", "location": "Springfield", "urgency": "high", **fields
+    })
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_write_handlers_keep_the_counters_in_step(run):
+    async def scenario(client, data):
+        # A reconciled baseline of zero, so every counter below is the sum of the handlers' deltas
+        await server.db.stats.replace_one({"_id": STATS_ID}, {"reconciled_at": datetime.now(timezone.utc).isoformat()}, upsert=True)
+
+        donor = await register(client, "donor", blood_type="AB-")
+        recipient = await register(client, "recipient")
+        donated = await create_request(client, recipient, urgency="critical", is_emergency=True)
+        cancelled = await create_request(client, recipient)
+        assert (await client.put(f"/api/blood-requests/{cancelled['id']}", headers=bearer(recipient), json={"status": "cancelled"})).status_code == 200
+        for available in (False, False, True, False):
+            response = await client.put("/api/donors/me/availability", headers=bearer(donor), json={"available": available})
+            assert response.status_code == 200
+        response = await client.post("/api/donations", headers=bearer(donor), json={"request_id": donated["id"]})
+        assert response.status_code == 200
+        # A retried donation is not counted again
+        response = await client.post("/api/donations", headers=bearer(donor), json={"request_id": donated["id"]})
+        assert response.status_code == 200
+
+        assert await server.stats_store.get() == {
+            "total_users": 2,
+            "total_donors": 1,
+            "available_donors": 0,
+            "total_requests": 2,
+            "pending_requests": 0,
+            "completed_requests": 1,
+            "emergency_requests": 0,
+            "total_donations": 1,
+            "blood_type_distribution": [{"_id": "AB-", "count": 1}],
+            "urgency_distribution": []
+        }
+        doc = await server.db.stats.find_one({"_id": STATS_ID})
+        assert doc["requests_by_status"] == {"pending": 0, "completed": 1, "cancelled": 1}
+
+    run(scenario)
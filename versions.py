@@ -0,0 +1,78 @@
+import asyncio
+import hashlib
+import logging
+import os
+import uuid
+from concurrent.futures import Executor, Future
+from typing import Optional, Tuple
+
+from cache import CacheBackend, MemoryBackend
+
+logger = logging.getLogger(__name__)
+
+# Versions of per-process state (leaderboard, activity ring) are only meaningful inside the
+# process that produced them, so they are qualified with this token
+_EPOCH = uuid.uuid4().hex[:12]
+
+
+def local_version(counter: int) -> str:
+    return f"{os.getpid()}.{_EPOCH}.{counter}"
+
+
+# Version tokens for conditional GETs, one per scope ("blood_requests", "blood_requests:<user id>",
+# "donors", ...). Write handlers bump the scopes they touch; a scope that is missing (first read,
+# restart, expiry) gets a fresh random token, which can only cost a client one full response.
+# With a SQLiteBackend every worker on the host sees every bump. A blocking backend gets an
+# executor with a single thread: reads are awaited there and bumps queued to it, so they stay
+# in order and off the event loop.
+class VersionStore:
+    def __init__(self, backend: Optional[CacheBackend] = None, ttl: float = 3600, executor: Optional[Executor] = None):
+        self.backend = backend or MemoryBackend()
+        self.ttl = ttl
+        self.executor = executor
+        self.bumps = 0
+
+    def _current(self, scopes: Tuple[str, ...]) -> Tuple[str, ...]:
+        tokens = []
+        for scope in scopes:
+            token = self.backend.get(scope)
+            if not isinstance(token, str):
+                token = uuid.uuid4().hex
+                self.backend.set(scope, token, self.ttl)
+            tokens.append(token)
+        return tuple(tokens)
+
+    def _bump(self, scopes: Tuple[str, ...]):
+        for scope in scopes:
+            self.backend.set(scope, uuid.uuid4().hex, self.ttl)
+
+    async def current(self, *scopes: str) -> Tuple[str, ...]:
+        if self.executor is None:
+            return self._current(scopes)
+        return await asyncio.get_running_loop().run_in_executor(self.executor, self._current, scopes)
+
+    def bump(self, *scopes: str):
+        self.bumps += len(scopes)
+        if self.executor is None:
+            self._bump(scopes)
+        else:
+            self.executor.submit(self._bump, scopes).add_done_callback(_log_failure)
+
+
+def _log_failure(future: Future):
+    if future.exception() is not None:
+        logger.error("Version bump failed", exc_info=future.exception())
+
+
+def make_etag(*parts: str) -> str:
+    # Strong validator: the body is fully determined by the route, query, caller and versions
+    return '"' + hashlib.sha256("\x1f".join(parts).encode()).hexdigest()[:32] + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    # If-None-Match uses the weak comparison, so a W/ prefix added by a proxy still matches
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(candidate.strip().removeprefix("W/") == etag for candidate in if_none_match.split(","))